@@ -0,0 +1 @@
+# Lets pytest import the model, view and controller packages from the repository root
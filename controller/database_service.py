@@ -0,0 +1,99 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt6.QtCore import QObject, pyqtSignal
+
+from model.database_manager import DatabaseManager
+
+READER_THREADS = 2
+
+
+class DatabaseService(QObject):
+    """
+    Runs DatabaseManager calls off the GUI thread.
+
+    One primary thread owns the read-write connection together with the tag
+    index and caches; writes, and queries answered from the index, are queued
+    there and run in the order they were made. Plain reads go to a pool of
+    read-only connections, which WAL mode lets run while a write is in
+    progress. Calls return concurrent.futures.Future; pass on_result to have
+    the result handed to a callback on the GUI thread instead, and on_error
+    for the exception if the call fails. Every failure is also announced
+    through failed, for the window to report.
+    """
+
+    delivered = pyqtSignal(object, object, object)
+    failed = pyqtSignal(object)
+
+    def __init__(self, db_path, readers=READER_THREADS, parent=None):
+        super().__init__(parent)
+        self.db_path = db_path
+        self.primary_db = None
+        self.reader_local = threading.local()
+        self.primary = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-primary")
+        self.readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix="db-reader")
+        self.delivered.connect(self.deliver)
+
+        # Readers can only open the database once the schema exists
+        self.primary.submit(self.open_primary).result()
+
+    def open_primary(self):
+        self.primary_db = DatabaseManager(self.db_path)
+
+    def reader_db(self):
+        reader = getattr(self.reader_local, "db", None)
+        if reader is None:
+            reader = DatabaseManager(self.db_path, read_only=True)
+            self.reader_local.db = reader
+        return reader
+
+    def call(self, method, *args, on_result=None, on_error=None, **kwargs):
+        """Run a DatabaseManager method on the primary connection."""
+        future = self.primary.submit(
+            lambda: getattr(self.primary_db, method)(*args, **kwargs))
+        return self.watch(future, on_result, on_error)
+
+    def read(self, method, *args, on_result=None, on_error=None, **kwargs):
+        """Run a read-only DatabaseManager method on a reader connection."""
+        future = self.readers.submit(
+            lambda: getattr(self.reader_db(), method)(*args, **kwargs))
+        return self.watch(future, on_result, on_error)
+
+    def read_metadata(self, filename, on_result=None, on_error=None):
+        """
+        load_image_metadata on a reader connection, but through the primary's
+        metadata cache, so the viewer and the prefetcher share its hits.
+        """
+        future = self.readers.submit(
+            lambda: self.primary_db.load_shared_metadata(filename, self.reader_db()))
+        return self.watch(future, on_result, on_error)
+
+    def watch(self, future, on_result, on_error):
+        # Errors are reported on the GUI thread even when nobody waits for the result
+        def done(future):
+            if future.cancelled():
+                return
+            error = future.exception()
+            self.delivered.emit((on_result, on_error), None if error else future.result(), error)
+        future.add_done_callback(done)
+        return future
+
+    def deliver(self, callbacks, result, error):
+        """Runs on the GUI thread."""
+        on_result, on_error = callbacks
+        if error:
+            self.failed.emit(error)
+            if on_error:
+                on_error(error)
+        elif on_result:
+            on_result(result)
+
+    def close(self):
+        """
+        Finish queued writes, then close the primary connection. Results still
+        in flight are dropped rather than handed to callbacks.
+        """
+        self.delivered.disconnect(self.deliver)
+        self.readers.shutdown(wait=True, cancel_futures=True)
+        self.primary.submit(lambda: self.primary_db.conn.close())
+        self.primary.shutdown(wait=True)
@@ -0,0 +1,23 @@
+from PyQt6.QtCore import QThread, pyqtSignal
+
+from model.duplicate_finder import find_duplicates
+
+
+class DuplicateScanThread(QThread):
+    """
+    Runs duplicate_finder.find_duplicates off the GUI thread. The hashes it
+    computes are handed back to be stored by the GUI thread's connection.
+    """
+
+    hashes_ready = pyqtSignal(list, list)
+
+    def __init__(self, root, images, parent=None):
+        super().__init__(parent)
+        self.root = root
+        self.images = images
+
+    def run(self):
+        updates, clusters = find_duplicates(
+            self.root, self.images, should_stop=self.isInterruptionRequested)
+        if not self.isInterruptionRequested():
+            self.hashes_ready.emit(updates, clusters)
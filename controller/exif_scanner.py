@@ -0,0 +1,41 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from PyQt6.QtCore import QThread, pyqtSignal
+
+from model.exif_reader import read_exif_batch
+
+# Images per task sent to a worker process
+EXIF_CHUNK_SIZE = 64
+
+
+class ExifScanThread(QThread):
+    """
+    Reads the EXIF headers of images that have not been read yet on a pool
+    of worker processes, so the parsing does not compete with the GUI for
+    the GIL. Results are streamed back in chunks for the GUI thread to store.
+    """
+
+    exif_found = pyqtSignal(list)
+
+    def __init__(self, root, images, parent=None):
+        super().__init__(parent)
+        self.root = root
+        self.images = images
+
+    def run(self):
+        chunks = [self.images[i:i + EXIF_CHUNK_SIZE]
+                  for i in range(0, len(self.images), EXIF_CHUNK_SIZE)]
+        if not chunks:
+            return
+        # Forking a process that runs Qt threads is unsafe, so workers are spawned
+        executor = ProcessPoolExecutor(max_workers=min(len(chunks), QThread.idealThreadCount()),
+                                       mp_context=multiprocessing.get_context("spawn"))
+        try:
+            futures = [executor.submit(read_exif_batch, self.root, chunk) for chunk in chunks]
+            for future in as_completed(futures):
+                if self.isInterruptionRequested():
+                    return
+                self.exif_found.emit(future.result())
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,135 @@
+import os
+
+from PyQt6.QtCore import QObject, QTimer, QFileSystemWatcher, pyqtSignal
+
+from model.folder_scanner import (
+    DEFAULT_EXCLUDE_PATTERNS, diff_entries, parent_directory, scan_directory, walk_library,
+)
+
+DEBOUNCE_MS = 500
+POLL_INTERVAL_MS = 5000
+
+
+class FolderWatcher(QObject):
+    """
+    Watches every directory of the library and emits folder_changed with a
+    diff (see folder_scanner.diff_entries) when images are added, changed,
+    removed or renamed. Bursts of file system events are debounced, and only
+    the directories that reported a change are rescanned and compared against
+    the last known snapshot. If some directories cannot be watched, the whole
+    library is polled instead.
+    """
+
+    folder_changed = pyqtSignal(object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.root = None
+        self.include = ()
+        self.exclude = DEFAULT_EXCLUDE_PATTERNS
+        self.snapshot = {}
+        self.dirty = set()
+
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self.schedule_rescan)
+
+        self.debounce_timer = QTimer(self)
+        self.debounce_timer.setSingleShot(True)
+        self.debounce_timer.setInterval(DEBOUNCE_MS)
+        self.debounce_timer.timeout.connect(self.rescan)
+
+        self.poll_timer = QTimer(self)
+        self.poll_timer.setInterval(POLL_INTERVAL_MS)
+        self.poll_timer.timeout.connect(self.rescan_all)
+
+    def watch(self, root, entries, directories, include=(), exclude=DEFAULT_EXCLUDE_PATTERNS):
+        """
+        Start watching the library at root. entries and directories are the
+        result of the scan the caller has just finished.
+        """
+        self.stop()
+        self.root = root
+        self.include = include
+        self.exclude = exclude
+        self.snapshot = {directory: {} for directory in directories}
+        for path, size, mtime in entries:
+            self.snapshot.setdefault(parent_directory(path), {})[path] = (size, mtime)
+        self.add_watches(directories)
+
+    def stop(self):
+        self.debounce_timer.stop()
+        self.poll_timer.stop()
+        if self.watcher.directories():
+            self.watcher.removePaths(self.watcher.directories())
+        self.root = None
+        self.snapshot = {}
+        self.dirty = set()
+
+    def absolute_path(self, directory):
+        return os.path.join(self.root, directory) if directory else self.root
+
+    def add_watches(self, directories):
+        if not directories:
+            return
+        failed = self.watcher.addPaths([self.absolute_path(d) for d in directories])
+        if failed and not self.poll_timer.isActive():
+            self.poll_timer.start()
+
+    def schedule_rescan(self, path):
+        if not self.root:
+            return
+        directory = os.path.relpath(path, self.root).replace(os.sep, "/")
+        self.dirty.add("" if directory == "." else directory)
+        self.debounce_timer.start()
+
+    def subtree(self, directory):
+        prefix = directory + "/"
+        return [d for d in self.snapshot if d == directory or d.startswith(prefix)]
+
+    def rescan(self):
+        dirty, self.dirty = self.dirty, set()
+        old, new = {}, []
+        for directory in sorted(dirty):
+            if directory not in self.snapshot:
+                continue
+            try:
+                entries, subdirectories = scan_directory(
+                    self.root, directory, self.include, self.exclude)
+            except OSError:
+                # The directory itself went away; its parent reports the removal
+                continue
+
+            old.update(self.snapshot[directory])
+            self.snapshot[directory] = {path: (size, mtime) for path, size, mtime in entries}
+            new.extend(entries)
+
+            children = {d for d in self.snapshot if parent_directory(d) == directory and d}
+            for gone in children - set(subdirectories):
+                for d in self.subtree(gone):
+                    old.update(self.snapshot.pop(d))
+                    self.watcher.removePath(self.absolute_path(d))
+            for added in set(subdirectories) - children:
+                found = []
+                for d, walked in walk_library(self.root, self.include, self.exclude, start=added):
+                    self.snapshot[d] = {path: (size, mtime) for path, size, mtime in walked}
+                    new.extend(walked)
+                    found.append(d)
+                self.add_watches(found)
+
+        self.emit_changes(diff_entries(old, new))
+
+    def rescan_all(self):
+        if not self.root:
+            return
+        old = {path: sig for files in self.snapshot.values() for path, sig in files.items()}
+        snapshot, new = {}, []
+        for directory, entries in walk_library(self.root, self.include, self.exclude):
+            snapshot[directory] = {path: (size, mtime) for path, size, mtime in entries}
+            new.extend(entries)
+        self.add_watches([d for d in snapshot if d not in self.snapshot])
+        self.snapshot = snapshot
+        self.emit_changes(diff_entries(old, new))
+
+    def emit_changes(self, changes):
+        if any(changes.values()):
+            self.folder_changed.emit(changes)
@@ -0,0 +1,39 @@
+from PyQt6.QtCore import QThread, pyqtSignal
+
+from model.geocoder import ReverseGeocoder, load_gazetteer, place_location
+
+# Images looked up between checks for a stop request
+GEOCODE_CHUNK_SIZE = 2000
+
+
+class GeocodeThread(QThread):
+    """
+    Loads a gazetteer into a KD-tree and maps the GPS position of each image
+    to its nearest place, without touching the network. The (id, location)
+    pairs are handed back for the GUI thread to store.
+    """
+
+    locations_found = pyqtSignal(list)
+    failed = pyqtSignal(str)
+
+    def __init__(self, gazetteer_path, images, parent=None):
+        super().__init__(parent)
+        self.gazetteer_path = gazetteer_path
+        self.images = images
+
+    def run(self):
+        try:
+            geocoder = ReverseGeocoder(load_gazetteer(self.gazetteer_path))
+        except (OSError, ValueError) as error:
+            self.failed.emit(str(error))
+            return
+        assignments = []
+        for start in range(0, len(self.images), GEOCODE_CHUNK_SIZE):
+            # Stopping waits on this thread, so it must not wait for every lookup
+            if self.isInterruptionRequested():
+                return
+            chunk = self.images[start:start + GEOCODE_CHUNK_SIZE]
+            places = geocoder.locate_many((latitude, longitude) for _, latitude, longitude in chunk)
+            assignments += [(image_id, place_location(place))
+                            for (image_id, _, _), place in zip(chunk, places) if place]
+        self.locations_found.emit(assignments)
@@ -0,0 +1,44 @@
+import time
+
+from PyQt6.QtCore import QThread, pyqtSignal
+
+from model.folder_scanner import walk_library
+
+SCAN_BATCH_SIZE = 500
+SCAN_BATCH_SECONDS = 0.25
+
+
+class LibraryScanThread(QThread):
+    """
+    Walks the library off the GUI thread and streams what it finds back in
+    batches, so the first photos can be shown while a deep tree is still being
+    walked. A batch is sent once it reaches SCAN_BATCH_SIZE entries or has been
+    collecting for SCAN_BATCH_SECONDS.
+    """
+
+    batch_found = pyqtSignal(list)
+    scan_finished = pyqtSignal(list)
+
+    def __init__(self, root, include=(), exclude=(), parent=None):
+        super().__init__(parent)
+        self.root = root
+        self.include = include
+        self.exclude = exclude
+
+    def run(self):
+        directories = []
+        batch = []
+        last_emit = time.monotonic()
+        for directory, entries in walk_library(self.root, self.include, self.exclude):
+            if self.isInterruptionRequested():
+                return
+            directories.append(directory)
+            batch.extend(entries)
+            if len(batch) >= SCAN_BATCH_SIZE or time.monotonic() - last_emit >= SCAN_BATCH_SECONDS:
+                if batch:
+                    self.batch_found.emit(batch)
+                batch = []
+                last_emit = time.monotonic()
+        if batch:
+            self.batch_found.emit(batch)
+        self.scan_finished.emit(directories)
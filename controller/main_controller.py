@@ -1,7 +1,21 @@
 from view.main_window import MainWindow
-from model.database_manager import DatabaseManager
-from PyQt6.QtWidgets import QFileDialog
+from model.thumbnail_store import ThumbnailStore
+from model.folder_scanner import ScanReconciler, DEFAULT_EXCLUDE_PATTERNS
+from model.tag_index import filters_without
+from model.vocabulary import LOCATION_VALUE_FIELDS
+from controller.database_service import DatabaseService
+from controller.folder_watcher import FolderWatcher
+from controller.library_scanner import LibraryScanThread
+from controller.duplicate_scanner import DuplicateScanThread
+from controller.exif_scanner import ExifScanThread
+from controller.geocode_scanner import GeocodeThread
+from controller.perceptual_hash_scanner import PerceptualHashThread
+from controller.vocabulary_service import VocabularyService
+from view.thumbnails import encode_thumbnail
+from view.batch_tag_dialog import BatchTagDialog
+from PyQt6.QtWidgets import QFileDialog, QDialog, QMessageBox
 import os
+from functools import partial
 
 
 class MainController:
@@ -9,26 +23,48 @@ class MainController:
         self.view = MainWindow()
         self.folder_path = None
         self.image_list = []
-        self.people_list = []
-        self.group_list = []
-        self.emotion_list = []
-        self.location_data = {
-            'name': [],
-            'category': [],
-            'country': [],
-            'region': [],
-            'city': [],
-            'postcode': []
-        }
+
+        # Sorted lists kept up to date in place by the vocabulary service
+        self.vocabulary = VocabularyService(parent=self.view)
+        self.vocabulary.reset.connect(self.populate_vocabulary)
+        self.vocabulary.changed.connect(self.on_vocabulary_changed)
+        self.people_list = self.vocabulary.values["people"]
+        self.group_list = self.vocabulary.values["groups"]
+        self.emotion_list = self.vocabulary.values["emotions"]
+        self.location_data = {field: self.vocabulary.values[field] for field in LOCATION_VALUE_FIELDS}
+
+        self.db = None
+        self.active_filters = None
+        # Bumped for every new result set, so late answers for older ones are ignored
+        self.results_generation = 0
+        self.include_patterns = ()
+        self.exclude_patterns = DEFAULT_EXCLUDE_PATTERNS
+        self.scan_thread = None
+        self.scan_reconciler = None
+        # Bumped for every scan requested, so a superseded one is never started
+        self.scan_generation = 0
+        self.duplicate_thread = None
+        self.similar_thread = None
+        self.exif_thread = None
+        self.exif_rescan = False
+        self.geocode_thread = None
+        self.folder_watcher = FolderWatcher()
+        self.folder_watcher.folder_changed.connect(self.on_folder_changed)
 
         # Connect UI callbacks to controller logic
         self.view.load_folder_callback = self.load_folder
         self.view.on_save_metadata = self.save_metadata
         self.view.on_apply_filters = self.apply_filters
         self.view.on_clear_filters = self.clear_filters
+        self.view.on_find_duplicates = self.find_duplicates
+        self.view.on_find_similar = self.find_similar
+        self.view.on_geocode = self.geocode_library
+        self.view.on_batch_tag = self.batch_tag
         self.view.fetch_metadata = self.get_metadata_for_image
+        self.view.on_close = self.shutdown
 
         self.view.metadata_panel.on_save_metadata = self.save_metadata
+        self.view.metadata_panel.on_delete_location_value = self.delete_location_value
         self.view.filter_panel.on_apply_filters = self.apply_filters
         self.view.filter_panel.on_clear_filters = self.clear_filters
 
@@ -44,56 +80,226 @@ class MainController:
         self.view.load_button.hide()
         self.view.footer_widget.hide()
         self.view.filter_button.show()
+        self.view.find_duplicates_button.show()
+        self.view.find_similar_button.show()
+        self.view.geocode_button.show()
 
         self.init_db(folder)
+        self.init_thumbnail_store(folder)
         self.scan_folder(folder)
-        self.populate_people_list()
-        self.populate_group_list()
-        self.populate_emotion_list()
-        self.populate_location_data()
+        self.db.read("get_vocabulary", on_result=self.vocabulary.load)
 
     def init_db(self, folder):
+        self.view.prefetcher.stop()
+        self.stop_duplicate_scan()
+        # It writes to the thumbnail store, which is replaced along with the database
+        self.stop_similar_scan()
+        if self.db:
+            self.db.close()
         db_path = os.path.join(folder, "metadata.db")
-        self.db = DatabaseManager(db_path)
+        self.db = DatabaseService(db_path, parent=self.view)
+        self.db.failed.connect(self.on_database_error)
+        self.db.call("enable_tag_index")
+        self.view.filter_panel.set_live_filtering(True)
+        self.view.prefetcher.metadata_loader = self.load_metadata_in_background
+
+    def load_metadata_in_background(self, filename):
+        """Called from prefetch worker threads, which can wait for a reader."""
+        db = self.db
+        if db is None:
+            return None
+        try:
+            return db.read_metadata(filename).result()
+        except Exception:
+            # Reported through db.failed; the full view reads it again when shown
+            return None
+
+    def on_database_error(self, error):
+        QMessageBox.warning(self.view, "Database Error", f"A database operation failed:\n{error}")
+
+    def shutdown(self):
+        self.stop_scan()
+        self.stop_exif_scan()
+        self.stop_geocode()
+        self.stop_duplicate_scan()
+        self.stop_similar_scan()
+        self.folder_watcher.stop()
+        # Prefetch tasks read metadata, so they must finish before the database closes
+        self.view.prefetcher.stop()
+        if self.db:
+            self.db.close()
+            self.db = None
+
+    def init_thumbnail_store(self, folder):
+        if self.view.thumbnail_store:
+            self.view.thumbnail_store.close()
+        self.view.thumbnail_store = ThumbnailStore(folder)
+        self.view.image_cache.clear()
+
+    def refresh_stale_thumbnails(self, folder):
+        self.view.thumbnail_store.rebuild_stale(
+            self.view.image_list,
+            lambda filename: encode_thumbnail(os.path.join(folder, filename))
+        )
 
     def scan_folder(self, folder):
-        image_extensions = (".jpg", ".jpeg", ".png", ".raw",
-                            ".heif", ".cr2", ".cr3", ".arw", ".tiff")
-        files_in_folder = [
-            f for f in os.listdir(folder) if f.lower().endswith(image_extensions)
-        ]
-        self.view.image_list = self.db.insert_images_if_missing(
-            files_in_folder)
-        self.view.display_grid_view()
+        """
+        Show what the DB already knows straight away, then walk the library on
+        a background thread and merge what it finds as batches arrive.
+        """
+        self.stop_scan()
+        self.stop_exif_scan()
+        self.stop_geocode()
+        self.folder_watcher.stop()
+        self.results_generation += 1
+        self.scan_generation += 1
+        self.db.read("get_all_filenames", on_result=partial(
+            self.on_library_listed, self.results_generation, self.scan_generation, folder))
+
+    def on_library_listed(self, results_generation, scan_generation, folder, filenames):
+        self.show_results(results_generation, filenames)
+        # Only now, so the batches the scan adds are not overwritten by this listing
+        self.db.read("get_file_signatures",
+                     on_result=partial(self.start_scan, scan_generation, folder))
+
+    def start_scan(self, generation, folder, signatures):
+        if generation != self.scan_generation:
+            return
+        self.scan_reconciler = ScanReconciler(signatures)
+        self.scan_thread = LibraryScanThread(
+            folder, self.include_patterns, self.exclude_patterns, parent=self.view)
+        self.scan_thread.batch_found.connect(
+            partial(self.on_scan_batch, self.scan_thread))
+        self.scan_thread.scan_finished.connect(
+            partial(self.on_scan_finished, self.scan_thread))
+        self.scan_thread.finished.connect(self.scan_thread.deleteLater)
+        self.scan_thread.start()
+
+    def stop_scan(self):
+        if self.scan_thread:
+            self.scan_thread.requestInterruption()
+            self.scan_thread.wait()
+            self.scan_thread = None
+
+    def on_scan_batch(self, thread, entries):
+        # Batches can still be queued from a scan that has since been stopped
+        if thread is not self.scan_thread:
+            return
+        self.db.call("apply_folder_changes", self.scan_reconciler.add_batch(entries),
+                     on_result=self.on_scan_batch_applied)
+
+    def on_scan_batch_applied(self, report):
+        added = report["added"] if not self.active_filters else []
+        self.view.update_images(added, report["changed"], [], [])
+
+    def on_scan_finished(self, thread, directories):
+        if thread is not self.scan_thread:
+            return
+        self.scan_thread = None
+        self.db.call("apply_folder_changes", self.scan_reconciler.finish(),
+                     on_result=partial(self.on_scan_applied, thread.root, self.scan_reconciler, directories))
+
+    def on_scan_applied(self, folder, reconciler, directories, report):
+        # Renamed files were already streamed in under their new path
+        removed = report["removed"] + [old for old, _ in report["renamed"]]
+        self.view.update_images([], [], removed, [])
+
+        self.folder_watcher.watch(folder, reconciler.entries, directories,
+                                  self.include_patterns, self.exclude_patterns)
+        self.refresh_stale_thumbnails(folder)
+        self.refresh_facet_counts()
+        self.extract_exif()
+
+    def on_folder_changed(self, changes):
+        if not self.db:
+            return
+        self.db.call("apply_folder_changes", changes, on_result=self.on_folder_changes_applied)
+
+    def on_folder_changes_applied(self, report):
+        # New files are untagged, so they only belong in an unfiltered grid
+        added = report["added"] if not self.active_filters else []
+        self.view.update_images(added, report["changed"], report["removed"], report["renamed"])
+        self.refresh_facet_counts()
+        if report["added"] or report["changed"]:
+            self.extract_exif()
+
+    def extract_exif(self):
+        """Read the EXIF headers of new and changed images in the background."""
+        if self.exif_thread:
+            self.exif_rescan = True
+            return
+        # Queued behind pending writes, so it sees the images they added
+        self.db.call("get_images_without_exif", on_result=self.start_exif_scan)
+
+    def start_exif_scan(self, images):
+        if self.exif_thread:
+            # Asked for again before the first answer came; it may list images added since
+            self.exif_rescan = True
+            return
+        if not images:
+            return
+        self.exif_thread = ExifScanThread(self.view.folder_path, images, parent=self.view)
+        self.exif_thread.exif_found.connect(partial(self.on_exif_found, self.exif_thread))
+        self.exif_thread.finished.connect(partial(self.on_exif_finished, self.exif_thread))
+        self.exif_thread.finished.connect(self.exif_thread.deleteLater)
+        self.exif_thread.start()
+
+    def stop_exif_scan(self):
+        if self.exif_thread:
+            self.exif_thread.requestInterruption()
+            self.exif_thread.wait()
+            self.exif_thread = None
+        self.exif_rescan = False
+
+    def on_exif_found(self, thread, results):
+        if thread is not self.exif_thread:
+            return
+        self.db.call("store_exif", results, on_result=self.on_exif_stored)
+
+    def on_exif_stored(self, dated):
+        # Capture dates were filled in for these, so their cached metadata is stale
+        for filename in dated:
+            self.view.prefetcher.invalidate_metadata(filename)
+
+    def on_exif_finished(self, thread):
+        if thread is not self.exif_thread:
+            return
+        self.exif_thread = None
+        self.refresh_facet_counts()
+        if self.exif_rescan:
+            self.exif_rescan = False
+            self.extract_exif()
+
+    def populate_vocabulary(self):
+        """Fill every pick list from scratch after a full vocabulary load."""
+        self.populate_people_list()
+        self.populate_group_list()
+        self.populate_emotion_list()
+        self.populate_location_data()
+
+    def on_vocabulary_changed(self, field, inserted, removed):
+        self.view.filter_panel.apply_vocabulary_delta(field, inserted, removed)
+        self.view.metadata_panel.apply_vocabulary_delta(field, inserted, removed)
 
     def populate_people_list(self):
-        self.people_list = self.db.get_all_people_names()
         self.view.people_list = self.people_list
         self.view.metadata_panel.populate_people_list(self.people_list)
+        self.view.filter_panel.people_list = self.people_list
         self.view.filter_panel.populate_people_filter_list()
 
     def populate_group_list(self):
-        self.group_list = self.db.get_all_group_names()
         self.view.group_list = self.group_list
         self.view.metadata_panel.populate_group_list(self.group_list)
+        self.view.filter_panel.group_list = self.group_list
         self.view.filter_panel.populate_group_filter_list()
 
     def populate_emotion_list(self):
-        self.emotion_list = self.db.get_all_emotion_names()
         self.view.emotion_list = self.emotion_list
         self.view.metadata_panel.populate_emotion_list(self.emotion_list)
+        self.view.filter_panel.emotion_list = self.emotion_list
         self.view.filter_panel.populate_emotion_filter_list()
 
     def populate_location_data(self):
-        self.location_data = {
-            'name': self.db.get_all_location_names(),
-            'category': self.db.get_all_location_categories(),
-            'country': self.db.get_all_location_countries(),
-            'region': self.db.get_all_location_regions(),
-            'city': self.db.get_all_location_cities(),
-            'postcode': self.db.get_all_location_postcodes(),
-        }
-
         # Update filters
         self.view.filter_panel.populate_location_list(
             self.view.filter_panel.location_name_filter_list, self.location_data['name'])
@@ -119,47 +325,296 @@ class MainController:
         if not self.db:
             return
 
-        self.db.save_metadata(
+        self.db.call(
+            "save_metadata",
             filename=metadata['filename'],
             description=metadata['description'],
             people=metadata['people'],
             groups=metadata['groups'],
             emotions=metadata['emotions'],
             location=metadata['location'],
-            date=metadata['date']
+            date=metadata['date'],
+            on_result=partial(self.on_metadata_saved, metadata)
         )
 
-        # Refresh location data to ensure filters and dropdowns are up to date
-        self.populate_location_data()
+    def on_metadata_saved(self, metadata, result):
+        self.view.prefetcher.invalidate_metadata(metadata['filename'])
+
+        # Patch filters and dropdowns with any names this save introduced
+        self.vocabulary.record_saved(metadata['people'], metadata['groups'],
+                                     metadata['emotions'], metadata['location'])
+        self.refresh_facet_counts()
 
         # self.view.toast("Metadata saved.")
 
+    def batch_tag(self, filenames):
+        if not self.db or not filenames:
+            return
+        dialog = BatchTagDialog(len(filenames), self.people_list, self.group_list,
+                                self.emotion_list, self.location_data, self.view)
+        if dialog.exec() != QDialog.DialogCode.Accepted:
+            return
+
+        changes = dialog.collect_changes()
+        self.db.call(
+            "bulk_update_metadata",
+            filenames,
+            add=changes["add"],
+            remove=changes["remove"],
+            location=changes["location"],
+            date=changes["date"],
+            on_result=partial(self.on_batch_tagged, filenames, changes)
+        )
+
+    def on_batch_tagged(self, filenames, changes, count):
+        self.view.toast(f"Tagged {count} images.")
+        for filename in filenames:
+            self.view.prefetcher.invalidate_metadata(filename)
+
+        self.vocabulary.record_saved(location=changes["location"], **changes["add"])
+        self.refresh_facet_counts()
+
+    def delete_location_value(self, field, value):
+        if not self.db:
+            return
+        self.db.call("delete_location_entry", field, value,
+                     on_result=partial(self.on_location_value_deleted, field, value))
+
+    def on_location_value_deleted(self, field, value, removed):
+        # The deleted locations may have held the last use of values in other fields
+        for removed_field, values in removed.items():
+            self.vocabulary.record_removed(removed_field, values)
+        if value not in removed.get(field, ()):
+            # Still used by a tagged photo, so the dropdown keeps offering it
+            self.view.metadata_panel.location_dropdowns()[field].insert_value(value)
+
     def apply_filters(self, filters):
         if not self.db:
             return
 
-        filtered_images = self.db.get_filtered_images(
+        self.active_filters = filters if any(filters.values()) else None
+        query = dict(
             only_untagged=filters.get("only_untagged", False),
             people=filters.get("people"),
             groups=filters.get("groups"),
             emotions=filters.get("emotions"),
             location=filters.get("location"),
-            date=filters.get("date")
+            date=filters.get("date"),
+            date_from=filters.get("date_from"),
+            date_to=filters.get("date_to"),
+            search=filters.get("search")
         )
-        self.view.image_list = filtered_images
+        # Show the first page as soon as it arrives; the grid pulls the rest as it scrolls
+        self.results_generation += 1
+        self.db.call("get_filtered_page", **query,
+                     on_result=partial(self.on_first_page, self.results_generation, query))
+
+    def on_first_page(self, generation, query, page):
+        filenames, after = page
+        self.show_results(generation, filenames, self.page_fetcher(generation, query, after))
+
+    def page_fetcher(self, generation, query, after):
+        """What the grid calls for the page after the cursor, or None after the last page."""
+        if after is None:
+            return None
+        return partial(self.fetch_page, generation, query, after)
+
+    def fetch_page(self, generation, query, after, on_page):
+        self.db.call("get_filtered_page", after, **query,
+                     on_result=partial(self.on_page, generation, query, on_page),
+                     on_error=partial(self.on_page_failed, generation, query, after, on_page))
+
+    def on_page(self, generation, query, on_page, page):
+        if generation != self.results_generation:
+            return
+        filenames, after = page
+        on_page(filenames, self.page_fetcher(generation, query, after))
+
+    def on_page_failed(self, generation, query, after, on_page, error):
+        # No rows, but the same cursor, so scrolling on tries the page again
+        if generation == self.results_generation:
+            on_page([], self.page_fetcher(generation, query, after))
+
+    def show_results(self, generation, filenames, pages=None):
+        if generation != self.results_generation:
+            return
+        self.view.image_list = filenames
+        self.view.result_pages = pages
         self.view.display_grid_view()
+        self.refresh_facet_counts()
 
     def clear_filters(self):
         if not self.db:
             return
-        all_images = self.db.insert_images_if_missing(
-            [f for f in os.listdir(self.view.folder_path) if f.lower().endswith(
-                (".jpg", ".jpeg", ".png"))]
-        )
-        self.view.image_list = all_images
-        self.view.display_grid_view()
+        self.active_filters = None
+        self.results_generation += 1
+        self.db.read("get_all_filenames",
+                     on_result=partial(self.show_results, self.results_generation))
 
-    def get_metadata_for_image(self, filename):
+    def refresh_facet_counts(self):
+        """Label every filter option and timeline period with its match count."""
         if not self.db:
-            return None
-        return self.db.load_image_metadata(filename)
+            return
+        filters = self.view.filter_panel.collect_filter_data()
+        self.db.call("get_facet_counts", **filters,
+                     on_result=self.view.filter_panel.update_facet_counts)
+        self.db.call("get_date_histogram", **filters_without(filters, "date"),
+                     on_result=self.view.filter_panel.update_timeline)
+
+    def find_duplicates(self):
+        if not self.db or self.duplicate_thread or not self.view.find_duplicates_button.isEnabled():
+            return
+        # Disabled until the scan is over, so the candidates are only read once
+        self.view.find_duplicates_button.setEnabled(False)
+        self.db.read("get_hash_candidates",
+                     on_result=partial(self.start_duplicate_scan, self.db),
+                     on_error=lambda error: self.view.find_duplicates_button.setEnabled(True))
+
+    def start_duplicate_scan(self, db, candidates):
+        # The library may have been closed or switched while the candidates were read
+        if db is not self.db or self.duplicate_thread:
+            return
+        self.duplicate_thread = DuplicateScanThread(self.view.folder_path, candidates, parent=self.view)
+        self.duplicate_thread.hashes_ready.connect(
+            partial(self.on_duplicate_hashes, self.duplicate_thread))
+        self.duplicate_thread.finished.connect(self.duplicate_thread.deleteLater)
+        self.duplicate_thread.start()
+
+    def stop_duplicate_scan(self):
+        if self.duplicate_thread:
+            self.duplicate_thread.requestInterruption()
+            self.duplicate_thread.wait()
+            self.duplicate_thread = None
+        self.view.find_duplicates_button.setEnabled(True)
+
+    def on_duplicate_hashes(self, thread, updates, clusters):
+        # Image ids belong to the library the thread was started for
+        if thread is not self.duplicate_thread:
+            return
+        self.duplicate_thread = None
+        self.view.find_duplicates_button.setEnabled(True)
+        self.db.call("store_hashes", updates)
+        self.active_filters = {"duplicates": True}
+        self.results_generation += 1
+        self.db.call("get_duplicate_clusters",
+                     on_result=partial(self.show_duplicate_clusters, self.results_generation))
+
+    def show_duplicate_clusters(self, generation, clusters):
+        # Show the copies of each cluster next to each other
+        self.view.toast(f"Found {len(clusters)} groups of duplicate images.")
+        self.show_results(generation, [filename for cluster in clusters for filename in cluster])
+
+    def find_similar(self):
+        if not self.db or self.similar_thread or not self.view.find_similar_button.isEnabled():
+            return
+        self.view.find_similar_button.setEnabled(False)
+        self.db.read("get_images_without_dhash",
+                     on_result=partial(self.start_similar_scan, self.db),
+                     on_error=lambda error: self.view.find_similar_button.setEnabled(True))
+
+    def start_similar_scan(self, db, images):
+        if db is not self.db or self.similar_thread:
+            return
+        self.similar_thread = PerceptualHashThread(
+            self.view.folder_path, images, self.view.thumbnail_store, parent=self.view)
+        self.similar_thread.hashes_found.connect(
+            partial(self.on_similar_hashes, self.similar_thread))
+        self.similar_thread.finished.connect(
+            partial(self.on_similar_hashed, self.similar_thread))
+        self.similar_thread.finished.connect(self.similar_thread.deleteLater)
+        self.similar_thread.start()
+
+    def stop_similar_scan(self):
+        if self.similar_thread:
+            self.similar_thread.requestInterruption()
+            self.similar_thread.wait()
+            self.similar_thread = None
+        self.view.find_similar_button.setEnabled(True)
+
+    def on_similar_hashes(self, thread, hashes):
+        # Image ids belong to the library the thread was started for
+        if thread is not self.similar_thread:
+            return
+        self.db.call("store_dhashes", hashes)
+
+    def on_similar_hashed(self, thread):
+        if thread is not self.similar_thread:
+            return
+        self.similar_thread = None
+        self.view.find_similar_button.setEnabled(True)
+
+        self.active_filters = {"similar": True}
+        self.results_generation += 1
+        self.db.call("get_near_duplicate_clusters",
+                     on_result=partial(self.show_similar_clusters, self.results_generation))
+
+    def show_similar_clusters(self, generation, clusters):
+        self.view.toast(f"Found {len(clusters)} groups of similar images.")
+        self.show_results(generation, [filename for cluster in clusters for filename in cluster])
+
+    def geocode_library(self):
+        """Give photos with a GPS position but no location the nearest place in a gazetteer."""
+        if not self.db or self.geocode_thread or not self.view.geocode_button.isEnabled():
+            return
+        path, _ = QFileDialog.getOpenFileName(
+            self.view, "Select Gazetteer (GeoNames cities file)", "",
+            "GeoNames dumps (*.txt *.tsv);;All files (*)")
+        if not path:
+            return
+        self.view.geocode_button.setEnabled(False)
+        self.db.read("get_images_to_geocode",
+                     on_result=partial(self.start_geocode, self.db, path),
+                     on_error=lambda error: self.view.geocode_button.setEnabled(True))
+
+    def start_geocode(self, db, path, images):
+        if db is not self.db or self.geocode_thread:
+            return
+        if not images:
+            self.view.geocode_button.setEnabled(True)
+            self.view.toast("No photos with a GPS position are missing a location.")
+            return
+        self.geocode_thread = GeocodeThread(path, images, parent=self.view)
+        self.geocode_thread.locations_found.connect(
+            partial(self.on_locations_found, self.geocode_thread))
+        self.geocode_thread.failed.connect(self.on_geocode_failed)
+        self.geocode_thread.finished.connect(
+            partial(self.on_geocode_finished, self.geocode_thread))
+        self.geocode_thread.finished.connect(self.geocode_thread.deleteLater)
+        self.geocode_thread.start()
+
+    def stop_geocode(self):
+        if self.geocode_thread:
+            self.geocode_thread.requestInterruption()
+            self.geocode_thread.wait()
+            self.geocode_thread = None
+        self.view.geocode_button.setEnabled(True)
+
+    def on_locations_found(self, thread, assignments):
+        # Image ids belong to the library the thread was started for
+        if thread is not self.geocode_thread:
+            return
+        self.db.call("assign_locations", assignments,
+                     on_result=partial(self.on_locations_assigned, assignments))
+
+    def on_locations_assigned(self, assignments, filenames):
+        self.view.toast(f"Located {len(filenames)} photos from their GPS position.")
+        for filename in filenames:
+            self.view.prefetcher.invalidate_metadata(filename)
+        locations = {tuple(location.items()): location for _, location in assignments}
+        for location in locations.values():
+            self.vocabulary.record_saved(location=location)
+        self.refresh_facet_counts()
+
+    def on_geocode_failed(self, error):
+        QMessageBox.warning(self.view, "Geocoding Failed", f"Could not read the gazetteer:\n{error}")
+
+    def on_geocode_finished(self, thread):
+        if thread is not self.geocode_thread:
+            return
+        self.geocode_thread = None
+        self.view.geocode_button.setEnabled(True)
+
+    def get_metadata_for_image(self, filename, on_result):
+        if not self.db:
+            return
+        self.db.read_metadata(filename, on_result=on_result)
@@ -0,0 +1,48 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt6.QtCore import QThread, pyqtSignal
+
+from view.thumbnails import load_thumbnail, difference_hash
+
+HASH_BATCH_SIZE = 200
+
+
+class PerceptualHashThread(QThread):
+    """
+    Computes dHashes for images that do not have one yet. The hash is taken
+    from the grid thumbnail, so images that already have a fresh thumbnail
+    only decode the small JPEG, and the others store the thumbnail they had
+    to decode for the grid to reuse. Hashes are streamed back in batches for
+    the GUI thread to store.
+    """
+
+    hashes_found = pyqtSignal(list)
+
+    def __init__(self, root, images, thumbnail_store, parent=None):
+        super().__init__(parent)
+        self.root = root
+        self.images = images
+        self.thumbnail_store = thumbnail_store
+
+    def hash_image(self, filename):
+        if self.isInterruptionRequested():
+            return None
+        image = load_thumbnail(self.root, filename, self.thumbnail_store, allow_stale=False)
+        return None if image.isNull() else difference_hash(image)
+
+    def run(self):
+        batch = []
+        with ThreadPoolExecutor(max_workers=max(2, QThread.idealThreadCount())) as executor:
+            filenames = [filename for _, filename in self.images]
+            for (image_id, _), value in zip(self.images, executor.map(self.hash_image, filenames)):
+                if self.isInterruptionRequested():
+                    return
+                if value is not None:
+                    batch.append((image_id, value))
+                if len(batch) >= HASH_BATCH_SIZE:
+                    self.hashes_found.emit(batch)
+                    batch = []
+        if batch:
+            self.hashes_found.emit(batch)
+        if self.thumbnail_store:
+            self.thumbnail_store.save_index()
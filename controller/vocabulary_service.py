@@ -0,0 +1,38 @@
+from PyQt6.QtCore import QObject, pyqtSignal
+
+from model.vocabulary import Vocabulary, saved_values
+
+
+class VocabularyService(QObject):
+    """
+    Keeps the tag and location vocabularies in memory and announces changes
+    as deltas, so pick lists can insert or remove single entries instead of
+    being cleared and refilled after every save.
+
+    reset() follows a full load; changed(field, inserted, removed) carries
+    the sorted values that appeared in or disappeared from one field.
+    """
+
+    reset = pyqtSignal()
+    changed = pyqtSignal(str, list, list)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.vocabulary = Vocabulary()
+        self.values = self.vocabulary.values
+
+    def load(self, values):
+        self.vocabulary.load(values)
+        self.reset.emit()
+
+    def record_saved(self, people=(), groups=(), emotions=(), location=None):
+        """Follow a save; tag names are never deleted, so saves only add."""
+        for field, values in saved_values(people, groups, emotions, location).items():
+            inserted = self.vocabulary.add(field, values)
+            if inserted:
+                self.changed.emit(field, inserted, [])
+
+    def record_removed(self, field, values):
+        removed = self.vocabulary.remove(field, values)
+        if removed:
+            self.changed.emit(field, [], removed)
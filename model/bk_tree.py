@@ -0,0 +1,46 @@
+def hamming_distance(a, b):
+    return (a ^ b).bit_count()
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree over integer hashes under Hamming distance.
+    A range query only descends into children whose edge distance lies within
+    the search radius of the query's distance to the node, so looking up the
+    hashes within distance k touches a small part of the tree instead of
+    comparing against every hash.
+    """
+
+    def __init__(self):
+        self.root = None
+
+    def add(self, key, item):
+        node = [key, [item], {}]
+        if self.root is None:
+            self.root = node
+            return
+        current = self.root
+        while True:
+            distance = hamming_distance(key, current[0])
+            if distance == 0:
+                current[1].append(item)
+                return
+            child = current[2].get(distance)
+            if child is None:
+                current[2][distance] = node
+                return
+            current = child
+
+    def search(self, key, radius):
+        """Return (distance, item) for every item whose key is within radius of key."""
+        results = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node_key, items, children = stack.pop()
+            distance = hamming_distance(key, node_key)
+            if distance <= radius:
+                results.extend((distance, item) for item in items)
+            for edge, child in children.items():
+                if distance - radius <= edge <= distance + radius:
+                    stack.append(child)
+        return results
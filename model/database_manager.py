@@ -1,9 +1,114 @@
+import copy
+import json
 import sqlite3
+import threading
+
+from .duplicate_finder import (
+    NEAR_DUPLICATE_DISTANCE, find_near_duplicates, tag_differences,
+)
+from .dates import date_bounds, date_key, roll_up
+from .lru_cache import MISSING, LRUCache
+from .tag_index import LOCATION_FIELDS, TAG_FACETS, TagIndex, filters_without
+from .vocabulary import LOCATION_VALUE_FIELDS, VOCABULARY_FIELDS
+
+# Tag facet -> (tag table, junction table, junction column)
+TAG_TABLES = {
+    "people": ("Person", "ImagePerson", "person_id"),
+    "groups": ("GroupTag", "ImageGroup", "group_id"),
+    "emotions": ("EmotionTag", "ImageEmotion", "emotion_id"),
+}
+
+# Rows per page of filter results handed to the grid
+FILTER_PAGE_SIZE = 300
+
+# Entries kept by the per-image metadata cache and the filter query cache
+METADATA_CACHE_SIZE = 2000
+QUERY_CACHE_SIZE = 64
+
+# Relative bm25 weight of the description, tag and location columns of ImageSearch
+SEARCH_WEIGHTS = "bm25(3.0, 2.0, 1.0)"
+
+
+def search_rows(condition):
+    """
+    SQL that writes the ImageSearch rows of the images matching condition, a
+    WHERE clause over ImageMetadata im.
+    """
+    tags = " UNION ALL ".join(f"""
+        SELECT t.name FROM {junction} j JOIN {tag_table} t ON t.id = j.{column}
+        WHERE j.image_id = im.id
+    """ for tag_table, junction, column in TAG_TABLES.values())
+    return f"""
+        INSERT INTO ImageSearch (rowid, description, tags, location)
+        SELECT im.id, im.description,
+            (SELECT group_concat(name, ' ') FROM ({tags})),
+            (SELECT coalesce(l.name, '') || ' ' || coalesce(l.category, '') || ' ' ||
+                    coalesce(l.country, '') || ' ' || coalesce(l.region, '') || ' ' ||
+                    coalesce(l.city, '')
+             FROM Location l WHERE l.id = im.location_id)
+        FROM ImageMetadata im WHERE {condition};
+    """
+
+
+def search_document(image_id):
+    """SQL that rewrites the ImageSearch row of one image, e.g. NEW.id."""
+    return f"""
+        DELETE FROM ImageSearch WHERE rowid = {image_id};
+        {search_rows(f"im.id = {image_id}")}
+    """
+
+
+def filter_signature(filters):
+    """
+    Hashable form of a set of filters in which equivalent selections are
+    equal: unset filters are dropped and the order of selected values is ignored.
+    """
+    signature = []
+    for name, value in sorted(filters.items()):
+        if not value:
+            continue
+        if isinstance(value, dict):
+            value = tuple(sorted((field, tuple(sorted(values)))
+                                 for field, values in value.items() if values))
+        elif isinstance(value, (list, tuple, set)):
+            value = tuple(sorted(value))
+        elif name == "search":
+            value = " ".join(value.lower().split())
+        signature.append((name, value))
+    return tuple(signature)
+
+
+def search_query(text):
+    """
+    Turn what was typed in the search box into an FTS5 query: every word must
+    match, and matches the start of longer words ("sun" finds "sunset").
+    """
+    words = [word.replace('"', '') for word in text.split()]
+    return " ".join(f'"{word}"*' for word in words if word) or None
 
 class DatabaseManager:
-    def __init__(self, db_path):
+    def __init__(self, db_path, read_only=False):
+        """
+        read_only opens an extra connection for use off the GUI thread; it
+        skips schema creation and refuses writes.
+        """
+        self.db_path = db_path
         self.conn = sqlite3.connect(db_path)
-        self.create_tables()
+        self.tag_index = None
+
+        # Readers on other threads never see the writes that invalidate a cache
+        self.write_generation = 0
+        self.metadata_cache = LRUCache(0 if read_only else METADATA_CACHE_SIZE)
+        self.query_cache = LRUCache(0 if read_only else QUERY_CACHE_SIZE)
+        # Reader threads use the metadata cache too, see load_shared_metadata
+        self.cache_lock = threading.Lock()
+        if read_only:
+            self.conn.execute("PRAGMA query_only = ON")
+        else:
+            # WAL lets readers on other connections run while a write is in progress
+            self.conn.execute("PRAGMA journal_mode = WAL")
+            self.conn.execute("PRAGMA synchronous = NORMAL")
+            self.create_tables()
 
     def create_tables(self):
         cursor = self.conn.cursor()
@@ -68,25 +173,362 @@ class DatabaseManager:
                 postcode TEXT
             );
         """)
+        self.add_missing_columns("ImageMetadata", {
+            "file_size": "INTEGER",
+            "file_mtime": "INTEGER",
+            "present": "INTEGER DEFAULT 1",
+            "partial_hash": "TEXT",
+            "content_hash": "TEXT",
+            "dhash": "INTEGER",
+            "date_key": "INTEGER",
+            # Read from the file's EXIF header; exif_scanned is reset when the file changes
+            "exif_scanned": "INTEGER",
+            "taken_at": "TEXT",
+            "orientation": "INTEGER",
+            "gps_latitude": "REAL",
+            "gps_longitude": "REAL",
+        })
+        self.backfill_date_keys()
+        self.create_search_index()
+        cursor.executescript("""
+            CREATE INDEX IF NOT EXISTS idx_image_content_hash ON ImageMetadata(content_hash);
+            CREATE INDEX IF NOT EXISTS idx_image_location ON ImageMetadata(location_id);
+            CREATE INDEX IF NOT EXISTS idx_image_date_key ON ImageMetadata(date_key);
+
+            -- Reverse junction indexes, so images can be looked up by tag
+            CREATE INDEX IF NOT EXISTS idx_imageperson_person ON ImagePerson(person_id, image_id);
+            CREATE INDEX IF NOT EXISTS idx_imagegroup_group ON ImageGroup(group_id, image_id);
+            CREATE INDEX IF NOT EXISTS idx_imageemotion_emotion ON ImageEmotion(emotion_id, image_id);
+        """)
         self.conn.commit()
 
-    def insert_images_if_missing(self, filenames):
+    def create_search_index(self):
         """
-        Add filenames to ImageMetadata if they don't already exist.
-        Returns a list of filenames that are in the database (for UI display).
+        FTS5 index over each image's description, tag names and location,
+        filled once when it is first created. Triggers follow changes to
+        ImageMetadata and Location; tag changes touch many junction rows per
+        image, so save_metadata and bulk_update_metadata call refresh_search
+        once per statement instead.
         """
         cursor = self.conn.cursor()
-        for filename in filenames:
-            cursor.execute("""
-                INSERT OR IGNORE INTO ImageMetadata (filename)
-                VALUES (?)
-            """, (filename,))
-        self.conn.commit()
+        # Databases from before then rebuilt an image's row for every junction row
+        for _, junction, _ in TAG_TABLES.values():
+            cursor.execute(f"DROP TRIGGER IF EXISTS {junction.lower()}_search_insert")
+            cursor.execute(f"DROP TRIGGER IF EXISTS {junction.lower()}_search_delete")
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'ImageSearch'")
+        if cursor.fetchone():
+            return
+
+        triggers = [f"""
+            -- Freshly scanned images have nothing to search yet
+            CREATE TRIGGER IF NOT EXISTS image_search_insert AFTER INSERT ON ImageMetadata
+            WHEN NEW.description IS NOT NULL OR NEW.location_id IS NOT NULL
+            BEGIN {search_document("NEW.id")} END;
+            CREATE TRIGGER IF NOT EXISTS image_search_update
+            AFTER UPDATE OF description, location_id ON ImageMetadata
+            BEGIN {search_document("NEW.id")} END;
+            CREATE TRIGGER IF NOT EXISTS image_search_delete AFTER DELETE ON ImageMetadata
+            BEGIN DELETE FROM ImageSearch WHERE rowid = OLD.id; END;
+            CREATE TRIGGER IF NOT EXISTS image_search_location AFTER UPDATE ON Location
+            BEGIN
+                DELETE FROM ImageSearch
+                WHERE rowid IN (SELECT id FROM ImageMetadata WHERE location_id = NEW.id);
+                {search_rows("im.location_id = NEW.id")}
+            END;
+        """]
+
+        cursor.executescript(f"""
+            BEGIN;
+            CREATE VIRTUAL TABLE ImageSearch USING fts5(
+                description, tags, location,
+                prefix='2 3', tokenize='unicode61 remove_diacritics 2'
+            );
+            INSERT INTO ImageSearch (ImageSearch, rank) VALUES ('rank', '{SEARCH_WEIGHTS}');
+            {"".join(triggers)}
+            {search_rows("im.tagged = 1 OR im.description IS NOT NULL OR im.location_id IS NOT NULL")}
+            COMMIT;
+        """)
+
+    def refresh_search(self, cursor, condition, params=()):
+        """Rewrite the ImageSearch rows of the images matching condition, a WHERE clause over ImageMetadata im."""
+        cursor.execute(f"""
+            DELETE FROM ImageSearch
+            WHERE rowid IN (SELECT im.id FROM ImageMetadata im WHERE {condition})
+        """, params)
+        cursor.execute(search_rows(condition), params)
+
+    def add_missing_columns(self, table, columns):
+        """
+        Add columns introduced after a database was first created.
+        columns maps column name to its SQL type.
+        """
+        cursor = self.conn.cursor()
+        cursor.execute(f"PRAGMA table_info({table})")
+        existing = {row[1] for row in cursor.fetchall()}
+        for name, column_type in columns.items():
+            if name not in existing:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}")
+
+    def backfill_date_keys(self):
+        """Fill date_key for dates written before the column existed."""
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            SELECT id, date FROM ImageMetadata
+            WHERE date_key IS NULL AND date IS NOT NULL AND date != ''
+        """)
+        keys = [(date_key(date), image_id) for image_id, date in cursor.fetchall()]
+        cursor.executemany("UPDATE ImageMetadata SET date_key = ? WHERE id = ?",
+                           [(key, image_id) for key, image_id in keys if key])
+
+    def enable_tag_index(self):
+        """
+        Keep an in-memory TagIndex alongside the database. Writes made through
+        this manager update it, and get_filtered_images is answered from it.
+        """
+        self.tag_index = TagIndex()
+        self.tag_index.load(self.get_tag_index_rows())
+
+    def get_tag_index_rows(self):
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT id, name, category, country, region, city FROM Location")
+        locations = {row[0]: dict(zip(("name", "category", "country", "region", "city"), row[1:]))
+                     for row in cursor.fetchall()}
+
+        cursor.execute("""
+            SELECT id, filename, date, tagged, present, location_id FROM ImageMetadata ORDER BY id
+        """)
+        rows = {"images": [row[:5] + (locations.get(row[5]),) for row in cursor.fetchall()]}
+        for facet, (tag_table, junction, column) in TAG_TABLES.items():
+            cursor.execute(f"""
+                SELECT j.image_id, t.name FROM {junction} j
+                JOIN {tag_table} t ON t.id = j.{column}
+            """)
+            rows[facet] = cursor.fetchall()
+        return rows
+
+    def invalidate(self, filenames=()):
+        """
+        Note a write: cached query results belong to an older write generation
+        from now on, and the cached metadata of filenames is dropped.
+        """
+        with self.cache_lock:
+            self.write_generation += 1
+            for filename in filenames:
+                self.metadata_cache.pop(filename)
 
-        # Return all filenames known to the DB for display
-        cursor.execute("SELECT filename FROM ImageMetadata")
+    def cached_query(self, kind, filters, compute, copy_result=copy.deepcopy):
+        """
+        Return compute() through the query cache, keyed on the write generation.
+        Callers may modify what they get, e.g. the grid extends its list, so
+        they get a copy; results that are flat lists of filenames pass a
+        shallow copy_result, as deep-copying 200k strings costs far more.
+        """
+        key = (self.write_generation, kind, filter_signature(filters))
+        result = self.query_cache.get(key)
+        if result is MISSING:
+            result = compute()
+            self.query_cache.put(key, result)
+        return copy_result(result)
+
+    def cache_stats(self):
+        return {
+            "write_generation": self.write_generation,
+            "metadata": self.metadata_cache.stats(),
+            "queries": self.query_cache.stats(),
+        }
+
+    def get_all_filenames(self):
+        """Return every image currently present in the folder."""
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT filename FROM ImageMetadata WHERE present = 1 ORDER BY filename")
         return [row[0] for row in cursor.fetchall()]
-    
+
+    def get_file_signatures(self):
+        """Return {filename: (size, mtime_ns)} for every image present in the library."""
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            SELECT filename, file_size, file_mtime FROM ImageMetadata WHERE present = 1
+        """)
+        return {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+
+    def apply_folder_changes(self, changes):
+        """
+        Write a diff from folder_scanner in one transaction.
+        Files that disappeared are marked as not present rather than deleted,
+        so their tags survive if they come back.
+        """
+        cursor = self.conn.cursor()
+        renamed = []
+        added = list(changes["added"])
+        removed = list(changes["removed"])
+        with self.conn:
+            for old, new, size, mtime in changes["renamed"]:
+                # A streamed scan may already have inserted the new path as an untagged image
+                cursor.execute("DELETE FROM ImageMetadata WHERE filename = ? AND tagged = 0",
+                               (new,))
+                try:
+                    cursor.execute("""
+                        UPDATE ImageMetadata SET filename = ?, file_size = ?, file_mtime = ?
+                        WHERE filename = ?
+                    """, (new, size, mtime, old))
+                    renamed.append((old, new))
+                except sqlite3.IntegrityError:
+                    # The new path has tags of its own from an earlier visit
+                    cursor.execute("UPDATE ImageMetadata SET present = 0 WHERE filename = ?",
+                                   (old,))
+                    added.append((new, size, mtime))
+                    removed.append(old)
+
+            cursor.executemany("""
+                INSERT INTO ImageMetadata (filename, file_size, file_mtime, present)
+                VALUES (?, ?, ?, 1)
+                ON CONFLICT(filename) DO UPDATE SET
+                    partial_hash=CASE WHEN file_size IS excluded.file_size
+                        AND file_mtime IS excluded.file_mtime THEN partial_hash END,
+                    content_hash=CASE WHEN file_size IS excluded.file_size
+                        AND file_mtime IS excluded.file_mtime THEN content_hash END,
+                    dhash=CASE WHEN file_size IS excluded.file_size
+                        AND file_mtime IS excluded.file_mtime THEN dhash END,
+                    exif_scanned=CASE WHEN file_size IS excluded.file_size
+                        AND file_mtime IS excluded.file_mtime THEN exif_scanned END,
+                    file_size=excluded.file_size,
+                    file_mtime=excluded.file_mtime,
+                    present=1
+            """, added + list(changes["changed"]))
+            cursor.executemany("UPDATE ImageMetadata SET present = 0 WHERE filename = ?",
+                               [(filename,) for filename in removed])
+
+        report = {
+            "added": [entry[0] for entry in added],
+            "changed": [entry[0] for entry in changes["changed"]],
+            "removed": removed,
+            "renamed": renamed,
+        }
+        self.invalidate(report["added"] + report["removed"]
+                        + [filename for pair in renamed for filename in pair])
+        if self.tag_index:
+            self.tag_index.apply_folder_report(report)
+        return report
+
+    def get_hash_candidates(self):
+        """Rows for duplicate_finder.find_duplicates: (id, filename, size, partial_hash, content_hash)."""
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            SELECT id, filename, file_size, partial_hash, content_hash
+            FROM ImageMetadata WHERE present = 1
+        """)
+        return cursor.fetchall()
+
+    def store_hashes(self, updates):
+        """updates are (id, partial_hash, content_hash) tuples."""
+        with self.conn:
+            self.conn.executemany("""
+                UPDATE ImageMetadata SET partial_hash = ?, content_hash = ? WHERE id = ?
+            """, [(partial, content, image_id) for image_id, partial, content in updates])
+
+    def get_duplicate_clusters(self):
+        """Return lists of filenames whose contents are byte-identical."""
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            SELECT content_hash, filename FROM ImageMetadata
+            WHERE present = 1 AND content_hash IN (
+                SELECT content_hash FROM ImageMetadata
+                WHERE present = 1 AND content_hash IS NOT NULL
+                GROUP BY content_hash HAVING COUNT(*) > 1
+            )
+            ORDER BY content_hash, filename
+        """)
+        clusters = {}
+        for content, filename in cursor.fetchall():
+            clusters.setdefault(content, []).append(filename)
+        return list(clusters.values())
+
+    def get_images_without_dhash(self):
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT id, filename FROM ImageMetadata WHERE present = 1 AND dhash IS NULL")
+        return cursor.fetchall()
+
+    def store_dhashes(self, hashes):
+        """hashes are (id, dhash) pairs with dhash as an unsigned 64-bit int."""
+        with self.conn:
+            self.conn.executemany("UPDATE ImageMetadata SET dhash = ? WHERE id = ?", [
+                (value - (1 << 64) if value >= 1 << 63 else value, image_id)
+                for image_id, value in hashes
+            ])
+
+    def get_images_without_exif(self):
+        """(id, filename) of present images whose EXIF has not been read since they last changed."""
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT id, filename FROM ImageMetadata WHERE present = 1 AND exif_scanned IS NULL")
+        return cursor.fetchall()
+
+    def store_exif(self, results):
+        """
+        results are (id, exif) pairs from exif_reader.read_exif, exif being
+        None for files without one. Images with no date yet take the capture
+        date, so they sort and filter by date before anyone tags them.
+        Returns the filenames whose date was filled in.
+        """
+        rows = [(exif["taken"], exif["orientation"], exif["latitude"], exif["longitude"], image_id)
+                if exif else (None, None, None, None, image_id)
+                for image_id, exif in results]
+        taken = {image_id: exif["taken"][:10] for image_id, exif in results
+                 if exif and exif["taken"]}
+        cursor = self.conn.cursor()
+        with self.conn:
+            cursor.executemany("""
+                UPDATE ImageMetadata SET exif_scanned = 1, taken_at = ?, orientation = ?,
+                    gps_latitude = ?, gps_longitude = ?
+                WHERE id = ?
+            """, rows)
+            cursor.execute("""
+                SELECT id, filename FROM ImageMetadata
+                WHERE id IN (SELECT value FROM json_each(?)) AND (date IS NULL OR date = '')
+            """, (json.dumps(list(taken)),))
+            undated = cursor.fetchall()
+            cursor.executemany("UPDATE ImageMetadata SET date = ?, date_key = ? WHERE id = ?", [
+                (taken[image_id], date_key(taken[image_id]), image_id) for image_id, _ in undated
+            ])
+
+        filenames = [filename for _, filename in undated]
+        self.invalidate(filenames)
+        if self.tag_index:
+            self.tag_index.set_dates({filename: taken[image_id] for image_id, filename in undated})
+        return filenames
+
+    def get_near_duplicate_clusters(self, max_distance=NEAR_DUPLICATE_DISTANCE):
+        """Return lists of filenames whose perceptual hashes are within max_distance bits."""
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            SELECT filename, dhash FROM ImageMetadata WHERE present = 1 AND dhash IS NOT NULL
+        """)
+        # SQLite integers are signed; the BK-tree works on the unsigned value
+        hashes = [(filename, value & ((1 << 64) - 1)) for filename, value in cursor.fetchall()]
+        return find_near_duplicates(hashes, max_distance)
+
+    def get_duplicate_review(self):
+        """
+        Return each duplicate cluster with the metadata of its images and the
+        fields on which their tags disagree, for deciding which copy to keep.
+        """
+        return self.review_clusters(self.get_duplicate_clusters())
+
+    def get_near_duplicate_review(self, max_distance=NEAR_DUPLICATE_DISTANCE):
+        return self.review_clusters(self.get_near_duplicate_clusters(max_distance))
+
+    def review_clusters(self, clusters):
+        review = []
+        all_metadata = self.load_metadata_batch(
+            [filename for filenames in clusters for filename in filenames])
+        for filenames in clusters:
+            metadata = {filename: all_metadata[filename] for filename in filenames}
+            review.append({
+                "filenames": filenames,
+                "metadata": metadata,
+                "differences": tag_differences(metadata),
+            })
+        return review
+
     def save_metadata(self, filename, description, people, groups, emotions, location, date):
         cursor = self.conn.cursor()
 
@@ -94,14 +536,15 @@ class DatabaseManager:
         location_id = self.get_or_create_location(location) if location else None
 
         cursor.execute("""
-            INSERT INTO ImageMetadata (filename, description, location_id, date, tagged)
-            VALUES (?, ?, ?, ?, 1)
+            INSERT INTO ImageMetadata (filename, description, location_id, date, date_key, tagged)
+            VALUES (?, ?, ?, ?, ?, 1)
             ON CONFLICT(filename) DO UPDATE SET
                 description=excluded.description,
                 location_id=excluded.location_id,
                 date=excluded.date,
+                date_key=excluded.date_key,
                 tagged=1
-        """, (filename, description, location_id, date))
+        """, (filename, description, location_id, date, date_key(date)))
 
 
         # Step 2: Get image ID
@@ -137,8 +580,83 @@ class DatabaseManager:
         # Step 7: Insert location
         location_id = self.get_or_create_location(location) if location else None
 
+        # Step 8: Index the new tags for search, once for all of them
+        self.refresh_search(cursor, "im.id = ?", (image_id,))
+
         self.conn.commit()
 
+        self.invalidate([filename])
+        if self.tag_index:
+            self.tag_index.set_image(filename, people, groups, emotions, location, date)
+
+    def bulk_update_metadata(self, filenames, add=None, remove=None, location=None, date=None):
+        """
+        Tag many images at once with set-based statements in one transaction.
+        add and remove map "people", "groups" and "emotions" to lists of names;
+        location (a dict as for get_or_create_location) and date replace the
+        current values when given. Images only count as tagged once something
+        is added or assigned. Returns the number of images updated.
+        """
+        filenames = list(filenames)
+        add = add or {}
+        remove = remove or {}
+        cursor = self.conn.cursor()
+
+        with self.conn:
+            location_id = self.get_or_create_location(location, commit=False) if location else None
+            cursor.execute("CREATE TEMP TABLE IF NOT EXISTS BulkSelection (image_id INTEGER PRIMARY KEY)")
+            cursor.execute("DELETE FROM temp.BulkSelection")
+            cursor.execute("""
+                INSERT OR IGNORE INTO temp.BulkSelection (image_id)
+                SELECT im.id FROM json_each(?) AS j
+                JOIN ImageMetadata im ON im.filename = j.value
+            """, (json.dumps(list(filenames)),))
+            count = cursor.rowcount
+
+            for facet, (tag_table, junction, column) in TAG_TABLES.items():
+                names = add.get(facet)
+                if names:
+                    cursor.executemany(f"INSERT OR IGNORE INTO {tag_table} (name) VALUES (?)",
+                                       [(name,) for name in names])
+                    cursor.execute(f"""
+                        INSERT OR IGNORE INTO {junction} (image_id, {column})
+                        SELECT s.image_id, t.id
+                        FROM temp.BulkSelection s CROSS JOIN {tag_table} t
+                        WHERE t.name IN (SELECT value FROM json_each(?))
+                    """, (json.dumps(names),))
+
+                names = remove.get(facet)
+                if names:
+                    cursor.execute(f"""
+                        DELETE FROM {junction}
+                        WHERE image_id IN (SELECT image_id FROM temp.BulkSelection)
+                          AND {column} IN (
+                              SELECT id FROM {tag_table}
+                              WHERE name IN (SELECT value FROM json_each(?))
+                          )
+                    """, (json.dumps(names),))
+
+            assignments = ["tagged = 1"] if any(add.values()) or location or date else []
+            params = []
+            if location:
+                assignments.append("location_id = ?")
+                params.append(location_id)
+            if date:
+                assignments.append("date = ?, date_key = ?")
+                params.extend([date, date_key(date)])
+            if assignments:
+                cursor.execute(f"""
+                    UPDATE ImageMetadata SET {", ".join(assignments)}
+                    WHERE id IN (SELECT image_id FROM temp.BulkSelection)
+                """, params)
+            if any(add.values()) or any(remove.values()):
+                self.refresh_search(cursor, "im.id IN (SELECT image_id FROM temp.BulkSelection)")
+
+        self.invalidate(filenames)
+        if self.tag_index:
+            self.tag_index.bulk_update(filenames, add, remove, location, date)
+        return count
+
     def get_all_people_names(self):
         cursor = self.conn.cursor()
         cursor.execute("SELECT DISTINCT name FROM Person ORDER BY name")
@@ -154,11 +672,28 @@ class DatabaseManager:
         cursor.execute("SELECT DISTINCT name FROM EmotionTag ORDER BY name")
         return [row[0] for row in cursor.fetchall()]
 
+    def get_vocabulary(self):
+        """
+        Every tag name and location field value in one statement, as
+        {field: sorted values} for the facets and the location fields.
+        """
+        selects = [f"SELECT '{facet}', name FROM {tag_table}"
+                   for facet, (tag_table, _, _) in TAG_TABLES.items()]
+        selects += [f"SELECT '{field}', {field} FROM Location WHERE {field} IS NOT NULL"
+                    for field in LOCATION_VALUE_FIELDS]
+        cursor = self.conn.cursor()
+        cursor.execute(f"SELECT DISTINCT * FROM ({' UNION ALL '.join(selects)}) ORDER BY 1, 2")
+        vocabulary = {field: [] for field in VOCABULARY_FIELDS}
+        for field, value in cursor.fetchall():
+            vocabulary[field].append(value)
+        return vocabulary
+
         
-    def get_or_create_location(self, location_data):
+    def get_or_create_location(self, location_data, commit=True):
         """
         Accepts a dictionary with fields: name, category, country, region, city, postcode.
-        Returns the ID of the location.
+        Returns the ID of the location. commit=False leaves a new row to the
+        caller's transaction.
         """
         cursor = self.conn.cursor()
         cursor.execute("""
@@ -187,34 +722,140 @@ class DatabaseManager:
             location_data.get("city"),
             location_data.get("postcode")
         ))
-        self.conn.commit()
+        if commit:
+            self.conn.commit()
         return cursor.lastrowid
 
-    def load_image_metadata(self, filename):
+    def get_images_to_geocode(self):
+        """(id, latitude, longitude) of present images with a GPS position but no location."""
         cursor = self.conn.cursor()
         cursor.execute("""
-            SELECT im.description, im.date,
-                l.name, l.category, l.country, l.region, l.city, l.postcode
-            FROM ImageMetadata im
+            SELECT id, gps_latitude, gps_longitude FROM ImageMetadata
+            WHERE present = 1 AND location_id IS NULL AND gps_latitude IS NOT NULL
+        """)
+        return cursor.fetchall()
+
+    def assign_locations(self, assignments):
+        """
+        Set the location of many images, e.g. from reverse geocoding.
+        assignments are (id, location) pairs with location a dict as for
+        get_or_create_location; each distinct location is looked up or
+        created once. Images that were given a location in the meantime are
+        left alone. Returns the filenames that were updated.
+        """
+        locations = {}
+        for image_id, location in assignments:
+            key = tuple(location.get(field) for field in LOCATION_VALUE_FIELDS)
+            if key not in locations:
+                locations[key] = (self.get_or_create_location(location), location, [])
+            locations[key][2].append(image_id)
+
+        cursor = self.conn.cursor()
+        updated = []
+        with self.conn:
+            for location_id, location, image_ids in locations.values():
+                cursor.execute("""
+                    SELECT id, filename FROM ImageMetadata
+                    WHERE id IN (SELECT value FROM json_each(?)) AND location_id IS NULL
+                """, (json.dumps(image_ids),))
+                rows = cursor.fetchall()
+                cursor.executemany("UPDATE ImageMetadata SET location_id = ? WHERE id = ?",
+                                   [(location_id, image_id) for image_id, _ in rows])
+                updated.append(([filename for _, filename in rows], location))
+
+        filenames = [filename for group, _ in updated for filename in group]
+        self.invalidate(filenames)
+        if self.tag_index:
+            for group, location in updated:
+                self.tag_index.set_location(self.tag_index.selection(group), location)
+        return filenames
+
+    def load_image_metadata(self, filename):
+        return self.load_metadata_batch([filename])[filename]
+
+    def load_metadata_batch(self, filenames):
+        """
+        Load the metadata of many images in one statement, returning
+        {filename: metadata}. Each image's tag lists are gathered by image id
+        with json_group_array in the same row, so no query runs per image or
+        per tag facet. Unknown filenames get empty metadata. Images in the
+        metadata cache are not queried again.
+        """
+        metadata = {}
+        with self.cache_lock:
+            for filename in filenames:
+                cached = self.metadata_cache.get(filename)
+                if cached is not MISSING:
+                    metadata[filename] = copy.deepcopy(cached)
+        missing = [filename for filename in filenames if filename not in metadata]
+        if not missing:
+            return metadata
+        loaded = self.query_metadata(missing)
+        with self.cache_lock:
+            for filename, value in loaded.items():
+                self.metadata_cache.put(filename, copy.deepcopy(value))
+        metadata.update(loaded)
+        return metadata
+
+    def load_shared_metadata(self, filename, reader):
+        """
+        load_image_metadata for a reader thread: answered from this
+        connection's metadata cache, or else queried on reader, the thread's
+        own read-only manager, and cached unless a write invalidated the cache
+        in the meantime and the reader's snapshot may predate it.
+        """
+        with self.cache_lock:
+            cached = self.metadata_cache.get(filename)
+            generation = self.write_generation
+        if cached is not MISSING:
+            return copy.deepcopy(cached)
+        metadata = reader.query_metadata([filename])[filename]
+        with self.cache_lock:
+            if generation == self.write_generation:
+                self.metadata_cache.put(filename, copy.deepcopy(metadata))
+        return metadata
+
+    def query_metadata(self, filenames):
+        tag_columns = ",".join(f"""
+            (SELECT json_group_array(t.name) FROM {junction} j
+             JOIN {tag_table} t ON t.id = j.{column}
+             WHERE j.image_id = im.id)
+        """ for tag_table, junction, column in TAG_TABLES.values())
+        cursor = self.conn.cursor()
+        cursor.execute(f"""
+            SELECT im.filename, im.description, im.date,
+                l.name, l.category, l.country, l.region, l.city, l.postcode,
+                {tag_columns}
+            FROM json_each(?) AS f
+            JOIN ImageMetadata im ON im.filename = f.value
             LEFT JOIN Location l ON im.location_id = l.id
-            WHERE im.filename = ?
-        """, (filename,))
-        row = cursor.fetchone()
-        return {
-            "description": row[0] if row else "",
-            "date": row[1] if row else "",
-            "location": {
-                "name": row[2],
-                "category": row[3],
-                "country": row[4],
-                "region": row[5],
-                "city": row[6],
-                "postcode": row[7],
-            } if row and row[2] else None,
-            "people": self.get_people_for_image(filename),
-            "groups": self.get_groups_for_image(filename),
-            "emotions": self.get_emotions_for_image(filename)
-        }
+        """, (json.dumps(list(filenames)),))
+
+        metadata = {filename: {
+            "description": "",
+            "date": "",
+            "location": None,
+            "people": [],
+            "groups": [],
+            "emotions": [],
+        } for filename in filenames}
+        for row in cursor.fetchall():
+            metadata[row[0]] = {
+                "description": row[1],
+                "date": row[2],
+                "location": {
+                    "name": row[3],
+                    "category": row[4],
+                    "country": row[5],
+                    "region": row[6],
+                    "city": row[7],
+                    "postcode": row[8],
+                } if row[3] else None,
+                "people": json.loads(row[9]),
+                "groups": json.loads(row[10]),
+                "emotions": json.loads(row[11]),
+            }
+        return metadata
     
     def get_people_for_image(self, filename):
         cursor = self.conn.cursor()
@@ -249,58 +890,268 @@ class DatabaseManager:
         """, (filename,))
         return [row[0] for row in cursor.fetchall()]
 
-    def get_filtered_images(self, only_untagged=False, people=None, groups=None, emotions=None, location=None, date=None):
-        cursor = self.conn.cursor()
-
-        query = """
-        SELECT DISTINCT im.filename
-        FROM ImageMetadata im
-        LEFT JOIN Location l ON im.location_id = l.id
-        LEFT JOIN ImagePerson ip ON im.id = ip.image_id
-        LEFT JOIN Person p ON ip.person_id = p.id
-        LEFT JOIN ImageGroup ig ON im.id = ig.image_id
-        LEFT JOIN GroupTag gt ON ig.group_id = gt.id
-        LEFT JOIN ImageEmotion ie ON im.id = ie.image_id
-        LEFT JOIN EmotionTag et ON ie.emotion_id = et.id
-        WHERE 1 = 1
+    def compile_filters(self, only_untagged=False, people=None, groups=None, emotions=None,
+                        location=None, date=None, date_from=None, date_to=None, search=None):
         """
+        Turn filter selections into a WHERE clause over ImageMetadata im.
+        Within a facet any selected value matches; across facets all must match.
+        Each tag facet becomes a lookup of image ids by tag id on the reverse
+        junction index, and the facets are combined with INTERSECT, so no row
+        is multiplied by an image's other tags. Returns (sql, params).
+        """
+        conditions = ["im.present = 1"]
         params = []
 
         if only_untagged:
-            query += " AND im.tagged = 0"
-
-        if people:
-            placeholders = ",".join("?" for _ in people)
-            query += f" AND p.name IN ({placeholders})"
-            params.extend(people)
-
-        if groups:
-            placeholders = ",".join("?" for _ in groups)
-            query += f" AND gt.name IN ({placeholders})"
-            params.extend(groups)
+            conditions.append("im.tagged = 0")
 
-        if emotions:
-            placeholders = ",".join("?" for _ in emotions)
-            query += f" AND et.name IN ({placeholders})"
-            params.extend(emotions)
+        tag_queries = []
+        for facet, names in (("people", people), ("groups", groups), ("emotions", emotions)):
+            if not names:
+                continue
+            tag_table, junction, column = TAG_TABLES[facet]
+            placeholders = ",".join("?" for _ in names)
+            tag_queries.append(f"""
+                SELECT j.image_id FROM {tag_table} t
+                JOIN {junction} j ON j.{column} = t.id
+                WHERE t.name IN ({placeholders})
+            """)
+            params.extend(names)
+        if tag_queries:
+            conditions.append(f"im.id IN ({' INTERSECT '.join(tag_queries)})")
 
         if isinstance(location, dict):
+            location_conditions = []
             for field in ["name", "category", "country", "region", "city"]:
                 values = location.get(field)
                 if values:
                     placeholders = ",".join("?" for _ in values)
-                    query += f" AND l.{field} IN ({placeholders})"
+                    location_conditions.append(f"{field} IN ({placeholders})")
                     params.extend(values)
+            if location_conditions:
+                conditions.append(f"""
+                    im.location_id IN (SELECT id FROM Location WHERE {" AND ".join(location_conditions)})
+                """)
 
         if date:
-            query += " AND im.date = ?"
+            conditions.append("im.date = ?")
             params.append(date)
 
-        query += " ORDER BY im.date DESC"
+        # Periods may be "yyyy", "yyyy-MM" or "yyyy-MM-dd"
+        if date_from:
+            conditions.append("im.date_key >= ?")
+            params.append(date_bounds(date_from)[0])
+        if date_to:
+            conditions.append("im.date_key <= ?")
+            params.append(date_bounds(date_to)[1])
+
+        query = search_query(search) if search else None
+        if query:
+            conditions.append("im.id IN (SELECT rowid FROM ImageSearch WHERE ImageSearch MATCH ?)")
+            params.append(query)
+
+        return " AND ".join(conditions), params
 
-        cursor.execute(query, params)
+    def get_filtered_images(self, only_untagged=False, people=None, groups=None, emotions=None, location=None, date=None,
+                            date_from=None, date_to=None, search=None):
+        """
+        Filenames matching the filters, newest first, or best search match
+        first when search text is given.
+        """
+        filters = dict(only_untagged=only_untagged, people=people, groups=groups, emotions=emotions,
+                       location=location, date=date, date_from=date_from, date_to=date_to, search=search)
+        return self.cached_query("images", filters, lambda: self.query_filtered_images(**filters),
+                                 copy_result=list)
+
+    def query_filtered_images(self, only_untagged=False, people=None, groups=None, emotions=None, location=None,
+                              date=None, date_from=None, date_to=None, search=None):
+        query = search_query(search) if search else None
+        if self.tag_index:
+            filters = dict(only_untagged=only_untagged, people=people, groups=groups, emotions=emotions,
+                           location=location, date=date, date_from=date_from, date_to=date_to)
+            if query:
+                return self.tag_index.filter_ranked(self.search_filenames(search), **filters)
+            return self.tag_index.filter(**filters)
+
+        cursor = self.conn.cursor()
+        cursor.execute(*self.filtered_images_sql(
+            only_untagged=only_untagged, people=people, groups=groups, emotions=emotions,
+            location=location, date=date, date_from=date_from, date_to=date_to, search=search))
         return [row[0] for row in cursor.fetchall()]
-    
+
+    def filtered_images_sql(self, search=None, **filters):
+        """(sql, params) selecting the filenames that match, as get_filtered_images orders them."""
+        query = search_query(search) if search else None
+        where, params = self.compile_filters(**filters)
+        if query:
+            return f"""
+                SELECT im.filename FROM ImageSearch
+                JOIN ImageMetadata im ON im.id = ImageSearch.rowid
+                WHERE ImageSearch MATCH ? AND {where}
+                ORDER BY ImageSearch.rank
+            """, [query] + params
+        return f"""
+            SELECT im.filename FROM ImageMetadata im
+            WHERE {where}
+            ORDER BY im.date_key DESC, im.id DESC
+        """, params
+
+    def get_filtered_page(self, after=None, limit=FILTER_PAGE_SIZE, **filters):
+        """
+        One page of get_filtered_images. after is the cursor returned with the
+        previous page, or None for the first. Returns (filenames, cursor), the
+        cursor being None after the last page. Pages are cut with a keyset
+        condition on (date_key, id) rather than OFFSET, so a page costs the
+        same however far down the results it is.
+        """
+        return self.cached_query(("page", after, limit), filters,
+                                 lambda: self.query_filtered_page(after, limit, **filters),
+                                 copy_result=lambda page: (list(page[0]), page[1]))
+
+    def query_filtered_page(self, after, limit, **filters):
+        if search_query(filters.get("search") or ""):
+            # Ranked search matches are already a bounded list
+            matches = self.get_filtered_images(**filters)
+            start = after or 0
+            end = start + limit
+            return matches[start:end], (end if end < len(matches) else None)
+
+        if self.tag_index:
+            filters.pop("search", None)
+            return self.tag_index.page(after, limit, **filters)
+
+        cursor = self.conn.cursor()
+        cursor.execute(*self.filtered_page_sql(after, limit, **filters))
+        rows = cursor.fetchall()
+        if len(rows) <= limit:
+            return [row[0] for row in rows], None
+        rows = rows[:limit]
+        return [row[0] for row in rows], rows[-1][1:]
+
+    def filtered_page_sql(self, after, limit, **filters):
+        """(sql, params) for one keyset page of unranked results, with one row to spare."""
+        where, params = self.compile_filters(**filters)
+        if after:
+            key, image_id = after
+            if key is None:
+                where += " AND im.date_key IS NULL AND im.id < ?"
+                params += [image_id]
+            else:
+                where += """ AND (im.date_key < ? OR (im.date_key = ? AND im.id < ?)
+                                  OR im.date_key IS NULL)"""
+                params += [key, key, image_id]
+
+        return f"""
+            SELECT im.filename, im.date_key, im.id FROM ImageMetadata im
+            WHERE {where}
+            ORDER BY im.date_key DESC, im.id DESC
+            LIMIT ?
+        """, params + [limit + 1]
+
+    def iter_filtered_pages(self, limit=FILTER_PAGE_SIZE, **filters):
+        """Yield get_filtered_images a page at a time, each page fetched on demand."""
+        after = None
+        while True:
+            filenames, after = self.get_filtered_page(after, limit, **filters)
+            yield filenames
+            if after is None:
+                return
+
+    def search_filenames(self, text):
+        """Filenames whose description, tags or location match text, best match first."""
+        query = search_query(text)
+        if not query:
+            return []
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            SELECT im.filename FROM ImageSearch
+            JOIN ImageMetadata im ON im.id = ImageSearch.rowid
+            WHERE ImageSearch MATCH ?
+            ORDER BY ImageSearch.rank
+        """, (query,))
+        return [row[0] for row in cursor.fetchall()]
+
+    def index_filters(self, filters):
+        """Swap search text for the bitmap of matching images, for the tag index."""
+        filters = dict(filters)
+        search = filters.pop("search", None)
+        if search and search_query(search):
+            filters["within"] = self.tag_index.selection(self.search_filenames(search))
+        return filters
+
+    def explain_filtered_images(self, page=False, after=None, limit=FILTER_PAGE_SIZE, **filters):
+        """
+        Return SQLite's query plan for the SQL behind get_filtered_images, or
+        with page=True behind get_filtered_page, one detail string per step.
+        The plan is for the SQL fallback, whether or not the tag index is on.
+        """
+        if page:
+            sql, params = self.filtered_page_sql(after, limit, **filters)
+        else:
+            sql, params = self.filtered_images_sql(**filters)
+        cursor = self.conn.cursor()
+        cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+        return [row[3] for row in cursor.fetchall()]
+
+    def get_facet_counts(self, **filters):
+        """
+        Count the images behind every filter option, as TagIndex.facet_counts.
+        Without the tag index all facets are counted in one UNION ALL query.
+        """
+        return self.cached_query("facets", filters, lambda: self.query_facet_counts(**filters))
+
+    def query_facet_counts(self, **filters):
+        if self.tag_index:
+            return self.tag_index.facet_counts(**self.index_filters(filters))
+
+        queries, params = [], []
+        for facet in TAG_FACETS + LOCATION_FIELDS:
+            where, where_params = self.compile_filters(**filters_without(filters, facet))
+            if facet in TAG_FACETS:
+                tag_table, junction, column = TAG_TABLES[facet]
+                queries.append(f"""
+                    SELECT ?, t.name, COUNT(*) FROM ImageMetadata im
+                    JOIN {junction} j ON j.image_id = im.id
+                    JOIN {tag_table} t ON t.id = j.{column}
+                    WHERE {where}
+                    GROUP BY t.name
+                """)
+            else:
+                queries.append(f"""
+                    SELECT ?, l.{facet}, COUNT(*) FROM ImageMetadata im
+                    JOIN Location l ON l.id = im.location_id
+                    WHERE {where} AND l.{facet} IS NOT NULL AND l.{facet} != ''
+                    GROUP BY l.{facet}
+                """)
+            params.append(facet)
+            params.extend(where_params)
+
+        counts = {facet: {} for facet in TAG_FACETS + LOCATION_FIELDS}
+        cursor = self.conn.cursor()
+        cursor.execute(" UNION ALL ".join(queries), params)
+        for facet, value, count in cursor.fetchall():
+            counts[facet][value] = count
+        return counts
+
+    def get_date_histogram(self, **filters):
+        """
+        Photo counts per year, month and day for the images matching filters,
+        as dates.roll_up returns them. One GROUP BY over the date_key index.
+        """
+        return self.cached_query("dates", filters, lambda: self.query_date_histogram(**filters))
+
+    def query_date_histogram(self, **filters):
+        if self.tag_index:
+            return self.tag_index.date_histogram(**self.index_filters(filters))
+        cursor = self.conn.cursor()
+        where, params = self.compile_filters(**filters)
+        cursor.execute(f"""
+            SELECT im.date_key, COUNT(*) FROM ImageMetadata im
+            WHERE {where} AND im.date_key IS NOT NULL
+            GROUP BY im.date_key
+        """, params)
+        return roll_up(dict(cursor.fetchall()))
+
     def get_all_location_names(self):
         cursor = self.conn.cursor()
         cursor.execute("SELECT DISTINCT name FROM Location WHERE name IS NOT NULL")
@@ -332,15 +1183,36 @@ class DatabaseManager:
         return [row[0] for row in cursor.fetchall()]
     
     def delete_location_entry(self, field_name, value):
-        if field_name not in ["name", "category", "country", "region", "city", "postcode"]:
+        """
+        Delete the unused locations with this value. Whole Location rows go,
+        so other fields can lose their last use too; returns {field: values}
+        for every value no location has any more, the deleted one included.
+        """
+        if field_name not in LOCATION_VALUE_FIELDS:
             raise ValueError(f"Invalid location field: {field_name}")
-        cursor = self.conn.cursor()
-        cursor.execute(f"""
-            DELETE FROM Location
-            WHERE {field_name} = ? AND
+        unused = f"""
+            {field_name} = ? AND
                 NOT EXISTS (
                     SELECT 1 FROM ImageMetadata
                     WHERE Location.id = ImageMetadata.location_id
                 )
-        """, (value,))
+        """
+        cursor = self.conn.cursor()
+        cursor.execute(f"SELECT {', '.join(LOCATION_VALUE_FIELDS)} FROM Location WHERE {unused}", (value,))
+        rows = cursor.fetchall()
+        candidates = {field: {row[column] for row in rows if row[column] is not None}
+                      for column, field in enumerate(LOCATION_VALUE_FIELDS)}
+        candidates[field_name].add(value)
+        cursor.execute(f"DELETE FROM Location WHERE {unused}", (value,))
         self.conn.commit()
+
+        removed = {}
+        for field, values in candidates.items():
+            cursor.execute(f"""
+                SELECT value FROM json_each(?)
+                WHERE value NOT IN (SELECT {field} FROM Location WHERE {field} IS NOT NULL)
+            """, (json.dumps(sorted(values)),))
+            gone = [row[0] for row in cursor.fetchall()]
+            if gone:
+                removed[field] = gone
+        return removed
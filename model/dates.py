@@ -0,0 +1,47 @@
+import datetime
+
+
+def date_key(date):
+    """YYYYMMDD integer for a "yyyy-MM-dd" date, or None if it is not one."""
+    try:
+        parsed = datetime.date.fromisoformat(date[:10])
+    except (TypeError, ValueError):
+        return None
+    return parsed.year * 10000 + parsed.month * 100 + parsed.day
+
+
+def date_bounds(period):
+    """
+    Inclusive (low, high) date keys covering a "yyyy", "yyyy-MM" or
+    "yyyy-MM-dd" period. Missing parts span the whole year or month.
+    """
+    parts = [int(part) for part in period.split("-")[:3]]
+    year, month, day = parts + [None] * (3 - len(parts))
+    low = year * 10000 + (month or 0) * 100 + (day or 0)
+    high = year * 10000 + (month or 99) * 100 + (day or 99)
+    return low, high
+
+
+def in_range(key, date_from=None, date_to=None):
+    if key is None:
+        return False
+    if date_from and key < date_bounds(date_from)[0]:
+        return False
+    if date_to and key > date_bounds(date_to)[1]:
+        return False
+    return True
+
+
+def roll_up(day_counts):
+    """
+    Turn {date key: count} into {"years": {"2023": n}, "months": {"2023-05": n},
+    "days": {"2023-05-14": n}}, the periods being valid date_bounds input.
+    """
+    histogram = {"years": {}, "months": {}, "days": {}}
+    for key, count in sorted(day_counts.items()):
+        year, month, day = key // 10000, key // 100 % 100, key % 100
+        for level, period in (("years", f"{year:04d}"),
+                              ("months", f"{year:04d}-{month:02d}"),
+                              ("days", f"{year:04d}-{month:02d}-{day:02d}")):
+            histogram[level][period] = histogram[level].get(period, 0) + count
+    return histogram
@@ -0,0 +1,159 @@
+import hashlib
+import multiprocessing
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from .bk_tree import BKTree
+
+PARTIAL_HASH_BYTES = 64 * 1024
+FULL_HASH_CHUNK = 1024 * 1024
+# Below this many files the cost of starting worker processes outweighs the gain
+PROCESS_POOL_THRESHOLD = 16
+# Differing dHash bits still considered the same picture
+NEAR_DUPLICATE_DISTANCE = 6
+
+
+def partial_hash(path):
+    """
+    Hash the first and last PARTIAL_HASH_BYTES of a file. Files small enough
+    to be covered completely get their full content hash instead.
+    """
+    size = os.path.getsize(path)
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        if size <= 2 * PARTIAL_HASH_BYTES:
+            digest.update(f.read())
+            return "full:" + digest.hexdigest()
+        digest.update(f.read(PARTIAL_HASH_BYTES))
+        f.seek(-PARTIAL_HASH_BYTES, os.SEEK_END)
+        digest.update(f.read(PARTIAL_HASH_BYTES))
+    return "part:" + digest.hexdigest()
+
+
+def content_hash(path):
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(FULL_HASH_CHUNK), b""):
+            digest.update(chunk)
+    return "full:" + digest.hexdigest()
+
+
+def safe_hash(hash_function, path):
+    try:
+        return hash_function(path)
+    except OSError:
+        return None
+
+
+def hash_files(hash_function, paths, workers=None):
+    """Hash paths in parallel, returning one hash (or None if unreadable) per path."""
+    if len(paths) < PROCESS_POOL_THRESHOLD:
+        return [safe_hash(hash_function, path) for path in paths]
+    # Called from a QThread, and forking a process that runs Qt threads is unsafe
+    with ProcessPoolExecutor(max_workers=workers,
+                             mp_context=multiprocessing.get_context("spawn")) as executor:
+        return list(executor.map(safe_hash, [hash_function] * len(paths), paths,
+                                 chunksize=max(1, len(paths) // 64)))
+
+
+def find_duplicates(root, images, workers=None, should_stop=None):
+    """
+    Find byte-identical images.
+    images are (id, path, size, partial_hash, content_hash) rows; stored hashes
+    are reused and only missing ones are computed. Files are grouped by size
+    first, only size collisions get a partial hash, and only partial collisions
+    get a full content hash.
+    Returns (updates, clusters): updates are (id, partial_hash, content_hash)
+    for rows whose hashes were computed, clusters are lists of duplicate ids.
+    """
+    by_size = defaultdict(list)
+    for row in images:
+        if row[2]:
+            by_size[row[2]].append(list(row))
+    candidates = [row for rows in by_size.values() if len(rows) > 1 for row in rows]
+
+    updated = {}
+
+    # Stage 1: cheap partial hash for every size collision
+    missing = [row for row in candidates if not row[3]]
+    hashes = hash_files(partial_hash, [os.path.join(root, row[1]) for row in missing], workers)
+    for row, value in zip(missing, hashes):
+        row[3] = value
+        # A partial hash that covered the whole file is already the content hash
+        if value and value.startswith("full:"):
+            row[4] = value
+        updated[row[0]] = row
+    if should_stop and should_stop():
+        return [], []
+
+    by_partial = defaultdict(list)
+    for row in candidates:
+        if row[3]:
+            by_partial[(row[2], row[3])].append(row)
+
+    # Stage 2: full content hash only where the partial hashes collide
+    colliding = [row for rows in by_partial.values() if len(rows) > 1 for row in rows]
+    missing = [row for row in colliding if not row[4]]
+    hashes = hash_files(content_hash, [os.path.join(root, row[1]) for row in missing], workers)
+    for row, value in zip(missing, hashes):
+        row[4] = value
+        updated[row[0]] = row
+
+    by_content = defaultdict(list)
+    for row in colliding:
+        if row[4]:
+            by_content[row[4]].append(row[0])
+
+    updates = [(row[0], row[3], row[4]) for row in updated.values()]
+    clusters = [ids for ids in by_content.values() if len(ids) > 1]
+    return updates, clusters
+
+
+def tag_differences(images):
+    """
+    Compare the metadata of the images in a duplicate cluster.
+    images maps filename to a metadata dict as returned by load_image_metadata.
+    Returns {field: {filename: value}} for every field whose value is not the
+    same across the cluster; tag lists are compared as sets.
+    """
+    differences = {}
+    for field in ("description", "date", "location", "people", "groups", "emotions"):
+        values = {}
+        for filename, metadata in images.items():
+            value = metadata.get(field)
+            values[filename] = sorted(value) if isinstance(value, list) else value
+        if len({repr(value) for value in values.values()}) > 1:
+            differences[field] = values
+    return differences
+
+
+def find_near_duplicates(hashes, max_distance=NEAR_DUPLICATE_DISTANCE):
+    """
+    Group images whose perceptual hashes are within max_distance bits.
+    hashes are (item, hash) pairs. Matches are found through a BK-tree and
+    chained together, so a burst where each shot is close to the next ends up
+    in one cluster. Returns lists of items, largest cluster first.
+    """
+    tree = BKTree()
+    for item, value in hashes:
+        tree.add(value, item)
+
+    parent = {item: item for item, _ in hashes}
+
+    def find(item):
+        while parent[item] != item:
+            parent[item] = parent[parent[item]]
+            item = parent[item]
+        return item
+
+    for item, value in hashes:
+        for _, match in tree.search(value, max_distance):
+            root_a, root_b = find(item), find(match)
+            if root_a != root_b:
+                parent[root_b] = root_a
+
+    clusters = defaultdict(list)
+    for item, _ in hashes:
+        clusters[find(item)].append(item)
+    return sorted((c for c in clusters.values() if len(c) > 1), key=len, reverse=True)
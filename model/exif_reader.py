@@ -0,0 +1,239 @@
+import datetime
+import os
+import struct
+
+# TIFF/EXIF tags
+ORIENTATION = 0x0112
+DATE_TIME = 0x0132
+EXIF_IFD = 0x8769
+GPS_IFD = 0x8825
+DATE_TIME_ORIGINAL = 0x9003
+DATE_TIME_DIGITIZED = 0x9004
+JPEG_INTERCHANGE_FORMAT = 0x0201
+JPEG_INTERCHANGE_FORMAT_LENGTH = 0x0202
+GPS_LATITUDE_REF = 1
+GPS_LATITUDE = 2
+GPS_LONGITUDE_REF = 3
+GPS_LONGITUDE = 4
+
+# Field type -> (struct format, size in bytes)
+TIFF_TYPES = {
+    1: ("B", 1), 2: ("s", 1), 3: ("H", 2), 4: ("I", 4), 5: ("II", 8),
+    6: ("b", 1), 7: ("B", 1), 8: ("h", 2), 9: ("i", 4), 10: ("ii", 8),
+    11: ("f", 4), 12: ("d", 8), 13: ("I", 4),
+}
+ASCII = 2
+INTEGER_TYPES = (1, 3, 4, 6, 8, 9, 13)
+RATIONAL_TYPES = (5, 10)
+# Sanity limits so a corrupt file cannot make us read megabytes
+MAX_IFD_ENTRIES = 1000
+MAX_VALUE_BYTES = 64 * 1024
+MAX_THUMBNAIL_BYTES = 1024 * 1024
+# What a malformed header can raise while being decoded
+PARSE_ERRORS = (ValueError, TypeError, IndexError, struct.error)
+# JPEG markers after which no APP1 segment can follow
+JPEG_END_MARKERS = (0xD9, 0xDA)
+
+
+class TiffReader:
+    """
+    Reads IFDs from a TIFF structure at byte offset base of a file (the
+    "II*\\0" or "MM\\0*" header, or Panasonic RAW's "IIU\\0"), seeking to
+    only the bytes it needs. Offsets stored in the structure are relative to
+    base, as in a JPEG's APP1 segment.
+    Raises ValueError for anything that is not a well-formed TIFF.
+    """
+
+    def __init__(self, file, base=0):
+        self.file = file
+        self.base = base
+        file.seek(base)
+        header = file.read(8)
+        if header[:4] in (b"II*\0", b"IIU\0"):
+            self.endian = "<"
+        elif header[:4] == b"MM\0*":
+            self.endian = ">"
+        else:
+            raise ValueError("Not a TIFF header")
+        self.first_ifd = struct.unpack(self.endian + "I", header[4:])[0]
+
+    def read(self, offset, size):
+        self.file.seek(self.base + offset)
+        data = self.file.read(size)
+        if len(data) < size:
+            raise ValueError("Truncated TIFF structure")
+        return data
+
+    def ifd(self, offset):
+        """Return ({tag: (type, count, raw 4 bytes)}, offset of the next IFD or 0)."""
+        count = struct.unpack(self.endian + "H", self.read(offset, 2))[0]
+        if count > MAX_IFD_ENTRIES:
+            raise ValueError("Implausible IFD size")
+        data = self.read(offset + 2, count * 12 + 4)
+        entries = {}
+        for position in range(0, count * 12, 12):
+            tag, kind, values = struct.unpack_from(self.endian + "HHI", data, position)
+            entries[tag] = (kind, values, data[position + 8:position + 12])
+        return entries, struct.unpack_from(self.endian + "I", data, count * 12)[0]
+
+    def value(self, entry, kinds=None):
+        """
+        Decode an IFD entry: a str for ASCII, otherwise a tuple of numbers
+        with rationals as floats. kinds, if given, are the field types the
+        entry may have, so text never ends up where an offset is expected.
+        """
+        kind, count, raw = entry
+        if kind not in TIFF_TYPES or (kinds is not None and kind not in kinds):
+            raise ValueError(f"Unexpected TIFF field type {kind}")
+        code, size = TIFF_TYPES[kind]
+        size *= count
+        if size > MAX_VALUE_BYTES:
+            raise ValueError("Implausible TIFF value size")
+        if size <= 4:
+            data = raw[:size]
+        else:
+            data = self.read(struct.unpack(self.endian + "I", raw)[0], size)
+        if kind == ASCII:
+            return data.split(b"\0", 1)[0].decode("ascii", "replace").strip()
+        values = struct.unpack(self.endian + code * count, data)
+        if kind in RATIONAL_TYPES:
+            return tuple(numerator / denominator if denominator else 0.0
+                         for numerator, denominator in zip(values[::2], values[1::2]))
+        return values
+
+    def sub_ifd(self, entries, tag):
+        """The IFD an entry such as EXIF_IFD points to, or {} if there is none."""
+        if tag not in entries:
+            return {}
+        return self.ifd(self.value(entries[tag], INTEGER_TYPES)[0])[0]
+
+
+def jpeg_exif_offset(file):
+    """Offset of the TIFF header inside a JPEG's EXIF APP1 segment, or None."""
+    file.seek(2)
+    while True:
+        marker = file.read(4)
+        if len(marker) < 4 or marker[0] != 0xFF or marker[1] in JPEG_END_MARKERS:
+            return None
+        length = struct.unpack(">H", marker[2:])[0]
+        start = file.tell()
+        if marker[1] == 0xE1 and file.read(6) == b"Exif\0\0":
+            return start + 6
+        file.seek(start + length - 2)
+
+
+def open_tiff(file):
+    """A TiffReader for a JPEG's EXIF block or a TIFF-based file (TIFF, CR2, ARW, DNG)."""
+    head = file.read(4)
+    if head[:2] == b"\xff\xd8":
+        offset = jpeg_exif_offset(file)
+        return TiffReader(file, offset) if offset is not None else None
+    if head in (b"II*\0", b"MM\0*"):
+        return TiffReader(file)
+    return None
+
+
+def exif_timestamp(text):
+    """EXIF "YYYY:MM:DD HH:MM:SS" as "yyyy-MM-dd HH:mm:ss", or None if it is not a real time."""
+    try:
+        taken = datetime.datetime.strptime(text[:19], "%Y:%m:%d %H:%M:%S")
+    except (TypeError, ValueError):
+        return None
+    return taken.isoformat(" ")
+
+
+def coordinate(gps, value_tag, ref_tag, reader):
+    if value_tag not in gps:
+        return None
+    degrees, minutes, seconds = (reader.value(gps[value_tag], RATIONAL_TYPES) + (0.0, 0.0))[:3]
+    value = degrees + minutes / 60 + seconds / 3600
+    if ref_tag in gps and reader.value(gps[ref_tag], (ASCII,))[:1] in ("S", "W"):
+        value = -value
+    return value
+
+
+def read_exif(path):
+    """
+    Read the capture time, orientation and GPS position of an image from its
+    EXIF header only, never the image data. Returns {"taken", "orientation",
+    "latitude", "longitude"} with None for anything missing, or None if the
+    file has no EXIF we can read (PNG, ISO-BMFF containers such as CR3/HEIF).
+    """
+    try:
+        with open(path, "rb") as file:
+            reader = open_tiff(file)
+            if reader is None:
+                return None
+            ifd0, _ = reader.ifd(reader.first_ifd)
+            exif = {"taken": None, "orientation": None, "latitude": None, "longitude": None}
+            if ORIENTATION in ifd0 and ifd0[ORIENTATION][0] in INTEGER_TYPES:
+                exif["orientation"] = reader.value(ifd0[ORIENTATION])[0]
+
+            # A broken sub-IFD loses its own fields, not the ones in IFD0
+            try:
+                sub = reader.sub_ifd(ifd0, EXIF_IFD)
+            except PARSE_ERRORS:
+                sub = {}
+            for entries, tag in ((sub, DATE_TIME_ORIGINAL), (sub, DATE_TIME_DIGITIZED),
+                                 (ifd0, DATE_TIME)):
+                if tag in entries:
+                    exif["taken"] = exif_timestamp(reader.value(entries[tag]))
+                    if exif["taken"]:
+                        break
+            try:
+                gps = reader.sub_ifd(ifd0, GPS_IFD)
+                latitude = coordinate(gps, GPS_LATITUDE, GPS_LATITUDE_REF, reader)
+                longitude = coordinate(gps, GPS_LONGITUDE, GPS_LONGITUDE_REF, reader)
+                if latitude is not None and longitude is not None and (latitude or longitude):
+                    exif["latitude"], exif["longitude"] = latitude, longitude
+            except PARSE_ERRORS:
+                pass
+            return exif
+    except (OSError,) + PARSE_ERRORS:
+        return None
+
+
+def embedded_jpeg(reader, ifd):
+    """The JPEG an IFD points to with JPEGInterchangeFormat(Length), or None."""
+    if JPEG_INTERCHANGE_FORMAT not in ifd or JPEG_INTERCHANGE_FORMAT_LENGTH not in ifd:
+        return None
+    offset = reader.value(ifd[JPEG_INTERCHANGE_FORMAT], INTEGER_TYPES)[0]
+    length = reader.value(ifd[JPEG_INTERCHANGE_FORMAT_LENGTH], INTEGER_TYPES)[0]
+    if not 0 < length <= MAX_THUMBNAIL_BYTES:
+        return None
+    data = reader.read(offset, length)
+    return data if data[:2] == b"\xff\xd8" else None
+
+
+def read_exif_thumbnail(path):
+    """
+    JPEG bytes of the thumbnail stored in IFD1 of a file's EXIF, or None.
+    Only the EXIF header and the thumbnail itself are read.
+    """
+    try:
+        with open(path, "rb") as file:
+            reader = open_tiff(file)
+            if reader is None:
+                return None
+            _, next_ifd = reader.ifd(reader.first_ifd)
+            if not next_ifd:
+                return None
+            return embedded_jpeg(reader, reader.ifd(next_ifd)[0])
+    except (OSError,) + PARSE_ERRORS:
+        return None
+
+
+def read_exif_batch(root, images):
+    """
+    read_exif for (id, filename) pairs, returning (id, exif) pairs. Runs in
+    worker processes, so it takes and returns only plain data.
+    """
+    results = []
+    for image_id, filename in images:
+        try:
+            exif = read_exif(os.path.join(root, filename))
+        except Exception:
+            # A file that trips up the parser counts as having no EXIF rather than failing the batch
+            exif = None
+        results.append((image_id, exif))
+    return results
@@ -0,0 +1,152 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from fnmatch import fnmatch
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".raw",
+                    ".heif", ".cr2", ".cr3", ".arw", ".tiff")
+DEFAULT_EXCLUDE_PATTERNS = ("deleted_images",)
+WALK_WORKERS = 8
+
+
+def parent_directory(path):
+    """Parent of a library-relative path; "" is the library root."""
+    return path.rpartition("/")[0]
+
+
+def matches_any(path, patterns):
+    name = path.rpartition("/")[2]
+    return any(fnmatch(path, pattern) or fnmatch(name, pattern) for pattern in patterns)
+
+
+def scan_directory(root, directory, include=(), exclude=DEFAULT_EXCLUDE_PATTERNS,
+                   extensions=IMAGE_EXTENSIONS):
+    """
+    Scan one directory of the library without descending into it.
+    Paths are relative to root and use "/" separators. Returns the images as
+    (path, size, mtime_ns) tuples and the subdirectories to visit. Patterns
+    are matched against both the relative path and the bare name; exclude
+    applies to files and directories, include only to files.
+    Raises OSError if the directory cannot be read.
+    """
+    entries, subdirectories = [], []
+    with os.scandir(os.path.join(root, directory) if directory else root) as it:
+        for entry in it:
+            path = f"{directory}/{entry.name}" if directory else entry.name
+            if matches_any(path, exclude):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                subdirectories.append(path)
+            elif entry.name.lower().endswith(extensions) and entry.is_file():
+                if include and not matches_any(path, include):
+                    continue
+                stat = entry.stat()
+                entries.append((path, stat.st_size, stat.st_mtime_ns))
+    return entries, subdirectories
+
+
+def walk_library(root, include=(), exclude=DEFAULT_EXCLUDE_PATTERNS,
+                 extensions=IMAGE_EXTENSIONS, start="", workers=WALK_WORKERS):
+    """
+    Walk the library below start, scanning directories in parallel on a thread
+    pool. Yields (directory, entries) for each directory as soon as it has been
+    read, so callers can use results while deeper levels are still being walked.
+    Directories that cannot be read are yielded with no entries.
+    """
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        pending = {executor.submit(scan_directory, root, start, include, exclude, extensions): start}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                directory = pending.pop(future)
+                try:
+                    entries, subdirectories = future.result()
+                except OSError:
+                    entries, subdirectories = [], []
+                for subdirectory in subdirectories:
+                    pending[executor.submit(scan_directory, root, subdirectory,
+                                            include, exclude, extensions)] = subdirectory
+                yield directory, entries
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def scan_folder_entries(folder, include=(), exclude=DEFAULT_EXCLUDE_PATTERNS,
+                        extensions=IMAGE_EXTENSIONS):
+    """List every image below folder as (path, size, mtime_ns) tuples."""
+    return [entry
+            for _, entries in walk_library(folder, include, exclude, extensions)
+            for entry in entries]
+
+
+def match_renames(added, removed, known):
+    """
+    Pair vanished files with appeared ones that have the same size and mtime.
+    added are (path, size, mtime_ns) entries, removed are paths looked up in
+    known. Returns (renamed, added, removed) with the pairs taken out; renamed
+    entries are (old, new, size, mtime_ns).
+    """
+    if not added or not removed:
+        return [], added, removed
+
+    vanished = {}
+    for path in removed:
+        vanished.setdefault(known[path], []).append(path)
+
+    renamed, still_added = [], []
+    for path, size, mtime in added:
+        candidates = vanished.get((size, mtime))
+        if candidates:
+            renamed.append((candidates.pop(), path, size, mtime))
+        else:
+            still_added.append((path, size, mtime))
+    renamed_from = {entry[0] for entry in renamed}
+    return renamed, still_added, [path for path in removed if path not in renamed_from]
+
+
+def diff_entries(known, entries):
+    """
+    Compare a scan against known {path: (size, mtime_ns)}.
+    A file that vanished while another with the same size and mtime appeared
+    is reported as a rename, so its tags can follow it.
+    Returns added and changed (path, size, mtime_ns) entries, removed
+    paths and renamed (old, new, size, mtime_ns) entries.
+    """
+    current = {path: (size, mtime) for path, size, mtime in entries}
+    added = [(f, *sig) for f, sig in current.items() if f not in known]
+    changed = [(f, *sig) for f, sig in current.items() if f in known and known[f] != sig]
+    removed = [f for f in known if f not in current]
+    renamed, added, removed = match_renames(added, removed, known)
+    return {"added": added, "changed": changed, "removed": removed, "renamed": renamed}
+
+
+class ScanReconciler:
+    """
+    Diffs a scan that arrives in batches against the known {path: (size, mtime_ns)}.
+    add_batch() returns the new and changed files of each batch straight away;
+    finish() works out what was removed or renamed once the walk is complete.
+    """
+
+    def __init__(self, known):
+        self.known = known
+        self.unseen = set(known)
+        self.added = []
+        self.entries = []
+
+    def add_batch(self, entries):
+        added, changed = [], []
+        for path, size, mtime in entries:
+            signature = self.known.get(path)
+            if signature is None:
+                added.append((path, size, mtime))
+            else:
+                self.unseen.discard(path)
+                if signature != (size, mtime):
+                    changed.append((path, size, mtime))
+        self.added.extend(added)
+        self.entries.extend(entries)
+        return {"added": added, "changed": changed, "removed": [], "renamed": []}
+
+    def finish(self):
+        renamed, _, removed = match_renames(self.added, sorted(self.unseen), self.known)
+        return {"added": [], "changed": [], "removed": removed, "renamed": renamed}
@@ -0,0 +1,163 @@
+import math
+import os
+from operator import itemgetter
+
+EARTH_RADIUS_KM = 6371.0
+# Photos further than this from every place in the gazetteer get no location
+MAX_DISTANCE_KM = 50.0
+# Coordinates are memoised at about 10m resolution, as shoots repeat positions
+COORDINATE_PRECISION = 4
+
+
+def to_xyz(latitude, longitude):
+    """Point on the unit sphere, where straight-line nearest is great-circle nearest."""
+    latitude, longitude = math.radians(latitude), math.radians(longitude)
+    return (math.cos(latitude) * math.cos(longitude),
+            math.cos(latitude) * math.sin(longitude),
+            math.sin(latitude))
+
+
+def chord_squared(distance_km):
+    """Squared unit-sphere chord length of a great-circle distance."""
+    chord = 2 * math.sin(min(distance_km / EARTH_RADIUS_KM, math.pi) / 2)
+    return chord * chord
+
+
+class KDTree:
+    """
+    Static 3-d tree stored implicitly in flat lists: each range of points is
+    sorted on the axis for its depth, its median is the node and the two
+    halves are the subtrees, so no node objects are needed. Ranges of up to
+    LEAF_SIZE points are scanned instead of split further.
+    """
+
+    LEAF_SIZE = 8
+
+    def __init__(self, points):
+        """points are (x, y, z, payload) tuples."""
+        points = list(points)
+        ranges = [(0, len(points), 0)]
+        while ranges:
+            low, high, depth = ranges.pop()
+            if high - low <= self.LEAF_SIZE:
+                continue
+            points[low:high] = sorted(points[low:high], key=itemgetter(depth % 3))
+            middle = (low + high) // 2
+            ranges.append((low, middle, depth + 1))
+            ranges.append((middle + 1, high, depth + 1))
+        self.axes = tuple([point[axis] for point in points] for axis in range(3))
+        self.payloads = [point[3] for point in points]
+
+    def nearest(self, point, max_distance_squared=math.inf):
+        """Payload of the point closest to point within the distance, or None."""
+        xs, ys, zs = self.axes
+        x, y, z = point
+        best, best_distance = None, max_distance_squared
+        # (low, high, depth, squared distance to the splitting plane above)
+        ranges = [(0, len(xs), 0, 0.0)]
+        while ranges:
+            low, high, depth, bound = ranges.pop()
+            if bound >= best_distance:
+                continue
+            if high - low <= self.LEAF_SIZE:
+                for index in range(low, high):
+                    distance = (xs[index] - x) ** 2 + (ys[index] - y) ** 2 + (zs[index] - z) ** 2
+                    if distance < best_distance:
+                        best, best_distance = index, distance
+                continue
+            middle = (low + high) // 2
+            distance = (xs[middle] - x) ** 2 + (ys[middle] - y) ** 2 + (zs[middle] - z) ** 2
+            if distance < best_distance:
+                best, best_distance = middle, distance
+            offset = point[depth % 3] - self.axes[depth % 3][middle]
+            # The far side is only searched if the plane is closer than the best so far
+            if offset < 0:
+                ranges.append((middle + 1, high, depth + 1, offset * offset))
+                ranges.append((low, middle, depth + 1, 0.0))
+            else:
+                ranges.append((low, middle, depth + 1, offset * offset))
+                ranges.append((middle + 1, high, depth + 1, 0.0))
+        return None if best is None else self.payloads[best]
+
+
+def read_names(path, key_column, name_column):
+    """{code: name} from a GeoNames side file, or {} when it is not there."""
+    names = {}
+    if not os.path.exists(path):
+        return names
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            if line.startswith("#"):
+                continue
+            columns = line.rstrip("\n").split("\t")
+            if len(columns) > max(key_column, name_column):
+                names[columns[key_column]] = columns[name_column]
+    return names
+
+
+def load_gazetteer(path):
+    """
+    Load populated places from a GeoNames dump such as cities1000.txt
+    (tab-separated, one place per line). If admin1CodesASCII.txt and
+    countryInfo.txt sit next to it, regions and countries get their names
+    instead of codes. Returns (latitude, longitude, place) tuples, place
+    being a dict with name, region and country.
+    Raises ValueError if the file has no usable rows.
+    """
+    folder = os.path.dirname(path)
+    regions = read_names(os.path.join(folder, "admin1CodesASCII.txt"), 0, 1)
+    countries = read_names(os.path.join(folder, "countryInfo.txt"), 0, 4)
+    places = []
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            columns = line.rstrip("\n").split("\t")
+            if len(columns) < 11 or columns[6] not in ("P", ""):
+                continue
+            try:
+                latitude, longitude = float(columns[4]), float(columns[5])
+            except ValueError:
+                continue
+            country = columns[8]
+            region = f"{country}.{columns[10]}"
+            places.append((latitude, longitude, {
+                "name": columns[1],
+                "region": regions.get(region, columns[10] or None),
+                "country": countries.get(country, country or None),
+            }))
+    if not places:
+        raise ValueError(f"No places found in {path}")
+    return places
+
+
+def place_location(place):
+    """A Location dict, as get_or_create_location takes, for a gazetteer place."""
+    return {
+        "name": place["name"],
+        "category": None,
+        "country": place["country"],
+        "region": place["region"],
+        "city": place["name"],
+        "postcode": None,
+    }
+
+
+class ReverseGeocoder:
+    """Maps GPS coordinates to the nearest gazetteer place, entirely offline."""
+
+    def __init__(self, places):
+        self.tree = KDTree(to_xyz(latitude, longitude) + (place,)
+                           for latitude, longitude, place in places)
+
+    def locate(self, latitude, longitude, max_distance_km=MAX_DISTANCE_KM):
+        return self.tree.nearest(to_xyz(latitude, longitude), chord_squared(max_distance_km))
+
+    def locate_many(self, coordinates, max_distance_km=MAX_DISTANCE_KM):
+        """The place (or None) for each (latitude, longitude), looking up repeated positions once."""
+        found = {}
+        places = []
+        for latitude, longitude in coordinates:
+            key = (round(latitude, COORDINATE_PRECISION), round(longitude, COORDINATE_PRECISION))
+            if key not in found:
+                found[key] = self.locate(latitude, longitude, max_distance_km)
+            places.append(found[key])
+        return places
@@ -0,0 +1,83 @@
+from collections import OrderedDict
+
+MISSING = object()
+
+
+class LRUCache:
+    """
+    Bounded mapping that evicts the least recently used entry and counts hits
+    and misses, so its capacity can be tuned. A capacity of 0 stores nothing.
+    Capacity counts entries, or with size_of the total size_of(value), e.g.
+    bytes; a value bigger than the whole capacity is not stored.
+    """
+
+    def __init__(self, capacity, size_of=None):
+        self.capacity = capacity
+        self.size_of = size_of or (lambda value: 1)
+        self.entries = OrderedDict()
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, key):
+        """Membership without counting a lookup or refreshing the entry."""
+        return key in self.entries
+
+    def get(self, key, default=MISSING):
+        value = self.entries.get(key, MISSING)
+        if value is MISSING:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return value
+
+    def touch(self, key):
+        """Mark key as the most recently used without counting a lookup."""
+        if key in self.entries:
+            self.entries.move_to_end(key)
+
+    def put(self, key, value):
+        self.pop(key)
+        size = self.size_of(value)
+        if size > self.capacity:
+            return
+        self.entries[key] = value
+        self.used += size
+        self.trim()
+
+    def pop(self, key):
+        value = self.entries.pop(key, MISSING)
+        if value is not MISSING:
+            self.used -= self.size_of(value)
+
+    def rename(self, old, new):
+        """Move the entry for old to new, as the most recently used."""
+        value = self.entries.get(old, MISSING)
+        if value is not MISSING:
+            self.pop(old)
+            self.put(new, value)
+
+    def resize(self, capacity):
+        self.capacity = capacity
+        self.trim()
+
+    def trim(self):
+        while self.used > self.capacity:
+            _, value = self.entries.popitem(last=False)
+            self.used -= self.size_of(value)
+
+    def clear(self):
+        self.entries.clear()
+        self.used = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self.entries),
+            "used": self.used,
+            "capacity": self.capacity,
+        }
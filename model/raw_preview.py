@@ -0,0 +1,316 @@
+import mmap
+import struct
+
+from model.exif_reader import (
+    TiffReader, PARSE_ERRORS, INTEGER_TYPES, ORIENTATION,
+    JPEG_INTERCHANGE_FORMAT, JPEG_INTERCHANGE_FORMAT_LENGTH,
+)
+
+RAW_EXTENSIONS = (".raw", ".cr2", ".cr3", ".arw", ".heif")
+
+# TIFF tags that lead to embedded JPEGs
+COMPRESSION = 0x0103
+STRIP_OFFSETS = 0x0111
+STRIP_BYTE_COUNTS = 0x0117
+SUB_IFDS = 0x014A
+PANASONIC_JPG_FROM_RAW = 0x002E
+# JpgFromRaw is stored as bytes, so its count is its length
+BYTE_TYPES = (1, 7)
+# Old-style and new-style JPEG; sensor data uses these too, but as lossless JPEG
+JPEG_COMPRESSIONS = (6, 7)
+# EXIF orientations that turn the picture on its side
+SIDEWAYS_ORIENTATIONS = (5, 6, 7, 8)
+
+# ISO-BMFF boxes of Canon CR3 files
+CANON_UUID = bytes.fromhex("85c0b687820f11e08111f4ce462b6a48")
+CANON_PREVIEW_UUID = bytes.fromhex("eaf42b5e1c984b88b9fbb7dc406e4d16")
+# PRVW box: 8 byte box header, 6 bytes we skip, width, height, 2 bytes, JPEG length
+PRVW_HEADER = struct.Struct(">8x6xHH2xI")
+
+# Sanity limits so a corrupt file cannot make us walk or copy forever
+MAX_IFDS = 32
+MAX_PREVIEW_BYTES = 64 * 1024 * 1024
+# Frame markers of JPEGs Qt can decode: baseline, extended and progressive
+DECODABLE_FRAMES = (0xC0, 0xC1, 0xC2)
+
+
+def jpeg_frame(data, offset, length):
+    """
+    (width, height) of the JPEG stored at offset, or None unless it is a
+    baseline or progressive JPEG. This rejects the lossless JPEG that CR2
+    and DNG files store their sensor data in.
+    """
+    end = offset + length
+    if length < 4 or end > len(data) or data[offset:offset + 2] != b"\xff\xd8":
+        return None
+    position = offset + 2
+    while position + 9 <= end:
+        if data[position] != 0xFF:
+            return None
+        marker = data[position + 1]
+        if marker == 0xFF:
+            position += 1
+            continue
+        if marker in (0xD9, 0xDA):
+            return None
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            if marker not in DECODABLE_FRAMES:
+                return None
+            height, width = struct.unpack_from(">HH", data, position + 5)
+            return (width, height) if width and height else None
+        position += 2 + struct.unpack_from(">H", data, position + 2)[0]
+    return None
+
+
+def tiff_extent(reader, offset_entry, length_entry):
+    offset = reader.base + reader.value(offset_entry, INTEGER_TYPES)[0]
+    return offset, reader.value(length_entry, INTEGER_TYPES)[0]
+
+
+def ifd_orientation(reader, ifd):
+    """The EXIF orientation in an IFD, or None if it is missing or not a number."""
+    entry = ifd.get(ORIENTATION)
+    if entry is None or entry[0] not in INTEGER_TYPES:
+        return None
+    return reader.value(entry)[0]
+
+
+def tiff_previews(reader):
+    """
+    (offset, length) of every JPEG the IFD chain and SubIFDs of a
+    TIFF-based RAW (CR2, ARW, DNG, Panasonic RAW) point to, and the
+    orientation from IFD0.
+    """
+    extents, orientation = [], None
+    pending, seen = [reader.first_ifd], set()
+    while pending and len(seen) < MAX_IFDS:
+        offset = pending.pop()
+        if not offset or offset in seen:
+            continue
+        seen.add(offset)
+        try:
+            entries, next_ifd = reader.ifd(offset)
+            pending.append(next_ifd)
+            if offset == reader.first_ifd:
+                orientation = ifd_orientation(reader, entries)
+            if SUB_IFDS in entries:
+                pending.extend(reader.value(entries[SUB_IFDS], INTEGER_TYPES))
+            if JPEG_INTERCHANGE_FORMAT in entries and JPEG_INTERCHANGE_FORMAT_LENGTH in entries:
+                extents.append(tiff_extent(
+                    reader, entries[JPEG_INTERCHANGE_FORMAT], entries[JPEG_INTERCHANGE_FORMAT_LENGTH]))
+            if (STRIP_OFFSETS in entries and STRIP_BYTE_COUNTS in entries
+                    and COMPRESSION in entries
+                    and reader.value(entries[COMPRESSION], INTEGER_TYPES)[0] in JPEG_COMPRESSIONS
+                    and entries[STRIP_OFFSETS][1] == 1):
+                extents.append(tiff_extent(reader, entries[STRIP_OFFSETS], entries[STRIP_BYTE_COUNTS]))
+            if PANASONIC_JPG_FROM_RAW in entries and entries[PANASONIC_JPG_FROM_RAW][0] in BYTE_TYPES:
+                _, length, raw = entries[PANASONIC_JPG_FROM_RAW]
+                extents.append((reader.base + struct.unpack(reader.endian + "I", raw)[0], length))
+        except PARSE_ERRORS:
+            continue
+    return extents, orientation
+
+
+def boxes(data, start, end):
+    """
+    Yield (type, payload start, box end) for the ISO-BMFF boxes between start
+    and end. The type of a uuid box is its 16-byte UUID.
+    """
+    position = start
+    while position + 8 <= end:
+        size, kind = struct.unpack_from(">I4s", data, position)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from(">Q", data, position + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - position
+        if size < header or position + size > end:
+            return
+        if kind == b"uuid":
+            kind = bytes(data[position + header:position + header + 16])
+            header += 16
+        yield kind, position + header, position + size
+        position += size
+
+
+def child(data, start, end, kind):
+    """Payload start and end of the first box of the given type, or None."""
+    for found, payload, box_end in boxes(data, start, end):
+        if found == kind:
+            return payload, box_end
+    return None
+
+
+def track_sample(data, start, end):
+    """(offset, length) of the first sample of a trak box, or None."""
+    stbl = start, end
+    for kind in (b"mdia", b"minf", b"stbl"):
+        stbl = child(data, *stbl, kind)
+        if stbl is None:
+            return None
+    stsz = child(data, *stbl, b"stsz")
+    chunks, code = child(data, *stbl, b"co64"), ">Q"
+    if chunks is None:
+        chunks, code = child(data, *stbl, b"stco"), ">I"
+    if stsz is None or chunks is None:
+        return None
+    sample_size, sample_count = struct.unpack_from(">II", data, stsz[0] + 4)
+    if not sample_size and sample_count:
+        sample_size = struct.unpack_from(">I", data, stsz[0] + 12)[0]
+    if not struct.unpack_from(">I", data, chunks[0] + 4)[0]:
+        return None
+    return struct.unpack_from(code, data, chunks[0] + 8)[0], sample_size
+
+
+def cr3_previews(data):
+    """
+    (offset, length) of the JPEGs in a Canon CR3: the first sample of each
+    track (the full-size preview is one of them), the PRVW screen preview
+    and the THMB thumbnail; and the orientation from the CMT1 TIFF block.
+    """
+    extents, orientation = [], None
+    moov = child(data, 0, len(data), b"moov")
+    if moov is not None:
+        for kind, start, end in boxes(data, *moov):
+            if kind == b"trak":
+                sample = track_sample(data, start, end)
+                if sample:
+                    extents.append(sample)
+            elif kind == CANON_UUID:
+                cmt1 = child(data, start, end, b"CMT1")
+                if cmt1 is not None:
+                    reader = TiffReader(data, cmt1[0])
+                    ifd0, _ = reader.ifd(reader.first_ifd)
+                    orientation = ifd_orientation(reader, ifd0)
+                thmb = child(data, start, end, b"THMB")
+                if thmb is not None:
+                    # version/flags, width, height, then the JPEG length
+                    length = struct.unpack_from(">I", data, thmb[0] + 8)[0]
+                    extents.append((thmb[0] + 16, length))
+    preview = child(data, 0, len(data), CANON_PREVIEW_UUID)
+    if preview is not None:
+        prvw = child(data, preview[0] + 8, preview[1], b"PRVW")
+        if prvw is not None:
+            start = prvw[0] - 8
+            extents.append((start + PRVW_HEADER.size, PRVW_HEADER.unpack_from(data, start)[2]))
+    return extents, orientation
+
+
+def heif_items(data, start, end):
+    """{item id: (type, offset, length)} for the single-extent items in a HEIF meta box."""
+    types, locations = {}, {}
+    iinf = child(data, start, end, b"iinf")
+    if iinf is not None:
+        first_entry = iinf[0] + (6 if data[iinf[0]] == 0 else 8)
+        for kind, entry, _ in boxes(data, first_entry, iinf[1]):
+            version = data[entry]
+            if kind != b"infe" or version < 2:
+                continue
+            if version == 2:
+                item_id, = struct.unpack_from(">H", data, entry + 4)
+                position = entry + 8
+            else:
+                item_id, = struct.unpack_from(">I", data, entry + 4)
+                position = entry + 10
+            types[item_id] = bytes(data[position:position + 4])
+
+    iloc = child(data, start, end, b"iloc")
+    if iloc is not None:
+        position = iloc[0]
+        version = data[position]
+        offset_size, length_size = data[position + 4] >> 4, data[position + 4] & 15
+        base_size, index_size = data[position + 5] >> 4, data[position + 5] & 15
+        if version < 2:
+            count, = struct.unpack_from(">H", data, position + 6)
+            position += 8
+        else:
+            count, = struct.unpack_from(">I", data, position + 6)
+            position += 10
+
+        def number(size):
+            nonlocal position
+            value = int.from_bytes(data[position:position + size], "big") if size else 0
+            position += size
+            return value
+
+        for _ in range(count):
+            item_id = number(2 if version < 2 else 4)
+            method = number(2) & 15 if version in (1, 2) else 0
+            number(2)
+            base = number(base_size)
+            extents = [(number(index_size if version in (1, 2) else 0),
+                        number(offset_size), number(length_size))
+                       for _ in range(number(2))]
+            if method == 0 and len(extents) == 1:
+                locations[item_id] = (base + extents[0][1], extents[0][2])
+    return {item_id: (types[item_id],) + location
+            for item_id, location in locations.items() if item_id in types}
+
+
+def heif_previews(data):
+    """
+    (offset, length) of the JPEGs in a HEIF file: JPEG-coded items and the
+    thumbnail in IFD1 of its Exif item; and the orientation from that Exif.
+    HEVC-coded images are left to whatever Qt image plugin is installed.
+    """
+    extents, orientation = [], None
+    meta = child(data, 0, len(data), b"meta")
+    if meta is None:
+        return extents, orientation
+    for kind, offset, length in heif_items(data, meta[0] + 4, meta[1]).values():
+        if kind == b"jpeg":
+            extents.append((offset, length))
+        elif kind == b"Exif":
+            # The Exif item starts with the offset of its TIFF header
+            reader = TiffReader(data, offset + 4 + struct.unpack_from(">I", data, offset)[0])
+            ifd0, next_ifd = reader.ifd(reader.first_ifd)
+            orientation = ifd_orientation(reader, ifd0)
+            if next_ifd:
+                ifd1, _ = reader.ifd(next_ifd)
+                if JPEG_INTERCHANGE_FORMAT in ifd1 and JPEG_INTERCHANGE_FORMAT_LENGTH in ifd1:
+                    extents.append(tiff_extent(
+                        reader, ifd1[JPEG_INTERCHANGE_FORMAT], ifd1[JPEG_INTERCHANGE_FORMAT_LENGTH]))
+    return extents, orientation
+
+
+def preview_extents(data):
+    """Embedded JPEG extents and orientation of a RAW or HEIF file, by its container."""
+    if data[:4] in (b"II*\0", b"MM\0*", b"IIU\0"):
+        return tiff_previews(TiffReader(data))
+    if data[4:8] == b"ftyp":
+        if data[8:12] == b"crx ":
+            return cr3_previews(data)
+        return heif_previews(data)
+    return [], None
+
+
+def read_raw_preview(path, width=None):
+    """
+    The embedded JPEG preview of a RAW or HEIF file as (JPEG bytes, EXIF
+    orientation), or None if it has none Qt can decode. The file is
+    memory-mapped and only the container structure and the chosen preview
+    are touched, never the sensor data. With width, the smallest preview at
+    least that wide once oriented is chosen; otherwise the largest.
+    The orientation (None if unknown) applies to the preview, whose own
+    EXIF, if any, is not to be trusted.
+    """
+    try:
+        with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            extents, orientation = preview_extents(data)
+            previews = []
+            for offset, length in extents:
+                frame = jpeg_frame(data, offset, length) if 0 < length <= MAX_PREVIEW_BYTES else None
+                if frame:
+                    shown_width = frame[1] if orientation in SIDEWAYS_ORIENTATIONS else frame[0]
+                    previews.append((frame[0] * frame[1], shown_width, offset, length))
+            if not previews:
+                return None
+            previews.sort()
+            chosen = previews[-1]
+            if width is not None:
+                chosen = next((preview for preview in previews if preview[1] >= width), chosen)
+            _, _, offset, length = chosen
+            return data[offset:offset + length], orientation
+    except (OSError,) + PARSE_ERRORS:
+        return None
@@ -0,0 +1,311 @@
+import bisect
+from collections import defaultdict
+
+from .dates import date_key, in_range, roll_up
+
+TAG_FACETS = ("people", "groups", "emotions")
+LOCATION_FIELDS = ("name", "category", "country", "region", "city")
+
+
+def filters_without(filters, facet):
+    """
+    Copy of filters with the selection for one facet (a tag facet or a
+    location field) removed, for counting that facet's options.
+    """
+    filters = dict(filters)
+    if facet in TAG_FACETS:
+        filters[facet] = None
+    elif facet == "date":
+        filters.update(date=None, date_from=None, date_to=None)
+    elif isinstance(filters.get("location"), dict):
+        location = {field: values for field, values in filters["location"].items() if field != facet}
+        filters["location"] = location or None
+    return filters
+
+
+def members(bitmap):
+    """Yield the set bits of bitmap, lowest first."""
+    bits = bin(bitmap)[:1:-1]
+    ordinal = bits.find("1")
+    while ordinal != -1:
+        yield ordinal
+        ordinal = bits.find("1", ordinal + 1)
+
+
+def bitmap_of(ordinals):
+    """Build a bitmap from many ordinals at once without quadratic int shifting."""
+    ordinals = list(ordinals)
+    if not ordinals:
+        return 0
+    data = bytearray(max(ordinals) // 8 + 1)
+    for ordinal in ordinals:
+        data[ordinal >> 3] |= 1 << (ordinal & 7)
+    return int.from_bytes(data, "little")
+
+
+def union(bitmaps):
+    result = 0
+    for bitmap in bitmaps:
+        result |= bitmap
+    return result
+
+
+class TagIndex:
+    """
+    In-memory filter index. Every image gets a small integer ordinal, and each
+    tag, location field value and date maps to a bitmap (a Python int) with the
+    ordinals of the images that carry it. Filters become AND/OR over bitmaps,
+    with the same semantics as DatabaseManager.compile_filters.
+    """
+
+    def __init__(self):
+        self.ordinals = {}
+        self.filenames = []
+        self.dates = []
+        self.locations = []
+        self.present = 0
+        self.untagged = 0
+        self.tags = {facet: defaultdict(int) for facet in TAG_FACETS}
+        self.location_values = {field: defaultdict(int) for field in LOCATION_FIELDS}
+        self.date_values = defaultdict(int)
+        # (ordinals newest first, their sort keys); rebuilt after dates change
+        self.order = None
+
+    def load(self, rows):
+        """
+        Build the index from DatabaseManager.get_tag_index_rows: images are
+        (id, filename, date, tagged, present, location) rows, and each facet
+        lists (image id, name) pairs.
+        """
+        self.__init__()
+        by_id = {}
+        present, untagged = [], []
+        dates, locations = defaultdict(list), {field: defaultdict(list) for field in LOCATION_FIELDS}
+        for ordinal, (image_id, filename, date, tagged, is_present, location) in enumerate(rows["images"]):
+            by_id[image_id] = ordinal
+            self.ordinals[filename] = ordinal
+            self.filenames.append(filename)
+            self.dates.append(date)
+            self.locations.append(location)
+            if is_present:
+                present.append(ordinal)
+            if not tagged:
+                untagged.append(ordinal)
+            if date:
+                dates[date].append(ordinal)
+            for field in LOCATION_FIELDS:
+                if location and location.get(field):
+                    locations[field][location[field]].append(ordinal)
+
+        self.present = bitmap_of(present)
+        self.untagged = bitmap_of(untagged)
+        for date, ordinals in dates.items():
+            self.date_values[date] = bitmap_of(ordinals)
+        for field in LOCATION_FIELDS:
+            for value, ordinals in locations[field].items():
+                self.location_values[field][value] = bitmap_of(ordinals)
+        for facet in TAG_FACETS:
+            tagged = defaultdict(list)
+            for image_id, name in rows[facet]:
+                if image_id in by_id:
+                    tagged[name].append(by_id[image_id])
+            for name, ordinals in tagged.items():
+                self.tags[facet][name] = bitmap_of(ordinals)
+
+    def add_image(self, filename, tagged=False, present=True):
+        ordinal = self.ordinals.get(filename)
+        if ordinal is None:
+            ordinal = len(self.filenames)
+            self.ordinals[filename] = ordinal
+            self.filenames.append(filename)
+            self.dates.append(None)
+            self.locations.append(None)
+            self.order = None
+            if not tagged:
+                self.untagged |= 1 << ordinal
+        if present:
+            self.present |= 1 << ordinal
+        return ordinal
+
+    def selection(self, filenames):
+        return bitmap_of(self.ordinals[filename] for filename in filenames
+                         if filename in self.ordinals)
+
+    def set_date(self, bitmap, date):
+        for old in {self.dates[ordinal] for ordinal in members(bitmap)}:
+            if old in self.date_values:
+                self.date_values[old] &= ~bitmap
+                if not self.date_values[old]:
+                    del self.date_values[old]
+        if date:
+            self.date_values[date] |= bitmap
+        for ordinal in members(bitmap):
+            self.dates[ordinal] = date
+        self.order = None
+
+    def set_dates(self, dates):
+        """Set {filename: date} for many images, one bitmap update per distinct date."""
+        by_date = defaultdict(list)
+        for filename, date in dates.items():
+            by_date[date].append(filename)
+        for date, filenames in by_date.items():
+            bitmap = self.selection(filenames)
+            if bitmap:
+                self.set_date(bitmap, date)
+
+    def set_location(self, bitmap, location):
+        old_locations = [self.locations[ordinal] for ordinal in members(bitmap)]
+        for field in LOCATION_FIELDS:
+            values = self.location_values[field]
+            for old in {old.get(field) for old in old_locations if old}:
+                if old in values:
+                    values[old] &= ~bitmap
+                    if not values[old]:
+                        del values[old]
+            if location and location.get(field):
+                values[location[field]] |= bitmap
+        for ordinal in members(bitmap):
+            self.locations[ordinal] = location
+
+    def apply_folder_report(self, report):
+        """Follow the report returned by DatabaseManager.apply_folder_changes."""
+        for old, new in report["renamed"]:
+            # An untagged row for the new path was dropped in favour of the old one
+            stale = self.ordinals.pop(new, None)
+            if stale is not None:
+                self.present &= ~(1 << stale)
+                self.untagged &= ~(1 << stale)
+            ordinal = self.ordinals.pop(old, None)
+            if ordinal is not None:
+                self.ordinals[new] = ordinal
+                self.filenames[ordinal] = new
+        for filename in report["added"]:
+            self.add_image(filename)
+        self.present &= ~self.selection(report["removed"])
+
+    def set_image(self, filename, people, groups, emotions, location, date):
+        """Replace the tags of one image, as save_metadata does."""
+        ordinal = self.add_image(filename, tagged=True)
+        bitmap = 1 << ordinal
+        self.untagged &= ~bitmap
+        for facet, names in (("people", people), ("groups", groups), ("emotions", emotions)):
+            bitmaps = self.tags[facet]
+            for name in list(bitmaps):
+                bitmaps[name] &= ~bitmap
+            for name in names:
+                bitmaps[name] |= bitmap
+        self.set_location(bitmap, location)
+        self.set_date(bitmap, date)
+
+    def bulk_update(self, filenames, add, remove, location, date):
+        """Mirror DatabaseManager.bulk_update_metadata."""
+        bitmap = self.selection(filenames)
+        if any(add.values()) or location or date:
+            self.untagged &= ~bitmap
+        for facet in TAG_FACETS:
+            bitmaps = self.tags[facet]
+            for name in add.get(facet) or []:
+                bitmaps[name] |= bitmap
+            for name in remove.get(facet) or []:
+                if name in bitmaps:
+                    bitmaps[name] &= ~bitmap
+        if location:
+            self.set_location(bitmap, location)
+        if date:
+            self.set_date(bitmap, date)
+
+    def evaluate(self, only_untagged=False, people=None, groups=None, emotions=None,
+                 location=None, date=None, date_from=None, date_to=None, within=None):
+        """
+        Return the bitmap of images matching the filters. within optionally
+        limits the result to a bitmap found elsewhere, such as search matches.
+        """
+        result = self.present
+        if within is not None:
+            result &= within
+        if only_untagged:
+            result &= self.untagged
+        for facet, names in (("people", people), ("groups", groups), ("emotions", emotions)):
+            if names:
+                bitmaps = self.tags[facet]
+                result &= union(bitmaps.get(name, 0) for name in names)
+        if isinstance(location, dict):
+            for field in LOCATION_FIELDS:
+                values = location.get(field)
+                if values:
+                    bitmaps = self.location_values[field]
+                    result &= union(bitmaps.get(value, 0) for value in values)
+        if date:
+            result &= self.date_values.get(date, 0)
+        if date_from or date_to:
+            result &= union(bitmap for value, bitmap in self.date_values.items()
+                            if in_range(date_key(value), date_from, date_to))
+        return result
+
+    def sorted_order(self):
+        """
+        All ordinals newest first, ties broken by newest ordinal like the SQL
+        ORDER BY date_key DESC, id DESC, together with ascending sort keys
+        that cursors are bisected against.
+        """
+        if self.order is None:
+            keys = {value: date_key(value) or 0 for value in self.date_values}
+            order = sorted(range(len(self.filenames)), reverse=True,
+                           key=lambda ordinal: (keys.get(self.dates[ordinal], 0), ordinal))
+            self.order = (order, [(-keys.get(self.dates[ordinal], 0), -ordinal) for ordinal in order])
+        return self.order
+
+    def page(self, after=None, limit=None, **filters):
+        """
+        Up to limit matching filenames, newest first, starting after the
+        cursor returned with the previous page. Returns (filenames, cursor);
+        the cursor is None once there is nothing left.
+        """
+        bitmap = self.evaluate(**filters)
+        data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little")
+        order, keys = self.sorted_order()
+        start = bisect.bisect_right(keys, after) if after else 0
+
+        filenames, cursor = [], None
+        for position in range(start, len(order)):
+            ordinal = order[position]
+            if ordinal >> 3 < len(data) and data[ordinal >> 3] >> (ordinal & 7) & 1:
+                if limit is not None and len(filenames) == limit:
+                    return filenames, cursor
+                filenames.append(self.filenames[ordinal])
+                cursor = keys[position]
+        return filenames, None
+
+    def filter(self, **filters):
+        """Return matching filenames, newest date first like get_filtered_images."""
+        return self.page(**filters)[0]
+
+    def filter_ranked(self, filenames, **filters):
+        """Keep the filenames that match the filters, in the order given."""
+        matches = self.evaluate(within=self.selection(filenames), **filters)
+        keep = {self.filenames[ordinal] for ordinal in members(matches)}
+        return [filename for filename in filenames if filename in keep]
+
+    def facet_counts(self, **filters):
+        """
+        Count the matching images for every option of every facet. Each facet
+        is counted under the filters of all the other facets, so the options
+        next to a selection show how much picking them too would add.
+        Returns {facet: {value: count}} for the tag facets and location fields.
+        """
+        counts = {}
+        for facet in TAG_FACETS + LOCATION_FIELDS:
+            base = self.evaluate(**filters_without(filters, facet))
+            bitmaps = self.tags[facet] if facet in TAG_FACETS else self.location_values[facet]
+            counts[facet] = {value: (bitmap & base).bit_count() for value, bitmap in bitmaps.items()}
+        return counts
+
+    def date_histogram(self, **filters):
+        """Photo counts per year, month and day, as DatabaseManager.get_date_histogram."""
+        base = self.evaluate(**filters)
+        day_counts = defaultdict(int)
+        for value, bitmap in self.date_values.items():
+            key = date_key(value)
+            if key:
+                day_counts[key] += (bitmap & base).bit_count()
+        return roll_up({key: count for key, count in day_counts.items() if count})
@@ -0,0 +1,211 @@
+import mmap
+import os
+import struct
+import threading
+
+THUMBNAIL_PACK_NAME = "thumbnails.pack"
+THUMBNAIL_INDEX_NAME = "thumbnails.idx"
+
+
+class ThumbnailStore:
+    """
+    Packed thumbnail cache kept next to metadata.db.
+
+    Encoded thumbnails are appended to a single pack file and located through
+    an offset index keyed on filename, file size and mtime. The pack is read
+    through a memory map, so reopening a folder costs one index read instead
+    of decoding every photo again.
+    """
+
+    INDEX_MAGIC = b"PATHUMB1"
+    # name length, file size, mtime (ns), offset in pack, thumbnail length
+    ENTRY_HEADER = struct.Struct("<HqqQI")
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.pack_path = os.path.join(folder, THUMBNAIL_PACK_NAME)
+        self.index_path = os.path.join(folder, THUMBNAIL_INDEX_NAME)
+        self.lock = threading.RLock()
+        self.index = {}
+        self.dirty = False
+        self.map = None
+        self.rebuild_thread = None
+        self.stop_rebuild = threading.Event()
+
+        self.pack = open(self.pack_path, "ab+")
+        self.load_index()
+
+    def load_index(self):
+        self.index = {}
+        pack_size = os.path.getsize(self.pack_path)
+        try:
+            with open(self.index_path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return
+        if not data.startswith(self.INDEX_MAGIC):
+            return
+
+        pos = len(self.INDEX_MAGIC)
+        header_size = self.ENTRY_HEADER.size
+        while pos + header_size <= len(data):
+            name_len, size, mtime_ns, offset, length = self.ENTRY_HEADER.unpack_from(data, pos)
+            pos += header_size
+            name = data[pos:pos + name_len].decode("utf-8")
+            pos += name_len
+            # Entries pointing past the end of the pack are from an interrupted write
+            if offset + length <= pack_size:
+                self.index[name] = (size, mtime_ns, offset, length)
+
+    def save_index(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            parts = [self.INDEX_MAGIC]
+            for name, (size, mtime_ns, offset, length) in self.index.items():
+                encoded = name.encode("utf-8")
+                parts.append(self.ENTRY_HEADER.pack(len(encoded), size, mtime_ns, offset, length))
+                parts.append(encoded)
+            self.pack.flush()
+            tmp_path = self.index_path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(b"".join(parts))
+            os.replace(tmp_path, self.index_path)
+            self.dirty = False
+
+    def file_signature(self, filename):
+        try:
+            stat = os.stat(os.path.join(self.folder, filename))
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def is_fresh(self, filename):
+        entry = self.index.get(filename)
+        return entry is not None and entry[:2] == self.file_signature(filename)
+
+    def get(self, filename, allow_stale=False):
+        """
+        Return the encoded thumbnail for filename, or None if there is no entry.
+        Entries whose size or mtime no longer match the file are treated as
+        missing unless allow_stale is set.
+        """
+        with self.lock:
+            entry = self.index.get(filename)
+            if entry is None:
+                return None
+            size, mtime_ns, offset, length = entry
+            if not allow_stale and (size, mtime_ns) != self.file_signature(filename):
+                return None
+            if self.map is None or offset + length > len(self.map):
+                self.remap()
+            return bytes(self.map[offset:offset + length])
+
+    def put(self, filename, data):
+        signature = self.file_signature(filename)
+        if signature is None or not data:
+            return
+        with self.lock:
+            self.pack.seek(0, os.SEEK_END)
+            offset = self.pack.tell()
+            self.pack.write(data)
+            self.index[filename] = (signature[0], signature[1], offset, len(data))
+            self.dirty = True
+
+    def discard(self, filenames):
+        with self.lock:
+            for filename in filenames:
+                if self.index.pop(filename, None) is not None:
+                    self.dirty = True
+
+    def rename(self, old, new):
+        with self.lock:
+            if old in self.index:
+                self.index[new] = self.index.pop(old)
+                self.dirty = True
+
+    def remap(self):
+        self.pack.flush()
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        if os.path.getsize(self.pack_path) > 0:
+            self.map = mmap.mmap(self.pack.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def stale_filenames(self, filenames):
+        """
+        Return the filenames that have no thumbnail or whose thumbnail was
+        built from an older version of the file.
+        """
+        return [f for f in filenames if not self.is_fresh(f)]
+
+    def rebuild_stale(self, filenames, encoder, on_finished=None):
+        """
+        Re-encode stale thumbnails on a background thread. Missing ones are
+        left to whoever displays them first.
+        encoder(filename) must return encoded thumbnail bytes or None.
+        """
+        self.cancel_rebuild()
+        stale = [f for f in self.stale_filenames(filenames) if f in self.index]
+        if not stale:
+            return
+
+        def run():
+            for filename in stale:
+                if self.stop_rebuild.is_set():
+                    break
+                data = encoder(filename)
+                if data:
+                    self.put(filename, data)
+            self.compact_if_needed()
+            self.save_index()
+            if on_finished and not self.stop_rebuild.is_set():
+                on_finished()
+
+        self.stop_rebuild.clear()
+        self.rebuild_thread = threading.Thread(target=run, daemon=True)
+        self.rebuild_thread.start()
+
+    def cancel_rebuild(self):
+        if self.rebuild_thread and self.rebuild_thread.is_alive():
+            self.stop_rebuild.set()
+            self.rebuild_thread.join()
+        self.rebuild_thread = None
+
+    def compact_if_needed(self):
+        """
+        Rewrite the pack without superseded thumbnails once they take up more
+        space than the live ones.
+        """
+        with self.lock:
+            live_bytes = sum(entry[3] for entry in self.index.values())
+            self.pack.seek(0, os.SEEK_END)
+            if self.pack.tell() <= 2 * live_bytes:
+                return
+
+            tmp_path = self.pack_path + ".tmp"
+            new_index = {}
+            with open(tmp_path, "wb") as out:
+                for name in list(self.index):
+                    data = self.get(name, allow_stale=True)
+                    size, mtime_ns = self.index[name][:2]
+                    new_index[name] = (size, mtime_ns, out.tell(), len(data))
+                    out.write(data)
+
+            if self.map is not None:
+                self.map.close()
+                self.map = None
+            self.pack.close()
+            os.replace(tmp_path, self.pack_path)
+            self.pack = open(self.pack_path, "ab+")
+            self.index = new_index
+            self.dirty = True
+
+    def close(self):
+        self.cancel_rebuild()
+        with self.lock:
+            self.save_index()
+            if self.map is not None:
+                self.map.close()
+                self.map = None
+            self.pack.close()
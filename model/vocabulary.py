@@ -0,0 +1,52 @@
+import bisect
+
+TAG_FIELDS = ("people", "groups", "emotions")
+LOCATION_VALUE_FIELDS = ("name", "category", "country", "region", "city", "postcode")
+VOCABULARY_FIELDS = TAG_FIELDS + LOCATION_VALUE_FIELDS
+
+
+class Vocabulary:
+    """
+    The sorted distinct values of every tag facet and location field, as the
+    pick lists show them. Writes only ever add or remove a few values, so the
+    lists are patched in place rather than queried and rebuilt; the list
+    objects stay the same and can be shared with the widgets' owners.
+    """
+
+    def __init__(self):
+        self.values = {field: [] for field in VOCABULARY_FIELDS}
+
+    def load(self, values):
+        """Replace everything with DatabaseManager.get_vocabulary output."""
+        for field in VOCABULARY_FIELDS:
+            self.values[field][:] = sorted(set(values.get(field) or []))
+
+    def add(self, field, values):
+        """Insert the values not known yet and return them, sorted."""
+        known = self.values[field]
+        inserted = []
+        for value in sorted(set(values)):
+            index = bisect.bisect_left(known, value)
+            if index == len(known) or known[index] != value:
+                known.insert(index, value)
+                inserted.append(value)
+        return inserted
+
+    def remove(self, field, values):
+        """Drop the values that are known and return them, sorted."""
+        known = self.values[field]
+        removed = []
+        for value in sorted(set(values)):
+            index = bisect.bisect_left(known, value)
+            if index < len(known) and known[index] == value:
+                del known[index]
+                removed.append(value)
+        return removed
+
+
+def saved_values(people=(), groups=(), emotions=(), location=None):
+    """{field: values} a save_metadata or bulk_update_metadata call stores."""
+    values = {"people": people or [], "groups": groups or [], "emotions": emotions or []}
+    for field in LOCATION_VALUE_FIELDS:
+        values[field] = [location[field]] if location and location.get(field) else []
+    return values
@@ -0,0 +1,83 @@
+import os
+import struct
+import tempfile
+import unittest
+
+from model.exif_reader import (
+    ASCII, EXIF_IFD, GPS_IFD, GPS_LATITUDE, JPEG_INTERCHANGE_FORMAT, JPEG_INTERCHANGE_FORMAT_LENGTH,
+    ORIENTATION, read_exif, read_exif_batch, read_exif_thumbnail,
+)
+
+SHORT = 3
+LONG = 4
+
+
+def tiff(*ifds):
+    """
+    A little-endian TIFF whose IFDs are chained in order. Each IFD is a list
+    of (tag, type, count, raw 4 bytes) entries.
+    """
+    data = b"II*\0" + struct.pack("<I", 8)
+    for number, entries in enumerate(ifds):
+        next_ifd = len(data) + 2 + len(entries) * 12 + 4 if number + 1 < len(ifds) else 0
+        data += struct.pack("<H", len(entries))
+        for tag, kind, count, raw in entries:
+            data += struct.pack("<HHI", tag, kind, count) + raw
+        data += struct.pack("<I", next_ifd)
+    return data
+
+
+class MalformedExifTest(unittest.TestCase):
+    """Fields of the wrong TIFF type are skipped rather than raising."""
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def write(self, name, data):
+        with open(os.path.join(self.folder.name, name), "wb") as file:
+            file.write(data)
+        return os.path.join(self.folder.name, name)
+
+    def test_ascii_sub_ifd_pointers(self):
+        path = self.write("a.tif", tiff([
+            (ORIENTATION, SHORT, 1, struct.pack("<HH", 6, 0)),
+            (EXIF_IFD, ASCII, 4, b"abc\0"),
+            (GPS_IFD, ASCII, 4, b"abc\0"),
+        ]))
+        self.assertEqual(read_exif(path)["orientation"], 6)
+
+    def test_ascii_latitude(self):
+        # The GPS IFD right after IFD0, which takes 8 + 2 + 12 + 4 bytes
+        path = self.write("b.tif", tiff(
+            [(GPS_IFD, LONG, 1, struct.pack("<I", 26))],
+            [(GPS_LATITUDE, ASCII, 4, b"51N\0")],
+        ))
+        self.assertIsNone(read_exif(path)["latitude"])
+
+    def test_ascii_orientation(self):
+        path = self.write("c.tif", tiff([(ORIENTATION, ASCII, 2, b"6\0\0\0")]))
+        self.assertIsNone(read_exif(path)["orientation"])
+
+    def test_batch_keeps_going(self):
+        self.write("bad.tif", tiff([(EXIF_IFD, ASCII, 4, b"abc\0")]))
+        self.write("good.tif", tiff([(ORIENTATION, SHORT, 1, struct.pack("<HH", 3, 0))]))
+        results = dict(read_exif_batch(self.folder.name, [(1, "bad.tif"), (2, "missing.tif"), (3, "good.tif")]))
+        self.assertIsNone(results[2])
+        self.assertEqual(results[3]["orientation"], 3)
+
+    def test_ascii_thumbnail_offset(self):
+        exif = tiff(
+            [(ORIENTATION, SHORT, 1, struct.pack("<HH", 1, 0))],
+            [(JPEG_INTERCHANGE_FORMAT, ASCII, 4, b"abc\0"),
+             (JPEG_INTERCHANGE_FORMAT_LENGTH, LONG, 1, struct.pack("<I", 100))],
+        )
+        app1 = b"Exif\0\0" + exif
+        path = self.write("d.jpg", b"\xff\xd8\xff\xe1" + struct.pack(">H", len(app1) + 2) + app1 + b"\xff\xd9")
+        self.assertIsNone(read_exif_thumbnail(path))
+
+
+if __name__ == "__main__":
+    unittest.main()
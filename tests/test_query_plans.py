@@ -0,0 +1,61 @@
+import os
+import tempfile
+import unittest
+
+from model.database_manager import DatabaseManager
+
+JUNCTIONS = {
+    "people": ("ImagePerson", "idx_imageperson_person"),
+    "groups": ("ImageGroup", "idx_imagegroup_group"),
+    "emotions": ("ImageEmotion", "idx_imageemotion_emotion"),
+}
+
+
+class FilterQueryPlanTest(unittest.TestCase):
+    """The SQL behind filters, search and paging reaches junction rows by tag, never by scanning."""
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.db = DatabaseManager(os.path.join(self.folder.name, "metadata.db"))
+        self.db.save_metadata("a.jpg", "Beach day", ["Al"], ["Family"], ["joy"],
+                              {"name": "Beach", "city": "Brighton"}, "2021-06-01")
+
+    def tearDown(self):
+        self.db.conn.close()
+        self.folder.cleanup()
+
+    def assert_uses_junction_indexes(self, plan, facets):
+        text = "\n".join(plan)
+        for facet in facets:
+            table, index = JUNCTIONS[facet]
+            self.assertIn(f"USING COVERING INDEX {index}", text)
+        for table, _ in JUNCTIONS.values():
+            self.assertNotIn(f"SCAN {table}", text)
+        self.assertFalse([step for step in plan if step.startswith("SCAN j")], text)
+
+    def test_filter(self):
+        plan = self.db.explain_filtered_images(people=["Al"], groups=["Family"], emotions=["joy"])
+        self.assert_uses_junction_indexes(plan, ["people", "groups", "emotions"])
+
+    def test_single_facet_filter(self):
+        for facet in JUNCTIONS:
+            plan = self.db.explain_filtered_images(**{facet: ["Al", "Bo"]})
+            self.assert_uses_junction_indexes(plan, [facet])
+
+    def test_search(self):
+        plan = self.db.explain_filtered_images(people=["Al"], emotions=["joy"], search="beach")
+        self.assert_uses_junction_indexes(plan, ["people", "emotions"])
+        self.assertTrue(any("ImageSearch" in step for step in plan))
+
+    def test_first_page(self):
+        plan = self.db.explain_filtered_images(page=True, people=["Al"], groups=["Family"])
+        self.assert_uses_junction_indexes(plan, ["people", "groups"])
+
+    def test_later_page(self):
+        plan = self.db.explain_filtered_images(page=True, after=(20210601, 1), emotions=["joy"],
+                                               date_from="2020")
+        self.assert_uses_junction_indexes(plan, ["emotions"])
+
+
+if __name__ == "__main__":
+    unittest.main()
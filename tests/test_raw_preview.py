@@ -0,0 +1,55 @@
+import os
+import struct
+import tempfile
+import unittest
+
+from model.exif_reader import ASCII, JPEG_INTERCHANGE_FORMAT, JPEG_INTERCHANGE_FORMAT_LENGTH, ORIENTATION
+from model.raw_preview import COMPRESSION, PANASONIC_JPG_FROM_RAW, SUB_IFDS, read_raw_preview
+
+LONG = 4
+
+
+def tiff(entries, header=b"II*\0"):
+    """A little-endian TIFF with one IFD of (tag, type, count, raw 4 bytes) entries."""
+    data = header + struct.pack("<IH", 8, len(entries))
+    for tag, kind, count, raw in entries:
+        data += struct.pack("<HHI", tag, kind, count) + raw
+    return data + struct.pack("<I", 0)
+
+
+class MalformedRawTest(unittest.TestCase):
+    """Fields of the wrong TIFF type leave a RAW without a preview rather than raising."""
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def read(self, name, data):
+        path = os.path.join(self.folder.name, name)
+        with open(path, "wb") as file:
+            file.write(data)
+        return read_raw_preview(path, 200)
+
+    def test_ascii_sub_ifds(self):
+        self.assertIsNone(self.read("a.cr2", tiff([
+            (ORIENTATION, ASCII, 2, b"6\0\0\0"),
+            (SUB_IFDS, ASCII, 4, b"abc\0"),
+        ])))
+
+    def test_ascii_offsets(self):
+        self.assertIsNone(self.read("b.arw", tiff([
+            (COMPRESSION, ASCII, 2, b"6\0\0\0"),
+            (JPEG_INTERCHANGE_FORMAT, ASCII, 4, b"abc\0"),
+            (JPEG_INTERCHANGE_FORMAT_LENGTH, LONG, 1, struct.pack("<I", 100)),
+        ])))
+
+    def test_ascii_panasonic_preview(self):
+        self.assertIsNone(self.read("c.raw", tiff([
+            (PANASONIC_JPG_FROM_RAW, ASCII, 4, b"abc\0"),
+        ], header=b"IIU\0")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+from PyQt6.QtWidgets import (
+    QDialog, QVBoxLayout, QLabel, QListWidget, QListWidgetItem, QLineEdit,
+    QCheckBox, QDateEdit, QWidget, QDialogButtonBox
+)
+from PyQt6.QtCore import Qt, QDate
+from model.vocabulary import LOCATION_VALUE_FIELDS
+from .widgets.editable_dropdown import EditableDropdown
+
+
+class BatchTagDialog(QDialog):
+    """
+    Collects a bulk edit for the images selected in the grid.
+    Each tag starts partially checked, meaning "leave as is"; checking it adds
+    the tag to every selected image and unchecking it removes it.
+    """
+
+    def __init__(self, count, people_list, group_list, emotion_list, location_data, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(f"Tag {count} images")
+        self.layout = QVBoxLayout()
+
+        self.tag_lists = {}
+        self.new_tag_inputs = {}
+        for facet, label, names in (("people", "People:", people_list),
+                                    ("groups", "Groups:", group_list),
+                                    ("emotions", "Emotions:", emotion_list)):
+            self.layout.addWidget(QLabel(label))
+            list_widget = QListWidget()
+            for name in names:
+                item = QListWidgetItem(name)
+                item.setFlags(item.flags() | Qt.ItemFlag.ItemIsUserCheckable
+                              | Qt.ItemFlag.ItemIsUserTristate)
+                item.setCheckState(Qt.CheckState.PartiallyChecked)
+                list_widget.addItem(item)
+            self.layout.addWidget(list_widget)
+            new_input = QLineEdit()
+            new_input.setPlaceholderText("Add new (comma separated)")
+            self.layout.addWidget(new_input)
+            self.tag_lists[facet] = list_widget
+            self.new_tag_inputs[facet] = new_input
+
+        self.set_location_checkbox = QCheckBox("Set Location")
+        self.layout.addWidget(self.set_location_checkbox)
+        self.location_container = QWidget()
+        location_layout = QVBoxLayout()
+        self.location_container.setLayout(location_layout)
+        self.location_dropdowns = {}
+        for field in LOCATION_VALUE_FIELDS:
+            dropdown = EditableDropdown(label=field, parent=self)
+            dropdown.add_items(location_data.get(field, []))
+            location_layout.addWidget(dropdown)
+            self.location_dropdowns[field] = dropdown
+        self.set_location_checkbox.stateChanged.connect(
+            lambda state: self.location_container.setVisible(state == Qt.CheckState.Checked.value)
+        )
+        self.location_container.setVisible(False)
+        self.layout.addWidget(self.location_container)
+
+        self.set_date_checkbox = QCheckBox("Set Date")
+        self.layout.addWidget(self.set_date_checkbox)
+        self.date = QDateEdit()
+        self.date.setCalendarPopup(True)
+        self.date.setDisplayFormat("yyyy-MM-dd")
+        self.date.setDate(QDate.currentDate())
+        self.date.setEnabled(False)
+        self.set_date_checkbox.stateChanged.connect(
+            lambda state: self.date.setEnabled(state == Qt.CheckState.Checked.value)
+        )
+        self.layout.addWidget(self.date)
+
+        buttons = QDialogButtonBox(
+            QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        self.layout.addWidget(buttons)
+
+        self.setLayout(self.layout)
+
+    def collect_changes(self):
+        add, remove = {}, {}
+        for facet, list_widget in self.tag_lists.items():
+            add[facet], remove[facet] = [], []
+            for i in range(list_widget.count()):
+                item = list_widget.item(i)
+                if item.checkState() == Qt.CheckState.Checked:
+                    add[facet].append(item.text())
+                elif item.checkState() == Qt.CheckState.Unchecked:
+                    remove[facet].append(item.text())
+            for name in self.new_tag_inputs[facet].text().split(","):
+                name = name.strip()
+                if name and name not in add[facet]:
+                    add[facet].append(name)
+
+        location = None
+        if self.set_location_checkbox.isChecked():
+            location = {field: dropdown.get_selected_value()
+                        for field, dropdown in self.location_dropdowns.items()}
+            if not location["name"]:
+                location = None
+
+        date = self.date.date().toString("yyyy-MM-dd") if self.set_date_checkbox.isChecked() else None
+
+        return {"add": add, "remove": remove, "location": location, "date": date}
@@ -1,10 +1,14 @@
 from PyQt6.QtWidgets import (
     QVBoxLayout, QLabel, QCheckBox, QListWidget, QListWidgetItem,
-    QPushButton, QWidget, QDateEdit, QInputDialog
+    QPushButton, QWidget, QDateEdit, QInputDialog, QTreeWidget, QTreeWidgetItem, QLineEdit
 )
-from PyQt6.QtCore import Qt, QDate
+from PyQt6.QtCore import Qt, QDate, QTimer
+from .widgets.sorted_items import sorted_position
 from .widgets.toast import Toast
 
+# Quiet period after the last selection change before a live filter runs
+LIVE_FILTER_DELAY_MS = 150
+
 # In filter_panel.py
 class FilterPanel(QWidget):
     def __init__(self, people_list, group_list, emotion_list, on_apply_filters=None, on_clear_filters=None):
@@ -16,12 +20,28 @@ class FilterPanel(QWidget):
         self.on_clear_filters = on_clear_filters
         self.metadata_changed = False
         self.current_index = -1  # needed for collect_metadata, though may be redundant here
+        self.live_filtering = False
+
+        self.live_filter_timer = QTimer(self)
+        self.live_filter_timer.setSingleShot(True)
+        self.live_filter_timer.setInterval(LIVE_FILTER_DELAY_MS)
+        self.live_filter_timer.timeout.connect(
+            lambda: self.on_apply_filters(
+                self.collect_filter_data()) if self.on_apply_filters else None
+        )
 
         self.setup_filter_panel()
 
     def setup_filter_panel(self):
         self.filter_panel = QVBoxLayout()
 
+        # Search
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("Search descriptions, tags and places")
+        self.search_input.setClearButtonEnabled(True)
+        self.search_input.returnPressed.connect(self.apply_filters)
+        self.filter_panel.addWidget(self.search_input)
+
         # Tagged status
         self.filter_panel.addWidget(QLabel("Filter by Tagged Status:"))
         self.untagged_checkbox = QCheckBox("Show Only Untagged Images")
@@ -87,24 +107,33 @@ class FilterPanel(QWidget):
             QListWidget.SelectionMode.MultiSelection)
         self.filter_panel.addWidget(self.country_filter_list)
 
-        # Date
-        self.use_date_checkbox = QCheckBox("Filter by Date")
+        # Date range
+        self.use_date_checkbox = QCheckBox("Filter by Date Range")
         self.filter_panel.addWidget(self.use_date_checkbox)
 
-        self.date_filter_input = QDateEdit()
-        self.date_filter_input.setCalendarPopup(True)
-        self.date_filter_input.setDisplayFormat("yyyy-MM-dd")
-        self.date_filter_input.setDate(QDate.currentDate())
-        self.filter_panel.addWidget(self.date_filter_input)
-
-        # Optional: disable date input by default
-        self.date_filter_input.setEnabled(False)
+        self.date_from_input = QDateEdit()
+        self.date_to_input = QDateEdit()
+        for label, date_input in (("From:", self.date_from_input), ("To:", self.date_to_input)):
+            date_input.setCalendarPopup(True)
+            date_input.setDisplayFormat("yyyy-MM-dd")
+            date_input.setDate(QDate.currentDate())
+            # Optional: disable date input by default
+            date_input.setEnabled(False)
+            self.filter_panel.addWidget(QLabel(label))
+            self.filter_panel.addWidget(date_input)
 
         self.use_date_checkbox.stateChanged.connect(
-            lambda state: self.date_filter_input.setEnabled(
-                state == Qt.CheckState.Checked.value)
+            lambda state: [date_input.setEnabled(state == Qt.CheckState.Checked.value)
+                           for date_input in (self.date_from_input, self.date_to_input)]
         )
 
+        # Timeline: photo counts per year and month; clicking one filters to it
+        self.filter_panel.addWidget(QLabel("Timeline:"))
+        self.timeline = QTreeWidget()
+        self.timeline.setHeaderHidden(True)
+        self.timeline.itemClicked.connect(self.select_period)
+        self.filter_panel.addWidget(self.timeline)
+
         # Filter controls
         self.reset_filter_button = QPushButton("Clear Filters")
         self.reset_filter_button.clicked.connect(
@@ -113,78 +142,179 @@ class FilterPanel(QWidget):
         self.filter_panel.addWidget(self.reset_filter_button)
 
         self.apply_filter_button = QPushButton("Apply Filters")
-        self.apply_filter_button.clicked.connect(
-            lambda: self.on_apply_filters(
-                self.collect_filter_data()) if self.on_apply_filters else None
-        )
+        self.apply_filter_button.clicked.connect(self.apply_filters)
 
         self.filter_panel.addWidget(self.apply_filter_button)
 
+        # Live filtering reacts to every change of the filter widgets
+        for filter_list in (self.people_filter_list, self.group_filter_list,
+                            self.emotion_filter_list, self.location_name_filter_list,
+                            self.category_filter_list, self.region_filter_list,
+                            self.city_filter_list, self.country_filter_list):
+            filter_list.itemSelectionChanged.connect(self.schedule_live_filter)
+        self.untagged_checkbox.stateChanged.connect(self.schedule_live_filter)
+        self.search_input.textChanged.connect(self.schedule_live_filter)
+        self.use_date_checkbox.stateChanged.connect(self.schedule_live_filter)
+        self.date_from_input.dateChanged.connect(self.schedule_live_filter)
+        self.date_to_input.dateChanged.connect(self.schedule_live_filter)
+
         self.setLayout(self.filter_panel)
 
+    def set_live_filtering(self, enabled):
+        """Filter as the selection changes instead of waiting for Apply."""
+        self.live_filtering = enabled
+        self.apply_filter_button.setVisible(not enabled)
+
+    def schedule_live_filter(self, *args):
+        if self.live_filtering:
+            self.live_filter_timer.start()
+
+    def apply_filters(self):
+        if self.on_apply_filters:
+            self.on_apply_filters(self.collect_filter_data())
+        Toast(self, "Filters applied.")
+
     def populate_people_filter_list(self):
         self.people_filter_list.clear()
         for person in self.people_list:
-            item = QListWidgetItem(person)
-            self.people_filter_list.addItem(item)
+            self.people_filter_list.addItem(self.make_filter_item(person))
 
     def populate_group_filter_list(self):
         self.group_filter_list.clear()
         for group in self.group_list:
-            item = QListWidgetItem(group)
-            self.group_filter_list.addItem(item)
+            self.group_filter_list.addItem(self.make_filter_item(group))
 
     def populate_emotion_filter_list(self):
         self.emotion_filter_list.clear()
         for emotion in self.emotion_list:
-            item = QListWidgetItem(emotion)
-            self.emotion_filter_list.addItem(item)
+            self.emotion_filter_list.addItem(self.make_filter_item(emotion))
+
+    def make_filter_item(self, value):
+        # The label gains a count, so the raw value is kept in UserRole
+        item = QListWidgetItem(value)
+        item.setData(Qt.ItemDataRole.UserRole, value)
+        return item
+
+    def facet_lists(self):
+        return {
+            "people": self.people_filter_list,
+            "groups": self.group_filter_list,
+            "emotions": self.emotion_filter_list,
+            "name": self.location_name_filter_list,
+            "category": self.category_filter_list,
+            "region": self.region_filter_list,
+            "city": self.city_filter_list,
+            "country": self.country_filter_list,
+        }
+
+    def apply_vocabulary_delta(self, field, inserted, removed):
+        """Patch one option list with a VocabularyService.changed delta."""
+        filter_list = self.facet_lists().get(field)
+        if filter_list is None:
+            return
+        value_at = lambda row: filter_list.item(row).data(Qt.ItemDataRole.UserRole)
+        for value in inserted:
+            row = sorted_position(value_at, 0, filter_list.count(), value)
+            if row == filter_list.count() or value_at(row) != value:
+                filter_list.insertItem(row, self.make_filter_item(value))
+        for value in removed:
+            row = sorted_position(value_at, 0, filter_list.count(), value)
+            if row < filter_list.count() and value_at(row) == value:
+                filter_list.takeItem(row)
+
+    def update_facet_counts(self, counts):
+        """
+        Show how many images each option would match, e.g. "Alice (1,204)".
+        Options that would match nothing are greyed out unless selected.
+        """
+        for facet, filter_list in self.facet_lists().items():
+            facet_counts = counts.get(facet, {})
+            for i in range(filter_list.count()):
+                item = filter_list.item(i)
+                value = item.data(Qt.ItemDataRole.UserRole)
+                count = facet_counts.get(value, 0)
+                item.setText(f"{value} ({count:,})")
+                if count or item.isSelected():
+                    item.setFlags(item.flags() | Qt.ItemFlag.ItemIsEnabled)
+                else:
+                    item.setFlags(item.flags() & ~Qt.ItemFlag.ItemIsEnabled)
+
+    def update_timeline(self, histogram):
+        """Rebuild the timeline from a date histogram, keeping expanded years open."""
+        expanded = {self.timeline.topLevelItem(i).data(0, Qt.ItemDataRole.UserRole)
+                    for i in range(self.timeline.topLevelItemCount())
+                    if self.timeline.topLevelItem(i).isExpanded()}
+        self.timeline.clear()
+        years = {}
+        for year, count in sorted(histogram["years"].items(), reverse=True):
+            item = QTreeWidgetItem([f"{year} ({count:,})"])
+            item.setData(0, Qt.ItemDataRole.UserRole, year)
+            self.timeline.addTopLevelItem(item)
+            years[year] = item
+        for month, count in sorted(histogram["months"].items(), reverse=True):
+            year_item = years.get(month[:4])
+            if year_item:
+                label = QDate.fromString(month + "-01", "yyyy-MM-dd").toString("MMMM")
+                item = QTreeWidgetItem([f"{label} ({count:,})"])
+                item.setData(0, Qt.ItemDataRole.UserRole, month)
+                year_item.addChild(item)
+        for year, item in years.items():
+            item.setExpanded(year in expanded)
+
+    def select_period(self, item):
+        """Set the date range to the year or month clicked in the timeline."""
+        period = item.data(0, Qt.ItemDataRole.UserRole)
+        if len(period) == 4:
+            start = QDate(int(period), 1, 1)
+            end = start.addYears(1).addDays(-1)
+        else:
+            start = QDate.fromString(period + "-01", "yyyy-MM-dd")
+            end = start.addMonths(1).addDays(-1)
+        self.date_from_input.setDate(start)
+        self.date_to_input.setDate(end)
+        self.use_date_checkbox.setChecked(True)
+        if not self.live_filtering:
+            self.apply_filters()
+
+    def selected_values(self, filter_list):
+        return [item.data(Qt.ItemDataRole.UserRole) for item in filter_list.selectedItems()]
 
     def collect_filter_data(self):
         only_untagged = self.untagged_checkbox.isChecked()
 
-        people = [item.text()
-                  for item in self.people_filter_list.selectedItems()]
-        groups = [item.text()
-                  for item in self.group_filter_list.selectedItems()]
-        emotions = [item.text()
-                    for item in self.emotion_filter_list.selectedItems()]
+        people = self.selected_values(self.people_filter_list)
+        groups = self.selected_values(self.group_filter_list)
+        emotions = self.selected_values(self.emotion_filter_list)
 
         location = {}
-        if self.location_name_filter_list.selectedItems():
-            location["name"] = [item.text()
-                                for item in self.location_name_filter_list.selectedItems()]
-        if self.category_filter_list.selectedItems():
-            location["category"] = [item.text()
-                                    for item in self.category_filter_list.selectedItems()]
-        if self.region_filter_list.selectedItems():
-            location["region"] = [item.text()
-                                  for item in self.region_filter_list.selectedItems()]
-        if self.city_filter_list.selectedItems():
-            location["city"] = [item.text()
-                                for item in self.city_filter_list.selectedItems()]
-        if self.country_filter_list.selectedItems():
-            location["country"] = [item.text()
-                                   for item in self.country_filter_list.selectedItems()]
+        for field in ("name", "category", "region", "city", "country"):
+            values = self.selected_values(self.facet_lists()[field])
+            if values:
+                location[field] = values
 
         # Only include location if at least one field is selected
         location = location if location else None
 
-        date = self.date_filter_input.date().toString(
-            "yyyy-MM-dd") if self.use_date_checkbox.isChecked() else None
+        date_from = date_to = None
+        if self.use_date_checkbox.isChecked():
+            date_from = self.date_from_input.date().toString("yyyy-MM-dd")
+            date_to = self.date_to_input.date().toString("yyyy-MM-dd")
 
-        Toast(self, "Filters applied.")
+        search = self.search_input.text().strip()
 
         return {
+            "search": search or None,
             "only_untagged": only_untagged,
             "people": people or None,
             "groups": groups or None,
             "emotions": emotions or None,
             "location": location,
-            "date": date
+            "date_from": date_from,
+            "date_to": date_to
         }
 
     def clear_filters(self):
+        self.search_input.clear()
         self.untagged_checkbox.setChecked(False)
 
         self.people_filter_list.clearSelection()
@@ -197,11 +327,12 @@ class FilterPanel(QWidget):
         self.country_filter_list.clearSelection()
 
         self.use_date_checkbox.setChecked(False)
-        self.date_filter_input.setDate(QDate.currentDate())
+        self.date_from_input.setDate(QDate.currentDate())
+        self.date_to_input.setDate(QDate.currentDate())
 
         Toast(self, "Filters cleared.")
 
     def populate_location_list(self, widget, items):
             widget.clear()
             for value in sorted(set(items)):
-                widget.addItem(QListWidgetItem(value))
\ No newline at end of file
+                widget.addItem(self.make_filter_item(value))
\ No newline at end of file
@@ -0,0 +1,82 @@
+from PyQt6.QtCore import QSettings
+
+from model.lru_cache import LRUCache
+
+THUMBNAIL = "thumbnail"
+SCREEN = "screen"
+# Defaults in megabytes: about a thousand grid cells and a hundred full-view images
+DEFAULT_BUDGETS_MB = {THUMBNAIL: 128, SCREEN: 256}
+# Smallest budgets the settings may ask for: the grid cells of a 4K screen,
+# and two full-view images on it. With less, the grid evicts cells it shows.
+MIN_BUDGETS_MB = {THUMBNAIL: 32, SCREEN: 64}
+SETTINGS_ORGANIZATION = "PhotoAlbum"
+SETTINGS_APPLICATION = "PhotoAlbum"
+
+
+def pixmap_bytes(pixmap):
+    return pixmap.width() * pixmap.height() * pixmap.depth() // 8
+
+
+def configured_budgets():
+    """
+    Byte budget per tier from the "cache/thumbnail_mb" and "cache/screen_mb"
+    settings, so low-memory machines can shrink them and big ones grow them,
+    though not below MIN_BUDGETS_MB.
+    """
+    settings = QSettings(SETTINGS_ORGANIZATION, SETTINGS_APPLICATION)
+    budgets = {}
+    for tier, default in DEFAULT_BUDGETS_MB.items():
+        try:
+            megabytes = max(MIN_BUDGETS_MB[tier], int(settings.value(f"cache/{tier}_mb", default)))
+        except (TypeError, ValueError):
+            megabytes = default
+        budgets[tier] = megabytes * 1024 * 1024
+    return budgets
+
+
+class ImageCache:
+    """
+    Decoded pixmaps shared by the grid, the full view and the prefetcher,
+    keyed by filename within a resolution tier (THUMBNAIL or SCREEN). Each
+    tier is an LRU with its own byte budget, so a flood of thumbnails cannot
+    push out the full-view images and the other way round. Pixmaps belong to
+    the GUI thread; workers hand over QImages for the owner to convert.
+    """
+
+    def __init__(self, budgets=None):
+        budgets = budgets or configured_budgets()
+        self.tiers = {tier: LRUCache(budgets[tier], pixmap_bytes) for tier in DEFAULT_BUDGETS_MB}
+
+    def get(self, tier, filename):
+        """The cached pixmap, or None; counts as a hit or a miss."""
+        return self.tiers[tier].get(filename, None)
+
+    def contains(self, tier, filename):
+        return filename in self.tiers[tier]
+
+    def touch(self, tier, filename):
+        self.tiers[tier].touch(filename)
+
+    def put(self, tier, filename, pixmap):
+        self.tiers[tier].put(filename, pixmap)
+
+    def discard(self, filenames):
+        """Forget the files in every tier, e.g. because they changed on disk."""
+        for cache in self.tiers.values():
+            for filename in filenames:
+                cache.pop(filename)
+
+    def rename(self, old, new):
+        for cache in self.tiers.values():
+            cache.rename(old, new)
+
+    def set_budgets(self, budgets):
+        for tier, budget in budgets.items():
+            self.tiers[tier].resize(budget)
+
+    def clear(self):
+        for cache in self.tiers.values():
+            cache.clear()
+
+    def stats(self):
+        return {tier: cache.stats() for tier, cache in self.tiers.items()}
@@ -0,0 +1,133 @@
+from PyQt6.QtGui import QImageIOHandler, QImageReader, QTransform
+from PyQt6.QtCore import QBuffer, QByteArray, QIODevice, QSize
+
+from model.exif_reader import read_exif_thumbnail
+from model.raw_preview import RAW_EXTENSIONS, read_raw_preview
+
+ROTATE_90 = QImageIOHandler.Transformation.TransformationRotate90.value
+MIRROR = QImageIOHandler.Transformation.TransformationMirror.value
+FLIP = QImageIOHandler.Transformation.TransformationFlip.value
+ROTATE_270 = ROTATE_90 | MIRROR | FLIP
+# EXIF orientation -> transformation flags, as QImageReader maps them
+EXIF_TRANSFORMATIONS = {
+    2: MIRROR, 3: MIRROR | FLIP, 4: FLIP, 5: ROTATE_90 | FLIP,
+    6: ROTATE_90, 7: ROTATE_90 | MIRROR, 8: ROTATE_270,
+}
+# Embedded thumbnails whose shape differs more than this are letterboxed
+ASPECT_TOLERANCE = 0.02
+
+
+def orient(image, transformation):
+    """Apply QImageIOHandler transformation flags, read from EXIF, to a QImage."""
+    if transformation == ROTATE_270:
+        return image.transformed(QTransform().rotate(270))
+    if transformation & (MIRROR | FLIP):
+        image = image.mirrored(bool(transformation & MIRROR), bool(transformation & FLIP))
+    if transformation & ROTATE_90:
+        image = image.transformed(QTransform().rotate(90))
+    return image
+
+
+def reduced_size(size, transformation, width):
+    """
+    The size, before orientation, to decode an image of size at so it is
+    width pixels wide once oriented; None if it is no wider than that already.
+    """
+    shown_width = size.height() if transformation & ROTATE_90 else size.width()
+    if shown_width <= width:
+        return None
+    scale = width / shown_width
+    return QSize(max(1, round(size.width() * scale)), max(1, round(size.height() * scale)))
+
+
+def jpeg_reader(data):
+    """A QImageReader over in-memory JPEG bytes; keep the buffer alive until read."""
+    buffer = QBuffer()
+    buffer.setData(QByteArray(data))
+    buffer.open(QIODevice.OpenModeFlag.ReadOnly)
+    return QImageReader(buffer, b"jpeg"), buffer
+
+
+def embedded_thumbnail(path, size, scaled_size):
+    """
+    The EXIF thumbnail scaled to scaled_size, if it has at least that many
+    pixels and the shape of the full image (size), else None. Both sizes are
+    before orientation.
+    """
+    data = read_exif_thumbnail(path)
+    if not data:
+        return None
+    reader, buffer = jpeg_reader(data)
+    thumbnail_size = reader.size()
+    if (not thumbnail_size.isValid() or thumbnail_size.width() < scaled_size.width()
+            or abs(thumbnail_size.width() * size.height() / (thumbnail_size.height() * size.width()) - 1)
+            > ASPECT_TOLERANCE):
+        return None
+    reader.setScaledSize(scaled_size)
+    image = reader.read()
+    return None if image.isNull() else image
+
+
+def decode_raw_preview(path, width=None):
+    """
+    Decode the embedded JPEG preview of a RAW or HEIF file like decode_image,
+    oriented as the RAW's own EXIF says. Returns None if it has no preview.
+    """
+    preview = read_raw_preview(path, width)
+    if preview is None:
+        return None
+    data, orientation = preview
+    transformation = EXIF_TRANSFORMATIONS.get(orientation, 0)
+    reader, buffer = jpeg_reader(data)
+    size = reader.size()
+    scaled_size = reduced_size(size, transformation, width) if width and size.isValid() else None
+    if scaled_size is not None:
+        reader.setScaledSize(scaled_size)
+    image = reader.read()
+    return None if image.isNull() else orient(image, transformation)
+
+
+def decode_image(path, width=None):
+    """
+    Decode the image at path, oriented as its EXIF says, no larger than it
+    has to be to show width pixels wide (None decodes it at full size).
+    Uses the EXIF thumbnail when that is big enough; otherwise the decoder
+    is asked for the reduced size directly, which lets the JPEG decoder
+    decode at 1/2, 1/4 or 1/8 scale instead of decoding everything and
+    scaling down. Images narrower than width are not enlarged.
+    RAW and HEIF files are shown through their embedded JPEG preview, as
+    developing them would take far too long; a file without one, or whose
+    only preview is narrower than width, falls back to whatever Qt image
+    plugins are installed.
+    Uses QImage rather than QPixmap so it is safe to call off the GUI thread.
+    Returns a null QImage if the file cannot be decoded.
+    """
+    if not path.lower().endswith(RAW_EXTENSIONS):
+        return decode_with_reader(path, width)
+    preview = decode_raw_preview(path, width)
+    if preview is None:
+        return decode_with_reader(path, width)
+    if width is None or preview.width() >= width:
+        return preview
+    # Often just the EXIF thumbnail; a plugin may do better, or may only find that thumbnail too
+    image = decode_with_reader(path, width)
+    return image if image.width() > preview.width() else preview
+
+
+def decode_with_reader(path, width):
+    reader = QImageReader(path)
+    reader.setAutoTransform(True)
+    size = reader.size()
+    if width is None or not size.isValid():
+        return reader.read()
+
+    # The target width is after orientation; sizes before it are what the decoder sees
+    transformation = reader.transformation().value
+    scaled_size = reduced_size(size, transformation, width)
+    if scaled_size is None:
+        return reader.read()
+    thumbnail = embedded_thumbnail(path, size, scaled_size)
+    if thumbnail is not None:
+        return orient(thumbnail, transformation)
+    reader.setScaledSize(scaled_size)
+    return reader.read()
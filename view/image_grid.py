@@ -0,0 +1,186 @@
+import itertools
+from functools import partial
+
+from PyQt6.QtWidgets import QListView, QStyledItemDelegate, QStyle, QAbstractItemView
+from PyQt6.QtGui import QPixmap, QColor
+from PyQt6.QtCore import Qt, QAbstractListModel, QModelIndex, QSize, QRect, pyqtSignal
+
+from .image_cache import THUMBNAIL
+from .thumbnails import THUMBNAIL_WIDTH
+
+GRID_CELL_PADDING = 8
+
+
+class ImageGridModel(QAbstractListModel):
+    """
+    List model over the filenames shown in the grid. Thumbnails are requested
+    from the loader only when a row is painted and kept in the thumbnail tier
+    of the shared ImageCache, so memory depends on its budget rather than the
+    size of the library.
+    Long results arrive a page at a time: when the view scrolls towards the
+    end, the next page is requested and appended once it has been read.
+    """
+
+    page_loaded = pyqtSignal()
+
+    def __init__(self, thumbnail_loader, image_cache, parent=None):
+        super().__init__(parent)
+        self.thumbnail_loader = thumbnail_loader
+        self.thumbnail_loader.thumbnail_ready.connect(self.on_thumbnail_ready)
+        self.image_cache = image_cache
+        self.filenames = []
+        self.rows = {}
+        self.pages = None
+        self.fetching = False
+        self.request_counter = itertools.count()
+
+    def set_images(self, filenames, pages=None):
+        """
+        pages, for a result with more to come, is called with a callback and
+        requests the next page in the background; the callback then gets its
+        filenames and the pages callable for the page after it, or None.
+        """
+        self.thumbnail_loader.cancel()
+        self.beginResetModel()
+        self.filenames = filenames
+        self.rows = {filename: row for row, filename in enumerate(filenames)}
+        self.pages = pages
+        self.fetching = False
+        self.endResetModel()
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self.pages is not None and not self.fetching
+
+    def fetchMore(self, parent=QModelIndex()):
+        if self.pages is None or self.fetching:
+            return
+        self.fetching = True
+        self.pages(partial(self.on_page, self.pages))
+
+    def on_page(self, pages, filenames, next_pages):
+        # The result may have been replaced while the page was read
+        if pages is not self.pages:
+            return
+        self.fetching = False
+        self.pages = next_pages
+        self.add_images(filenames)
+        self.page_loaded.emit()
+
+    def add_images(self, filenames):
+        filenames = [f for f in filenames if f not in self.rows]
+        if not filenames:
+            return
+        first = len(self.filenames)
+        self.beginInsertRows(QModelIndex(), first, first + len(filenames) - 1)
+        self.filenames.extend(filenames)
+        for row, filename in enumerate(filenames, start=first):
+            self.rows[filename] = row
+        self.endInsertRows()
+
+    def remove_images(self, filenames):
+        # Highest rows first so the lower ones keep their positions
+        for row in sorted((self.rows[f] for f in filenames if f in self.rows), reverse=True):
+            self.beginRemoveRows(QModelIndex(), row, row)
+            self.image_cache.discard([self.filenames.pop(row)])
+            self.endRemoveRows()
+        self.rows = {filename: row for row, filename in enumerate(self.filenames)}
+
+    def rename_images(self, renamed):
+        for old, new in renamed:
+            row = self.rows.pop(old, None)
+            if row is None:
+                continue
+            self.filenames[row] = new
+            self.rows[new] = row
+            self.image_cache.rename(old, new)
+            index = self.index(row)
+            self.dataChanged.emit(index, index)
+
+    def refresh_images(self, filenames):
+        """Drop cached images so changed files are decoded again when painted."""
+        self.image_cache.discard(filenames)
+        for filename in filenames:
+            row = self.rows.get(filename)
+            if row is not None:
+                index = self.index(row)
+                self.dataChanged.emit(index, index, [Qt.ItemDataRole.DecorationRole])
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.filenames)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        filename = self.filenames[index.row()]
+
+        if role == Qt.ItemDataRole.DecorationRole:
+            pixmap = self.image_cache.get(THUMBNAIL, filename)
+            if pixmap is not None:
+                return pixmap
+            # The most recently painted cells are decoded first
+            self.thumbnail_loader.request(filename, next(self.request_counter))
+            return None
+
+        if role in (Qt.ItemDataRole.ToolTipRole, Qt.ItemDataRole.UserRole):
+            return filename
+        return None
+
+    def on_thumbnail_ready(self, generation, filename, image):
+        if generation != self.thumbnail_loader.generation or image.isNull():
+            return
+        self.image_cache.put(THUMBNAIL, filename, QPixmap.fromImage(image))
+        # Not kept within the budget, so repainting would only request it again
+        if not self.image_cache.contains(THUMBNAIL, filename):
+            return
+
+        row = self.rows.get(filename)
+        if row is not None:
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [Qt.ItemDataRole.DecorationRole])
+
+
+class ThumbnailDelegate(QStyledItemDelegate):
+    """Paints a thumbnail centred in its cell, or a placeholder until it is loaded."""
+
+    placeholder_color = QColor("#d0d0d0")
+
+    def paint(self, painter, option, index):
+        painter.save()
+        if option.state & QStyle.StateFlag.State_Selected:
+            painter.fillRect(option.rect, option.palette.highlight())
+
+        cell = option.rect.adjusted(GRID_CELL_PADDING // 2, GRID_CELL_PADDING // 2,
+                                    -GRID_CELL_PADDING // 2, -GRID_CELL_PADDING // 2)
+        pixmap = index.data(Qt.ItemDataRole.DecorationRole)
+        if pixmap is None:
+            height = THUMBNAIL_WIDTH * 3 // 4
+            painter.fillRect(QRect(cell.x(), cell.y() + (cell.height() - height) // 2,
+                                   cell.width(), height), self.placeholder_color)
+        else:
+            x = cell.x() + (cell.width() - pixmap.width()) // 2
+            y = cell.y() + (cell.height() - pixmap.height()) // 2
+            painter.drawPixmap(x, y, pixmap)
+        painter.restore()
+
+    def sizeHint(self, option, index):
+        return QSize(THUMBNAIL_WIDTH + GRID_CELL_PADDING, THUMBNAIL_WIDTH + GRID_CELL_PADDING)
+
+
+class ImageGridView(QListView):
+    """Icon-mode list view that reflows its columns to the available width."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        cell_size = THUMBNAIL_WIDTH + GRID_CELL_PADDING
+        self.setViewMode(QListView.ViewMode.IconMode)
+        self.setResizeMode(QListView.ResizeMode.Adjust)
+        self.setMovement(QListView.Movement.Static)
+        self.setUniformItemSizes(True)
+        self.setGridSize(QSize(cell_size, cell_size))
+        self.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
+        self.setItemDelegate(ThumbnailDelegate(self))
+
+    def selected_filenames(self):
+        rows = sorted(index.row() for index in self.selectionModel().selectedIndexes())
+        return [self.model().filenames[row] for row in rows]
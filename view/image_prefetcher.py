@@ -0,0 +1,127 @@
+import os
+
+from PyQt6.QtGui import QImage, QPixmap
+from PyQt6.QtCore import Qt, QObject, QRunnable, QThreadPool, pyqtSignal
+
+from .image_cache import SCREEN
+from .image_decoder import decode_image
+
+FULL_IMAGE_WIDTH = 800
+PREFETCH_AHEAD = 3
+PREFETCH_BEHIND = 2
+
+
+class PrefetchTask(QRunnable):
+    def __init__(self, prefetcher, generation, filename, decode):
+        super().__init__()
+        self.prefetcher = prefetcher
+        self.generation = generation
+        self.filename = filename
+        self.decode = decode
+
+    def run(self):
+        self.prefetcher.load(self.generation, self.filename, self.decode)
+
+
+class ImagePrefetcher(QObject):
+    """
+    Keeps the full-view images around the current one decoded in memory.
+
+    focus() moves a fixed window of PREFETCH_BEHIND images before and
+    PREFETCH_AHEAD images after the current index and decodes those not yet
+    in the screen tier of the shared ImageCache, whose budget decides how
+    long they stay. Metadata is loaded alongside each image through
+    metadata_loader, which is called on a worker thread and must not use the
+    GUI thread's database connection; it is kept only inside the window.
+    """
+
+    loaded = pyqtSignal(int, str, QImage, object)
+    image_ready = pyqtSignal(str, QPixmap, object)
+
+    def __init__(self, image_cache, ahead=PREFETCH_AHEAD, behind=PREFETCH_BEHIND, parent=None):
+        super().__init__(parent)
+        self.image_cache = image_cache
+        self.ahead = ahead
+        self.behind = behind
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(2)
+        self.folder_path = ''
+        self.metadata_loader = None
+        self.generation = 0
+        self.metadata = {}
+        self.pending = set()
+        self.window = []
+        self.current = None
+        self.loaded.connect(self.on_loaded)
+
+    def focus(self, filenames, index):
+        self.current = filenames[index]
+        start = max(0, index - self.behind)
+        end = min(len(filenames), index + self.ahead + 1)
+        self.window = filenames[start:end]
+
+        for filename in list(self.metadata):
+            if filename not in self.window:
+                del self.metadata[filename]
+
+        # Current image first, then forwards, then backwards
+        ahead = filenames[index + 1:end]
+        behind = filenames[start:index][::-1]
+        for priority, filename in enumerate(reversed([self.current] + ahead + behind)):
+            decode = not self.image_cache.contains(SCREEN, filename)
+            if filename in self.pending or not decode and filename in self.metadata:
+                continue
+            self.pending.add(filename)
+            self.pool.start(PrefetchTask(self, self.generation, filename, decode), priority)
+
+    def get(self, filename):
+        """Return (pixmap, metadata) for filename; either may be None if not loaded yet."""
+        return self.image_cache.get(SCREEN, filename), self.metadata.get(filename)
+
+    def invalidate_metadata(self, filename):
+        self.metadata.pop(filename, None)
+
+    def clear(self):
+        self.generation += 1
+        self.pool.clear()
+        self.metadata.clear()
+        self.pending.clear()
+        self.window = []
+        self.current = None
+
+    def stop(self):
+        """Drop queued work and wait for running tasks, e.g. before the database closes."""
+        self.clear()
+        self.pool.waitForDone()
+
+    def load(self, generation, filename, decode=True):
+        """Runs on a worker thread; without decode only the metadata is loaded."""
+        if generation != self.generation:
+            return
+        image = QImage()
+        if decode:
+            image = decode_image(os.path.join(self.folder_path, filename), FULL_IMAGE_WIDTH)
+        if not image.isNull() and image.width() != FULL_IMAGE_WIDTH:
+            image = image.scaledToWidth(
+                FULL_IMAGE_WIDTH, Qt.TransformationMode.SmoothTransformation)
+        # The database may have been closed while the image was decoding
+        if generation != self.generation:
+            return
+        metadata = self.metadata_loader(filename) if self.metadata_loader else None
+        self.loaded.emit(generation, filename, image, metadata)
+
+    def on_loaded(self, generation, filename, image, metadata):
+        if generation != self.generation:
+            return
+        self.pending.discard(filename)
+        pixmap = None
+        if not image.isNull():
+            pixmap = QPixmap.fromImage(image)
+            self.image_cache.put(SCREEN, filename, pixmap)
+            # Neighbours arrive after the current image and must not push it out first
+            self.image_cache.touch(SCREEN, self.current)
+        if filename not in self.window:
+            return
+        self.metadata[filename] = metadata
+        if pixmap is not None:
+            self.image_ready.emit(filename, pixmap, metadata)
@@ -1,14 +1,19 @@
 import os
 from PyQt6.QtWidgets import (
     QWidget, QLabel, QPushButton, QVBoxLayout, QHBoxLayout,
-    QMessageBox, QScrollArea, QGridLayout, QSplitter,
+    QMessageBox, QSplitter,
 )
-from PyQt6.QtGui import QPixmap
 from PyQt6.QtCore import Qt, QDate
+from functools import partial
 
 from .widgets.editable_dropdown import EditableDropdown
+from .widgets.toast import Toast
 from .filter_panel import FilterPanel
 from .metadata_panel import MetadataPanel
+from .thumbnail_loader import ThumbnailLoader
+from .image_grid import ImageGridModel, ImageGridView
+from .image_prefetcher import ImagePrefetcher
+from .image_cache import ImageCache
 
 import shutil
 
@@ -20,16 +25,33 @@ class MainWindow(QWidget):
 
         self.folder_path = ''
         self.image_list = []
+        # Fetches the rest of a paged result, see ImageGridModel.set_images
+        self.result_pages = None
         self.current_image_index = -1
+        # Set while next_image waits for the next page of results
+        self.advance_after_page = False
         self.metadata_changed = False
         self.people_list = []
         self.group_list = []
         self.emotion_list = []
 
         self.db = None
+        self.thumbnail_store = None
+
+        # Decoded grid and full-view images, shared so neither decodes a file twice
+        self.image_cache = ImageCache()
+        self.thumbnail_loader = ThumbnailLoader(self)
+        self.thumbnail_loader.all_loaded.connect(self.on_thumbnails_loaded)
+        self.prefetcher = ImagePrefetcher(self.image_cache, parent=self)
+        self.prefetcher.image_ready.connect(self.on_prefetched_image)
 
         self.fetch_metadata = None
         self.load_folder_callback = None
+        self.on_find_duplicates = None
+        self.on_find_similar = None
+        self.on_geocode = None
+        self.on_batch_tag = None
+        self.on_close = None
 
         self.setup_ui()
 
@@ -72,6 +94,36 @@ class MainWindow(QWidget):
         self.metadata_button.hide()
         self.header_layout.addWidget(self.metadata_button)
 
+        self.find_duplicates_button = QPushButton("Find Duplicates")
+        self.find_duplicates_button.clicked.connect(
+            lambda: self.on_find_duplicates() if self.on_find_duplicates else None
+        )
+        self.find_duplicates_button.hide()
+        self.header_layout.addWidget(self.find_duplicates_button)
+
+        self.find_similar_button = QPushButton("Find Similar")
+        self.find_similar_button.clicked.connect(
+            lambda: self.on_find_similar() if self.on_find_similar else None
+        )
+        self.find_similar_button.hide()
+        self.header_layout.addWidget(self.find_similar_button)
+
+        self.geocode_button = QPushButton("Locate from GPS")
+        self.geocode_button.clicked.connect(
+            lambda: self.on_geocode() if self.on_geocode else None
+        )
+        self.geocode_button.hide()
+        self.header_layout.addWidget(self.geocode_button)
+
+        self.batch_tag_button = QPushButton("Tag Selected")
+        self.batch_tag_button.clicked.connect(
+            lambda: self.on_batch_tag(self.grid_view.selected_filenames())
+            if self.on_batch_tag else None
+        )
+        self.batch_tag_button.setEnabled(False)
+        self.batch_tag_button.hide()
+        self.header_layout.addWidget(self.batch_tag_button)
+
         self.back_button = QPushButton("Back to Grid")
         self.back_button.clicked.connect(self.display_grid_view)
         self.back_button.hide()
@@ -86,12 +138,15 @@ class MainWindow(QWidget):
         self.root_layout.addLayout(self.header_layout)
 
     def setup_image_panels(self):
-        self.scroll_area = QScrollArea()
-        self.grid_widget = QWidget()
-        self.grid_layout = QGridLayout()
-        self.grid_widget.setLayout(self.grid_layout)
-        self.scroll_area.setWidget(self.grid_widget)
-        self.scroll_area.setWidgetResizable(True)
+        self.grid_model = ImageGridModel(self.thumbnail_loader, self.image_cache, self)
+        self.grid_view = ImageGridView()
+        self.grid_model.page_loaded.connect(self.on_page_loaded)
+        self.grid_view.setModel(self.grid_model)
+        self.grid_view.doubleClicked.connect(self.on_grid_double_clicked)
+        self.grid_view.selectionModel().selectionChanged.connect(
+            lambda selected, deselected: self.batch_tag_button.setEnabled(
+                self.grid_view.selectionModel().hasSelection())
+        )
 
         self.full_image_panel = QVBoxLayout()
         self.full_image_widget = QWidget()
@@ -117,7 +172,7 @@ class MainWindow(QWidget):
         self.main_view_layout = QVBoxLayout()
         self.main_view_widget = QWidget()
         self.main_view_widget.setLayout(self.main_view_layout)
-        self.main_view_layout.addWidget(self.scroll_area)
+        self.main_view_layout.addWidget(self.grid_view)
         self.main_view_layout.addWidget(self.full_image_widget)
 
     def setup_splitter(self):
@@ -143,9 +198,16 @@ class MainWindow(QWidget):
         self.root_layout.addWidget(self.footer_widget)
 
     def display_grid_view(self):
-        self.clear_layout(self.grid_layout)
+        self.prefetcher.clear()
+        self.advance_after_page = False
+        self.thumbnail_loader.folder_path = self.folder_path
+        self.thumbnail_loader.thumbnail_store = self.thumbnail_store
+        self.grid_model.set_images(self.image_list, self.result_pages)
+
         self.splitter.show()
-        self.scroll_area.show()
+        self.grid_view.show()
+        self.batch_tag_button.show()
+        self.batch_tag_button.setEnabled(self.grid_view.selectionModel().hasSelection())
         self.full_image_label.hide()
         self.metadata_panel.hide()
         self.metadata_button.hide()
@@ -156,29 +218,54 @@ class MainWindow(QWidget):
 
         self.update_splitter_sizes()
 
-        for i, filename in enumerate(self.image_list):
-            image_path = os.path.join(self.folder_path, filename)
-            pixmap = QPixmap(image_path).scaledToWidth(
-                200, Qt.TransformationMode.SmoothTransformation)
-            thumb_label = QLabel()
-            thumb_label.setPixmap(pixmap)
+    def update_images(self, added, changed, removed, renamed):
+        """Patch the open grid or full view after files changed on disk."""
+        current = self.current_filename() if self.full_image_label.isVisible() else None
+        for old, new in renamed:
+            if self.thumbnail_store:
+                self.thumbnail_store.rename(old, new)
+            if old == current:
+                current = new
+        if self.thumbnail_store:
+            self.thumbnail_store.discard(changed)
+
+        self.grid_model.rename_images(renamed)
+        self.grid_model.remove_images(removed)
+        self.grid_model.add_images(added)
+        self.grid_model.refresh_images(changed)
+
+        if current is None:
+            return
+        self.prefetcher.clear()
+        if current in self.grid_model.rows:
+            self.show_fullscreen_image(self.grid_model.rows[current])
+        else:
+            self.display_grid_view()
 
-            # Wrap in a lambda to avoid late-binding bug
-            def handler(event, idx=i):
-                self.show_fullscreen_image(idx)
-            thumb_label.mouseDoubleClickEvent = handler
+    def on_grid_double_clicked(self, index):
+        self.show_fullscreen_image(index.row())
 
-            self.grid_layout.addWidget(thumb_label, i // 4, i % 4)
+    def on_thumbnails_loaded(self, generation):
+        if self.thumbnail_store:
+            self.thumbnail_store.save_index()
 
     def show_fullscreen_image(self, index):
+        self.thumbnail_loader.cancel()
         self.current_image_index = index
         filename = self.image_list[self.current_image_index]
         self.metadata_panel.set_current_filename(filename)
-        image_path = os.path.join(self.folder_path, filename)
-        pixmap = QPixmap(image_path).scaledToWidth(
-            800, Qt.TransformationMode.SmoothTransformation)
-        self.full_image_label.setPixmap(pixmap)
-        self.scroll_area.hide()
+
+        # Decoded images and metadata come from the prefetch window when available
+        self.prefetcher.folder_path = self.folder_path
+        self.prefetcher.focus(self.image_list, index)
+        pixmap, metadata = self.prefetcher.get(filename)
+        if pixmap is not None:
+            self.full_image_label.setPixmap(pixmap)
+        else:
+            self.full_image_label.clear()
+
+        self.grid_view.hide()
+        self.batch_tag_button.hide()
         self.splitter.show()
         self.full_image_label.show()
         self.metadata_panel.show()
@@ -191,11 +278,26 @@ class MainWindow(QWidget):
         self.update_splitter_sizes()
 
         # Load from DB
-        metadata = self.fetch_metadata(
-            filename) if self.fetch_metadata else None
-        if not metadata:
-            return
-
+        if metadata:
+            self.show_metadata(metadata)
+        elif metadata is None and self.fetch_metadata:
+            self.fetch_metadata(filename, partial(self.on_metadata_fetched, filename))
+
+    def on_metadata_fetched(self, filename, metadata):
+        # The user may have moved on while it was read
+        if metadata and self.full_image_label.isVisible() and filename == self.current_filename():
+            self.show_metadata(metadata)
+
+    def on_prefetched_image(self, filename, pixmap, metadata):
+        if self.full_image_label.isVisible() and filename == self.current_filename():
+            self.full_image_label.setPixmap(pixmap)
+
+    def current_filename(self):
+        if 0 <= self.current_image_index < len(self.image_list):
+            return self.image_list[self.current_image_index]
+        return None
+
+    def show_metadata(self, metadata):
         self.metadata_panel.description.setPlainText(metadata["description"])
         if metadata["date"]:
             self.metadata_panel.use_metadata_date_checkbox.setChecked(True)
@@ -250,10 +352,21 @@ class MainWindow(QWidget):
             QMessageBox.warning(self, "Unsaved Changes",
                                 "Please save changes before navigating.")
             return
+        if self.current_image_index == len(self.image_list) - 1 and self.grid_model.pages is not None:
+            # Moves on in on_page_loaded once the next page has been read
+            self.advance_after_page = True
+            self.grid_model.fetchMore()
+            return
         if self.current_image_index < len(self.image_list) - 1:
             self.current_image_index += 1
             self.show_fullscreen_image(self.current_image_index)
 
+    def on_page_loaded(self):
+        if self.advance_after_page:
+            self.advance_after_page = False
+            if self.full_image_label.isVisible():
+                self.next_image()
+
     def prev_image(self):
         if self.metadata_changed:
             QMessageBox.warning(self, "Unsaved Changes",
@@ -288,27 +401,35 @@ class MainWindow(QWidget):
             image_path = os.path.join(self.folder_path, filename)
             
             deleted_dir = os.path.join(self.folder_path, "deleted_images")
-            os.makedirs(deleted_dir, exist_ok=True)
             delete_path = os.path.join(deleted_dir, filename)
+            os.makedirs(os.path.dirname(delete_path), exist_ok=True)
 
             if os.path.exists(image_path):
                 shutil.move(image_path, delete_path)
                 del self.image_list[self.current_image_index]
+                self.image_cache.discard([filename])
                 self.display_grid_view()
                 self.current_image_index = -1
 
+    def toast(self, message):
+        Toast(self, message)
+
+    def closeEvent(self, event):
+        if self.on_close:
+            self.on_close()
+        self.thumbnail_loader.cancel()
+        self.thumbnail_loader.pool.waitForDone()
+        self.prefetcher.stop()
+        if self.thumbnail_store:
+            self.thumbnail_store.close()
+        super().closeEvent(event)
+
     def update_splitter_sizes(self):
         left = 300 if self.filter_panel.isVisible() else 0
         right = 300 if self.metadata_panel.isVisible() else 0
         center = max(600, self.width() - left - right)
         self.splitter.setSizes([left, center, right])
 
-    def clear_layout(self, layout):
-        while layout.count():
-            child = layout.takeAt(0)
-            if child.widget():
-                child.widget().deleteLater()
-
     def set_dropdown_item(self, dropdown, label):
         if label and dropdown.findText(label) != -1:
             dropdown.setCurrentText(label)
@@ -4,6 +4,7 @@ from PyQt6.QtWidgets import (
 )
 from PyQt6.QtCore import Qt, QDate
 from .widgets.editable_dropdown import EditableDropdown
+from .widgets.sorted_items import sorted_position
 from .widgets.toast import Toast
 
 class MetadataPanel(QWidget):
@@ -14,6 +15,7 @@ class MetadataPanel(QWidget):
         self.group_list_data = group_list
         self.emotion_list_data = emotion_list
         self.on_save_metadata = on_save_metadata
+        self.on_delete_location_value = None
         self.metadata_changed = False
         self.current_index = -1
         self.image_list = []
@@ -57,37 +59,37 @@ class MetadataPanel(QWidget):
             label="name",
             values=[],
             parent=self,
-            remove_callback=lambda val: self.db.delete_location_entry("name", val)
+            remove_callback=lambda val: self.delete_location_value("name", val)
         )
         self.category_dropdown = EditableDropdown(
             label="category",
             values=[],
             parent=self,
-            remove_callback=lambda val: self.db.delete_location_entry("category", val)
+            remove_callback=lambda val: self.delete_location_value("category", val)
         )
         self.country_dropdown = EditableDropdown(
             label="country",
             values=[],
             parent=self,
-            remove_callback=lambda val: self.db.delete_location_entry("country", val)
+            remove_callback=lambda val: self.delete_location_value("country", val)
         )
         self.region_dropdown = EditableDropdown(
             label="region",
             values=[],
             parent=self,
-            remove_callback=lambda val: self.db.delete_location_entry("region", val)
+            remove_callback=lambda val: self.delete_location_value("region", val)
         )
         self.city_dropdown = EditableDropdown(
             label="city",
             values=[],
             parent=self,
-            remove_callback=lambda val: self.db.delete_location_entry("city", val)
+            remove_callback=lambda val: self.delete_location_value("city", val)
         )
         self.postcode_dropdown = EditableDropdown(
             label="postcode",
             values=[],
             parent=self,
-            remove_callback=lambda val: self.db.delete_location_entry("postcode", val)
+            remove_callback=lambda val: self.delete_location_value("postcode", val)
         )
 
         self.location_container = QWidget()
@@ -125,6 +127,62 @@ class MetadataPanel(QWidget):
 
         self.setLayout(self.layout)
 
+    def delete_location_value(self, field, value):
+        if self.on_delete_location_value:
+            self.on_delete_location_value(field, value)
+
+    def location_dropdowns(self):
+        return {
+            "name": self.name_dropdown,
+            "category": self.category_dropdown,
+            "country": self.country_dropdown,
+            "region": self.region_dropdown,
+            "city": self.city_dropdown,
+            "postcode": self.postcode_dropdown,
+        }
+
+    def tag_list_widgets(self):
+        return {
+            "people": self.people_list_widget,
+            "groups": self.group_list_widget,
+            "emotions": self.emotion_list_widget,
+        }
+
+    def list_row(self, list_widget, value):
+        # The last row is always "+ Add New..."
+        return sorted_position(lambda row: list_widget.item(row).text(),
+                               0, list_widget.count() - 1, value)
+
+    def insert_list_value(self, list_widget, value):
+        """Insert value in sorted position unless present; returns its item."""
+        row = self.list_row(list_widget, value)
+        item = list_widget.item(row)
+        if row == list_widget.count() - 1 or item.text() != value:
+            item = QListWidgetItem(value)
+            list_widget.insertItem(row, item)
+        return item
+
+    def apply_vocabulary_delta(self, field, inserted, removed):
+        """Patch one pick list with a VocabularyService.changed delta."""
+        dropdown = self.location_dropdowns().get(field)
+        if dropdown:
+            for value in inserted:
+                dropdown.insert_value(value)
+            for value in removed:
+                dropdown.remove_value(value)
+            return
+        list_widget = self.tag_list_widgets()[field]
+        for value in inserted:
+            self.insert_list_value(list_widget, value)
+        for value in removed:
+            row = self.list_row(list_widget, value)
+            if row < list_widget.count() - 1 and list_widget.item(row).text() == value:
+                list_widget.takeItem(row)
+
+    def add_new_tag(self, list_widget, name):
+        self.insert_list_value(list_widget, name).setSelected(True)
+        self.metadata_changed = True
+
     def populate_people_list(self, people):
         self.people_list_widget.clear()
         for person in people:
@@ -135,16 +193,7 @@ class MetadataPanel(QWidget):
         if item.text() == "+ Add New...":
             name, ok = QInputDialog.getText(self, "Add Person", "Enter person's name:")
             if ok and name.strip():
-                name = name.strip()
-                current_people = [self.people_list_widget.item(i).text() for i in range(self.people_list_widget.count() - 1)]
-                if name not in current_people:
-                    current_people.append(name)
-                    self.populate_people_list(current_people)
-                    for i in range(self.people_list_widget.count()):
-                        if self.people_list_widget.item(i).text() == name:
-                            self.people_list_widget.item(i).setSelected(True)
-                            break
-                    self.metadata_changed = True
+                self.add_new_tag(self.people_list_widget, name.strip())
 
     def populate_group_list(self, groups):
         self.group_list_widget.clear()
@@ -156,16 +205,7 @@ class MetadataPanel(QWidget):
         if item.text() == "+ Add New...":
             name, ok = QInputDialog.getText(self, "Add Group", "Enter group name:")
             if ok and name.strip():
-                name = name.strip()
-                current_groups = [self.group_list_widget.item(i).text() for i in range(self.group_list_widget.count() - 1)]
-                if name not in current_groups:
-                    current_groups.append(name)
-                    self.populate_group_list(current_groups)
-                    for i in range(self.group_list_widget.count()):
-                        if self.group_list_widget.item(i).text() == name:
-                            self.group_list_widget.item(i).setSelected(True)
-                            break
-                    self.metadata_changed = True
+                self.add_new_tag(self.group_list_widget, name.strip())
 
     def populate_emotion_list(self, emotions):
         self.emotion_list_widget.clear()
@@ -177,16 +217,7 @@ class MetadataPanel(QWidget):
         if item.text() == "+ Add New...":
             name, ok = QInputDialog.getText(self, "Add Emotion", "Enter emotion:")
             if ok and name.strip():
-                name = name.strip()
-                current_emotions = [self.emotion_list_widget.item(i).text() for i in range(self.emotion_list_widget.count() - 1)]
-                if name not in current_emotions:
-                    current_emotions.append(name)
-                    self.populate_emotion_list(current_emotions)
-                    for i in range(self.emotion_list_widget.count()):
-                        if self.emotion_list_widget.item(i).text() == name:
-                            self.emotion_list_widget.item(i).setSelected(True)
-                            break
-                    self.metadata_changed = True
+                self.add_new_tag(self.emotion_list_widget, name.strip())
 
     def collect_metadata(self):
         description = self.description.toPlainText()
@@ -0,0 +1,96 @@
+import heapq
+import itertools
+import threading
+
+from PyQt6.QtGui import QImage
+from PyQt6.QtCore import QObject, QRunnable, QThread, QThreadPool, pyqtSignal
+
+from .thumbnails import load_thumbnail
+
+
+class LoadNextThumbnail(QRunnable):
+    """
+    Pulls the highest-priority pending filename from the loader when it runs,
+    so priorities can change after the work has been queued.
+    """
+
+    def __init__(self, loader):
+        super().__init__()
+        self.loader = loader
+
+    def run(self):
+        self.loader.load_next()
+
+
+class ThumbnailLoader(QObject):
+    """
+    Decodes grid thumbnails on a QThreadPool and hands them back to the GUI
+    thread through thumbnail_ready. Every cancel() starts a new generation;
+    results from an older generation are dropped by the receiver.
+    """
+
+    thumbnail_ready = pyqtSignal(int, str, QImage)
+    all_loaded = pyqtSignal(int)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max(2, QThread.idealThreadCount() - 1))
+        self.lock = threading.Lock()
+        self.queue = []
+        self.queued = {}
+        self.in_flight = 0
+        self.counter = itertools.count()
+        self.generation = 0
+        self.folder_path = ''
+        self.thumbnail_store = None
+
+    def request(self, filename, priority=0):
+        """
+        Queue filename for decoding, or raise its priority if it is already
+        waiting. Higher priorities are decoded first.
+        """
+        with self.lock:
+            current = self.queued.get(filename)
+            if current is not None and current >= priority:
+                return
+            self.queued[filename] = priority
+            heapq.heappush(self.queue, (-priority, next(self.counter), filename))
+        if current is None:
+            self.pool.start(LoadNextThumbnail(self))
+
+    def cancel(self):
+        with self.lock:
+            self.queue.clear()
+            self.queued.clear()
+            self.generation += 1
+        self.pool.clear()
+
+    def take_next(self):
+        with self.lock:
+            while self.queue:
+                priority, _, filename = heapq.heappop(self.queue)
+                # Skip entries superseded by a later, higher-priority request
+                if self.queued.get(filename) == -priority:
+                    del self.queued[filename]
+                    self.in_flight += 1
+                    return filename, self.generation
+            return None, self.generation
+
+    def load_next(self):
+        filename, generation = self.take_next()
+        if filename is None:
+            return
+
+        image = self.load_image(filename)
+        if generation == self.generation:
+            self.thumbnail_ready.emit(generation, filename, image)
+
+        with self.lock:
+            self.in_flight -= 1
+            finished = not self.queued and self.in_flight == 0
+        if finished:
+            self.all_loaded.emit(generation)
+
+    def load_image(self, filename):
+        return load_thumbnail(self.folder_path, filename, self.thumbnail_store)
@@ -0,0 +1,61 @@
+import os
+
+from PyQt6.QtGui import QImage
+from PyQt6.QtCore import Qt, QBuffer, QByteArray, QIODevice
+
+from .image_decoder import decode_image
+
+THUMBNAIL_WIDTH = 200
+
+
+def encode_thumbnail(image_path, width=THUMBNAIL_WIDTH):
+    """
+    Decode image_path at the grid width and return it as JPEG bytes.
+    Uses QImage rather than QPixmap so it is safe to call off the GUI thread.
+    """
+    image = decode_image(image_path, width)
+    if image.isNull():
+        return None
+    if image.width() != width:
+        image = image.scaledToWidth(width, Qt.TransformationMode.SmoothTransformation)
+
+    data = QByteArray()
+    buffer = QBuffer(data)
+    buffer.open(QIODevice.OpenModeFlag.WriteOnly)
+    image.save(buffer, "JPEG", 85)
+    buffer.close()
+    return bytes(data)
+
+
+def load_thumbnail(folder_path, filename, store=None, allow_stale=True):
+    """
+    Return the grid thumbnail for filename as a QImage, taking it from the
+    thumbnail store when possible and encoding (and storing) it otherwise.
+    """
+    data = store.get(filename, allow_stale=allow_stale) if store else None
+    if data is None:
+        data = encode_thumbnail(os.path.join(folder_path, filename))
+        if data and store:
+            store.put(filename, data)
+
+    image = QImage()
+    if data:
+        image.loadFromData(data)
+    return image
+
+
+def difference_hash(image):
+    """
+    64-bit dHash of a QImage: shrink to 9x8 greyscale and record whether each
+    pixel is brighter than its right-hand neighbour. Similar pictures differ
+    in only a few bits, whatever their resolution or compression.
+    """
+    small = image.convertToFormat(QImage.Format.Format_Grayscale8).scaled(
+        9, 8, Qt.AspectRatioMode.IgnoreAspectRatio, Qt.TransformationMode.SmoothTransformation)
+    value = 0
+    for y in range(8):
+        for x in range(8):
+            left = small.pixelColor(x, y).red()
+            right = small.pixelColor(x + 1, y).red()
+            value = (value << 1) | (left > right)
+    return value
@@ -2,6 +2,7 @@ from PyQt6.QtWidgets import (
     QComboBox, QInputDialog, QMessageBox, QMenu
 )
 from PyQt6.QtCore import Qt, QPoint
+from .sorted_items import sorted_position
 
 
 class EditableDropdown(QComboBox):
@@ -23,13 +24,29 @@ class EditableDropdown(QComboBox):
         self.addItem("+ Add new...")
         self.setCurrentIndex(0)
 
+    def value_row(self, value):
+        # Values sit between the "Select a ..." and "+ Add new..." rows
+        return sorted_position(self.itemText, 1, self.count() - 1, value)
+
+    def insert_value(self, value):
+        row = self.value_row(value)
+        if row == self.count() - 1 or self.itemText(row) != value:
+            self.insertItem(row, value)
+
+    def remove_value(self, value):
+        row = self.value_row(value)
+        if row < self.count() - 1 and self.itemText(row) == value:
+            if self.currentIndex() == row:
+                self.setCurrentIndex(0)
+            self.removeItem(row)
+
     def handle_add_new(self):
         text, ok = QInputDialog.getText(
             self, f"Add new {self.label}", f"Enter new {self.label}:")
         if ok and text:
             text = text.strip()
-            if text and self.findText(text) == -1:
-                self.insertItem(self.count() - 1, text)
+            if text:
+                self.insert_value(text)
             self.setCurrentText(text)
         else:
             # Reset selection to default value if cancelled
@@ -55,8 +72,7 @@ class EditableDropdown(QComboBox):
         confirm = QMessageBox.question(self, "Confirm Deletion",
                                        f"Remove '{current_text}' from {self.label} list?")
         if confirm == QMessageBox.StandardButton.Yes:
-            index = self.findText(current_text)
-            self.removeItem(index)
+            self.remove_value(current_text)
             if self.remove_callback:
                 self.remove_callback(current_text)
 
@@ -0,0 +1,12 @@
+def sorted_position(value_at, low, high, value):
+    """
+    Binary search the rows low..high-1 of a widget, whose values value_at(row)
+    returns in ascending order, for the row at which value belongs.
+    """
+    while low < high:
+        middle = (low + high) // 2
+        if value_at(middle) < value:
+            low = middle + 1
+        else:
+            high = middle
+    return low